@@ -0,0 +1,80 @@
+"""Added position to test_config_item_config
+
+Revision ID: 2421a5c2349b
+Revises: 2b825fd09468
+Create Date: 2026-10-18 15:20:05.075135
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "2421a5c2349b"
+down_revision: Union[str, None] = "2b825fd09468"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+test_config_item_config = sa.table(
+    "test_config_item_config",
+    sa.column("test_config_id", sa.Integer),
+    sa.column("item_config_id", sa.Integer),
+    sa.column("position", sa.Integer),
+)
+
+CHUNK_SIZE = 10_000
+
+
+def upgrade() -> None:
+    op.add_column(
+        "test_config_item_config", sa.Column("position", sa.Integer(), nullable=True)
+    )
+    op.create_index(
+        "ix_test_config_item_config_test_config_id_position",
+        "test_config_item_config",
+        ["test_config_id", "position"],
+        unique=False,
+    )
+
+    # Number the existing items of every test config densely from 0, in chunks
+    conn = op.get_bind()
+    rows = conn.execute(
+        sa.select(
+            test_config_item_config.c.test_config_id,
+            test_config_item_config.c.item_config_id,
+        ).order_by(
+            test_config_item_config.c.test_config_id,
+            test_config_item_config.c.item_config_id,
+        )
+    ).all()
+    update = (
+        test_config_item_config.update()
+        .where(
+            test_config_item_config.c.test_config_id == sa.bindparam("tc_id"),
+            test_config_item_config.c.item_config_id == sa.bindparam("ic_id"),
+        )
+        .values(position=sa.bindparam("pos"))
+    )
+    params = []
+    position, previous_test_config_id = 0, None
+    for test_config_id, item_config_id in rows:
+        if test_config_id != previous_test_config_id:
+            position, previous_test_config_id = 0, test_config_id
+        params.append(
+            {"tc_id": test_config_id, "ic_id": item_config_id, "pos": position}
+        )
+        position += 1
+    for start in range(0, len(params), CHUNK_SIZE):
+        conn.execute(update, params[start : start + CHUNK_SIZE])
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_test_config_item_config_test_config_id_position",
+        table_name="test_config_item_config",
+    )
+    with op.batch_alter_table("test_config_item_config") as batch_op:
+        batch_op.drop_column("position")
@@ -0,0 +1,114 @@
+"""Added stimulus metrics to item_config
+
+Revision ID: 3f7d2c94b6a8
+Revises: 8e3b6f0a2d91
+Create Date: 2026-10-18 18:21:37.660143
+
+"""
+
+import re
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "3f7d2c94b6a8"
+down_revision: Union[str, None] = "8e3b6f0a2d91"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+item_config = sa.table(
+    "item_config",
+    sa.column("id", sa.Integer),
+    sa.column("triangle_color", sa.String),
+    sa.column("circle_color", sa.String),
+    sa.column("triangle_luminance", sa.Float),
+    sa.column("circle_luminance", sa.Float),
+    sa.column("contrast_ratio", sa.Float),
+)
+
+CHUNK_SIZE = 10_000
+
+METRIC_COLUMNS = ["triangle_luminance", "circle_luminance", "contrast_ratio"]
+
+HEX_COLOR = re.compile(r"#?[0-9a-fA-F]{6}")
+
+
+# Same math as backend.difficulty.crud_difficulty.calculate_luminance, copied so
+# that the migration keeps working when the application code changes
+def _linearize_channel(c):
+    c = c / 255.0
+    return c / 12.92 if c <= 0.03928 else ((c + 0.055) / 1.055) ** 2.4
+
+
+def _luminance(color_hex):
+    color_hex = color_hex.lstrip("#")
+    r, g, b = tuple(int(color_hex[i : i + 2], 16) for i in (0, 2, 4))
+    return (
+        0.2126 * _linearize_channel(r)
+        + 0.7152 * _linearize_channel(g)
+        + 0.0722 * _linearize_channel(b)
+    )
+
+
+def upgrade() -> None:
+    for column in METRIC_COLUMNS:
+        op.add_column("item_config", sa.Column(column, sa.Float(), nullable=True))
+        op.create_index(
+            op.f(f"ix_item_config_{column}"), "item_config", [column], unique=False
+        )
+
+    # Fill in the metrics of existing rows, one chunk of ids at a time
+    conn = op.get_bind()
+    update = (
+        item_config.update()
+        .where(item_config.c.id == sa.bindparam("item_config_id"))
+        .values(
+            triangle_luminance=sa.bindparam("tl"),
+            circle_luminance=sa.bindparam("cl"),
+            contrast_ratio=sa.bindparam("cr"),
+        )
+    )
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(
+                item_config.c.id,
+                item_config.c.triangle_color,
+                item_config.c.circle_color,
+            )
+            .where(item_config.c.id > last_id)
+            .order_by(item_config.c.id)
+            .limit(CHUNK_SIZE)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        params = []
+        for item_config_id, triangle_color, circle_color in rows:
+            if not (
+                HEX_COLOR.fullmatch(triangle_color or "")
+                and HEX_COLOR.fullmatch(circle_color or "")
+            ):
+                continue
+            l1, l2 = _luminance(triangle_color), _luminance(circle_color)
+            params.append(
+                {
+                    "item_config_id": item_config_id,
+                    "tl": l1,
+                    "cl": l2,
+                    "cr": (max(l1, l2) + 0.05) / (min(l1, l2) + 0.05),
+                }
+            )
+        if params:
+            conn.execute(update, params)
+
+
+def downgrade() -> None:
+    for column in METRIC_COLUMNS:
+        op.drop_index(op.f(f"ix_item_config_{column}"), table_name="item_config")
+    with op.batch_alter_table("item_config") as batch_op:
+        for column in METRIC_COLUMNS:
+            batch_op.drop_column(column)
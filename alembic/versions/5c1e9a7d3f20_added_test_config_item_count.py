@@ -0,0 +1,43 @@
+"""Added test_config_item_count
+
+Revision ID: 5c1e9a7d3f20
+Revises: 2421a5c2349b
+Create Date: 2026-10-18 17:02:41.518203
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "5c1e9a7d3f20"
+down_revision: Union[str, None] = "2421a5c2349b"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "test_config_item_count",
+        sa.Column("test_config_id", sa.Integer(), nullable=False),
+        sa.Column("item_count", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["test_config_id"],
+            ["test_config.id"],
+        ),
+        sa.PrimaryKeyConstraint("test_config_id"),
+    )
+    # Count the items of every existing test config
+    op.execute(
+        "INSERT INTO test_config_item_count (test_config_id, item_count) "
+        "SELECT test_config.id, COUNT(test_config_item_config.item_config_id) "
+        "FROM test_config LEFT OUTER JOIN test_config_item_config "
+        "ON test_config_item_config.test_config_id = test_config.id "
+        "GROUP BY test_config.id"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("test_config_item_count")
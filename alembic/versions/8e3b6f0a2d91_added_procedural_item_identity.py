@@ -0,0 +1,42 @@
+"""Added procedural item identity to item_config_result
+
+Revision ID: 8e3b6f0a2d91
+Revises: 5c1e9a7d3f20
+Create Date: 2026-10-18 17:48:12.304519
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "8e3b6f0a2d91"
+down_revision: Union[str, None] = "5c1e9a7d3f20"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("item_config_result", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("item_difficulty", sa.String(), nullable=True))
+        batch_op.add_column(
+            sa.Column("item_generator_version", sa.Integer(), nullable=True)
+        )
+        batch_op.add_column(sa.Column("item_seed", sa.BigInteger(), nullable=True))
+        batch_op.alter_column(
+            "item_config_id", existing_type=sa.INTEGER(), nullable=True
+        )
+
+
+def downgrade() -> None:
+    # Results of procedural items have no item config to fall back to
+    op.execute("DELETE FROM item_config_result WHERE item_config_id IS NULL")
+    with op.batch_alter_table("item_config_result", schema=None) as batch_op:
+        batch_op.alter_column(
+            "item_config_id", existing_type=sa.INTEGER(), nullable=False
+        )
+        batch_op.drop_column("item_seed")
+        batch_op.drop_column("item_generator_version")
+        batch_op.drop_column("item_difficulty")
@@ -0,0 +1,186 @@
+"""Added content_hash to item_config and merged duplicates
+
+Revision ID: 9a2f4d6c1e83
+Revises: c4a81e5f9b37
+Create Date: 2026-10-18 20:12:09.448127
+
+"""
+
+import hashlib
+from collections import defaultdict
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "9a2f4d6c1e83"
+down_revision: Union[str, None] = "c4a81e5f9b37"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+item_config = sa.table(
+    "item_config",
+    sa.column("id", sa.Integer),
+    sa.column("triangle_size", sa.Integer),
+    sa.column("triangle_color", sa.String),
+    sa.column("circle_size", sa.Integer),
+    sa.column("circle_color", sa.String),
+    sa.column("time_visible_ms", sa.Integer),
+    sa.column("orientation", sa.String),
+    sa.column("user_id", sa.Integer),
+    sa.column("content_hash", sa.String),
+)
+item_config_result = sa.table(
+    "item_config_result",
+    sa.column("item_config_id", sa.Integer),
+)
+test_config_item_config = sa.table(
+    "test_config_item_config",
+    sa.column("test_config_id", sa.Integer),
+    sa.column("item_config_id", sa.Integer),
+)
+
+CHUNK_SIZE = 10_000
+
+
+# Same as backend.item_config.content_hash.item_config_content_hash, copied so
+# that the migration keeps working when the application code changes
+def _content_hash(
+    triangle_size,
+    triangle_color,
+    circle_size,
+    circle_color,
+    time_visible_ms,
+    orientation,
+    user_id,
+):
+    canonical = "|".join(
+        [
+            str(triangle_size),
+            triangle_color.strip().lower(),
+            str(circle_size),
+            circle_color.strip().lower(),
+            str(time_visible_ms),
+            orientation,
+            "" if user_id is None else str(user_id),
+        ]
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def _merge_duplicates(conn):
+    """Repoint results and test configs of duplicate item configs to the oldest
+    copy and delete the duplicates."""
+    copies = defaultdict(list)
+    for item_config_id, content_hash in conn.execute(
+        sa.select(item_config.c.id, item_config.c.content_hash).order_by(
+            item_config.c.id
+        )
+    ):
+        copies[content_hash].append(item_config_id)
+
+    for keep_id, *duplicate_ids in copies.values():
+        if not duplicate_ids:
+            continue
+        conn.execute(
+            item_config_result.update()
+            .where(item_config_result.c.item_config_id.in_(duplicate_ids))
+            .values(item_config_id=keep_id)
+        )
+        linked = set(
+            conn.scalars(
+                sa.select(test_config_item_config.c.test_config_id).where(
+                    test_config_item_config.c.item_config_id == keep_id
+                )
+            )
+        )
+        for test_config_id, duplicate_id in conn.execute(
+            sa.select(
+                test_config_item_config.c.test_config_id,
+                test_config_item_config.c.item_config_id,
+            ).where(test_config_item_config.c.item_config_id.in_(duplicate_ids))
+        ).all():
+            association = test_config_item_config.c
+            row = (association.test_config_id == test_config_id) & (
+                association.item_config_id == duplicate_id
+            )
+            if test_config_id in linked:
+                # The test config already has the kept copy
+                conn.execute(test_config_item_config.delete().where(row))
+            else:
+                conn.execute(
+                    test_config_item_config.update()
+                    .where(row)
+                    .values(item_config_id=keep_id)
+                )
+                linked.add(test_config_id)
+        conn.execute(item_config.delete().where(item_config.c.id.in_(duplicate_ids)))
+
+
+def upgrade() -> None:
+    op.add_column(
+        "item_config", sa.Column("content_hash", sa.String(length=64), nullable=True)
+    )
+
+    # Hash the existing rows, one chunk of ids at a time
+    conn = op.get_bind()
+    update = (
+        item_config.update()
+        .where(item_config.c.id == sa.bindparam("item_config_id"))
+        .values(content_hash=sa.bindparam("hash"))
+    )
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(
+                item_config.c.id,
+                item_config.c.triangle_size,
+                item_config.c.triangle_color,
+                item_config.c.circle_size,
+                item_config.c.circle_color,
+                item_config.c.time_visible_ms,
+                item_config.c.orientation,
+                item_config.c.user_id,
+            )
+            .where(item_config.c.id > last_id)
+            .order_by(item_config.c.id)
+            .limit(CHUNK_SIZE)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        conn.execute(
+            update,
+            [
+                {"item_config_id": row[0], "hash": _content_hash(*row[1:])}
+                for row in rows
+            ],
+        )
+
+    # The unique index can only be created once every content hash is unique
+    _merge_duplicates(conn)
+    op.execute("DELETE FROM test_config_item_count")
+    op.execute(
+        "INSERT INTO test_config_item_count (test_config_id, item_count) "
+        "SELECT test_config.id, COUNT(test_config_item_config.item_config_id) "
+        "FROM test_config LEFT OUTER JOIN test_config_item_config "
+        "ON test_config_item_config.test_config_id = test_config.id "
+        "GROUP BY test_config.id"
+    )
+
+    # The column stays nullable in SQLite: making it NOT NULL rebuilds
+    # item_config, which the foreign keys of its results do not allow
+    op.create_index(
+        op.f("ix_item_config_content_hash"),
+        "item_config",
+        ["content_hash"],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    # Merged duplicates are not restored
+    op.drop_index(op.f("ix_item_config_content_hash"), table_name="item_config")
+    op.drop_column("item_config", "content_hash")
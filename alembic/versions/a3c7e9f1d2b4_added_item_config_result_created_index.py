@@ -0,0 +1,30 @@
+"""Added an index on item_config_result.created
+
+Revision ID: a3c7e9f1d2b4
+Revises: b6d4e2a8c9f1
+Create Date: 2026-10-19 00:12:35.918274
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a3c7e9f1d2b4"
+down_revision: Union[str, None] = "b6d4e2a8c9f1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_item_config_result_created",
+        "item_config_result",
+        ["created"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_item_config_result_created", table_name="item_config_result")
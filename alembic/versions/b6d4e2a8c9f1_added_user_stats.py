@@ -0,0 +1,162 @@
+"""Added user_stats
+
+Revision ID: b6d4e2a8c9f1
+Revises: f2c86a4e1b57
+Create Date: 2026-10-18 23:41:07.815320
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "b6d4e2a8c9f1"
+down_revision: Union[str, None] = "f2c86a4e1b57"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Test config ids of the difficulty levels at the time of this revision
+DIFFICULTY_TEST_CONFIG_IDS = {1: "easy", 3: "medium", 4: "hard"}
+
+item_config_result = sa.table(
+    "item_config_result",
+    sa.column("id", sa.Integer),
+    sa.column("user_id", sa.Integer),
+    sa.column("correct", sa.Boolean),
+    sa.column("reaction_time_ms", sa.Integer),
+)
+test_config_result = sa.table(
+    "test_config_result",
+    sa.column("id", sa.Integer),
+    sa.column("user_id", sa.Integer),
+    sa.column("test_config_id", sa.Integer),
+    sa.column("time", sa.DateTime),
+    sa.column("correct_answers", sa.Integer),
+    sa.column("wrong_answers", sa.Integer),
+)
+association = sa.table(
+    "test_config_result_item_config_result",
+    sa.column("test_config_result_id", sa.Integer),
+    sa.column("item_config_result_id", sa.Integer),
+)
+
+
+def _answer_sums():
+    reaction_time = item_config_result.c.reaction_time_ms
+    return (
+        sa.func.count(),
+        sa.func.sum(sa.case((item_config_result.c.correct, 1), else_=0)),
+        sa.func.sum(reaction_time),
+        sa.func.sum(reaction_time * reaction_time),
+    )
+
+
+def upgrade() -> None:
+    user_stats = op.create_table(
+        "user_stats",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("difficulty", sa.String(), nullable=False),
+        sa.Column("answers", sa.Integer(), nullable=False),
+        sa.Column("correct_answers", sa.Integer(), nullable=False),
+        sa.Column("reaction_time_sum_ms", sa.BigInteger(), nullable=False),
+        sa.Column("reaction_time_sum_sq_ms", sa.BigInteger(), nullable=False),
+        sa.Column("games", sa.Integer(), nullable=False),
+        sa.Column("game_correct_answers", sa.Integer(), nullable=False),
+        sa.Column("game_wrong_answers", sa.Integer(), nullable=False),
+        sa.Column("last_played", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["user_id"],
+            ["user.id"],
+        ),
+        sa.PrimaryKeyConstraint("user_id", "difficulty"),
+    )
+    op.create_index(
+        "ix_test_config_result_user_id_time",
+        "test_config_result",
+        ["user_id", "time"],
+        unique=False,
+    )
+
+    # Aggregate the existing results, as `python -m backend.stats.user_stats` does
+    conn = op.get_bind()
+    difficulty = sa.case(
+        DIFFICULTY_TEST_CONFIG_IDS,
+        value=test_config_result.c.test_config_id,
+        else_="free",
+    )
+    rows = {}
+
+    def row(user_id, name):
+        return rows.setdefault(
+            (user_id, name),
+            {
+                "user_id": user_id,
+                "difficulty": name,
+                "answers": 0,
+                "correct_answers": 0,
+                "reaction_time_sum_ms": 0,
+                "reaction_time_sum_sq_ms": 0,
+                "games": 0,
+                "game_correct_answers": 0,
+                "game_wrong_answers": 0,
+                "last_played": None,
+            },
+        )
+
+    def add_answers(target, answers, correct, sum_ms, sum_sq_ms):
+        target.update(
+            answers=answers,
+            correct_answers=correct,
+            reaction_time_sum_ms=sum_ms,
+            reaction_time_sum_sq_ms=sum_sq_ms,
+        )
+
+    for user_id, *sums in conn.execute(
+        sa.select(item_config_result.c.user_id, *_answer_sums())
+        .where(item_config_result.c.user_id.is_not(None))
+        .group_by(item_config_result.c.user_id)
+    ):
+        add_answers(row(user_id, "all"), *sums)
+    for user_id, name, *sums in conn.execute(
+        sa.select(test_config_result.c.user_id, difficulty, *_answer_sums())
+        .select_from(
+            test_config_result.join(
+                association,
+                association.c.test_config_result_id == test_config_result.c.id,
+            ).join(
+                item_config_result,
+                item_config_result.c.id == association.c.item_config_result_id,
+            )
+        )
+        .where(test_config_result.c.user_id.is_not(None))
+        .group_by(test_config_result.c.user_id, difficulty)
+    ):
+        add_answers(row(user_id, name), *sums)
+    for user_id, name, games, correct, wrong, last_played in conn.execute(
+        sa.select(
+            test_config_result.c.user_id,
+            difficulty,
+            sa.func.count(),
+            sa.func.sum(test_config_result.c.correct_answers),
+            sa.func.sum(test_config_result.c.wrong_answers),
+            sa.func.max(test_config_result.c.time),
+        )
+        .where(test_config_result.c.user_id.is_not(None))
+        .group_by(test_config_result.c.user_id, difficulty)
+    ):
+        row(user_id, name).update(
+            games=games,
+            game_correct_answers=correct,
+            game_wrong_answers=wrong,
+            last_played=last_played,
+        )
+    if rows:
+        op.bulk_insert(user_stats, list(rows.values()))
+
+
+def downgrade() -> None:
+    op.drop_index("ix_test_config_result_user_id_time", table_name="test_config_result")
+    op.drop_table("user_stats")
@@ -0,0 +1,52 @@
+"""Added adaptive_session
+
+Revision ID: c4a81e5f9b37
+Revises: 3f7d2c94b6a8
+Create Date: 2026-10-18 19:05:52.871406
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "c4a81e5f9b37"
+down_revision: Union[str, None] = "3f7d2c94b6a8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "adaptive_session",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("created", sa.DateTime(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("state", sa.JSON(), nullable=False),
+        sa.Column("item", sa.JSON(), nullable=True),
+        sa.Column("trials", sa.JSON(), nullable=False),
+        sa.Column("trial_count", sa.Integer(), nullable=False),
+        sa.Column("finished", sa.Boolean(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["user_id"],
+            ["user.id"],
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_adaptive_session_id"), "adaptive_session", ["id"], unique=False
+    )
+    op.create_index(
+        op.f("ix_adaptive_session_user_id"),
+        "adaptive_session",
+        ["user_id"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_adaptive_session_user_id"), table_name="adaptive_session")
+    op.drop_index(op.f("ix_adaptive_session_id"), table_name="adaptive_session")
+    op.drop_table("adaptive_session")
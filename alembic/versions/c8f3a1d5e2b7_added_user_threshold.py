@@ -0,0 +1,43 @@
+"""Added user_threshold
+
+Revision ID: c8f3a1d5e2b7
+Revises: a3c7e9f1d2b4
+Create Date: 2026-10-19 01:04:52.377190
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "c8f3a1d5e2b7"
+down_revision: Union[str, None] = "a3c7e9f1d2b4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Starts empty, users are fitted on their first request or by
+    # `python -m backend.analytics.crud_analytics`
+    op.create_table(
+        "user_threshold",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("dimension", sa.String(), nullable=False),
+        sa.Column("log10_threshold", sa.Float(), nullable=False),
+        sa.Column("log10_sd", sa.Float(), nullable=False),
+        sa.Column("trials", sa.Integer(), nullable=False),
+        sa.Column("answers", sa.Integer(), nullable=False),
+        sa.Column("correct_answers", sa.Integer(), nullable=False),
+        sa.Column("fitted", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["user_id"],
+            ["user.id"],
+        ),
+        sa.PrimaryKeyConstraint("user_id", "dimension"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("user_threshold")
@@ -0,0 +1,59 @@
+"""Added indexes on foreign keys and lookup columns
+
+Revision ID: e7d15b3a90c4
+Revises: 9a2f4d6c1e83
+Create Date: 2026-10-18 21:37:14.502913
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e7d15b3a90c4"
+down_revision: Union[str, None] = "9a2f4d6c1e83"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (index name, table, columns)
+INDEXES = [
+    ("ix_user_email", "user", ["email"]),
+    ("ix_user_username", "user", ["username"]),
+    ("ix_item_config_created", "item_config", ["created"]),
+    ("ix_item_config_user_id", "item_config", ["user_id"]),
+    ("ix_item_config_result_item_config_id", "item_config_result", ["item_config_id"]),
+    (
+        "ix_item_config_result_user_id_item_config_id",
+        "item_config_result",
+        ["user_id", "item_config_id"],
+    ),
+    ("ix_test_config_user_id", "test_config", ["user_id"]),
+    ("ix_test_config_result_test_config_id", "test_config_result", ["test_config_id"]),
+    (
+        "ix_test_config_result_user_id_test_config_id",
+        "test_config_result",
+        ["user_id", "test_config_id"],
+    ),
+    (
+        "ix_test_config_item_config_item_config_id",
+        "test_config_item_config",
+        ["item_config_id"],
+    ),
+    (
+        "ix_test_config_result_item_config_result_item_config_result_id",
+        "test_config_result_item_config_result",
+        ["item_config_result_id"],
+    ),
+]
+
+
+def upgrade() -> None:
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False)
+
+
+def downgrade() -> None:
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,70 @@
+"""Numbered test config items without a position
+
+Revision ID: f2c86a4e1b57
+Revises: e7d15b3a90c4
+Create Date: 2026-10-18 22:18:41.263907
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "f2c86a4e1b57"
+down_revision: Union[str, None] = "e7d15b3a90c4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+test_config_item_config = sa.table(
+    "test_config_item_config",
+    sa.column("test_config_id", sa.Integer),
+    sa.column("item_config_id", sa.Integer),
+    sa.column("position", sa.Integer),
+)
+
+CHUNK_SIZE = 10_000
+
+
+def upgrade() -> None:
+    # Items added through the test config CRUD were stored without a position.
+    # Append them after the positioned items of their test config, in id order.
+    conn = op.get_bind()
+    association = test_config_item_config.c
+    last_positions = dict(
+        conn.execute(
+            sa.select(association.test_config_id, sa.func.max(association.position))
+            .where(association.position.is_not(None))
+            .group_by(association.test_config_id)
+        ).all()
+    )
+    rows = conn.execute(
+        sa.select(association.test_config_id, association.item_config_id)
+        .where(association.position.is_(None))
+        .order_by(association.test_config_id, association.item_config_id)
+    ).all()
+    update = (
+        test_config_item_config.update()
+        .where(
+            association.test_config_id == sa.bindparam("tc_id"),
+            association.item_config_id == sa.bindparam("ic_id"),
+        )
+        .values(position=sa.bindparam("pos"))
+    )
+    params = []
+    for test_config_id, item_config_id in rows:
+        last_position = last_positions.get(test_config_id)
+        position = 0 if last_position is None else last_position + 1
+        last_positions[test_config_id] = position
+        params.append(
+            {"tc_id": test_config_id, "ic_id": item_config_id, "pos": position}
+        )
+    for start in range(0, len(params), CHUNK_SIZE):
+        conn.execute(update, params[start : start + CHUNK_SIZE])
+
+
+def downgrade() -> None:
+    # The positions are kept; the previous revision ignores them for these rows
+    pass
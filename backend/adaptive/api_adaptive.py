@@ -0,0 +1,56 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from backend import schemas
+from backend.adaptive.crud_adaptive import (
+    answer_adaptive_session,
+    create_adaptive_session,
+    get_adaptive_session,
+)
+from backend.user.api_user import get_current_user
+from backend.utils import get_db
+
+router = APIRouter()
+
+
+# Endpoint to start an adaptive session, the response holds the first item
+@router.post("/sessions", response_model=schemas.AdaptiveSessionResponse)
+def create_adaptive_session_endpoint(
+    adaptive_session: schemas.AdaptiveSessionCreate = schemas.AdaptiveSessionCreate(),
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    return create_adaptive_session(db, adaptive_session=adaptive_session, user=user)
+
+
+# Endpoint to get the current item and threshold estimates of an adaptive session
+@router.get("/sessions/{session_id}", response_model=schemas.AdaptiveSessionResponse)
+def read_adaptive_session_endpoint(
+    session_id: int,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    adaptive_session = get_adaptive_session(db, session_id, user=user)
+    if adaptive_session is None:
+        raise HTTPException(
+            status_code=404, detail=f"Adaptive session with id {session_id} not found"
+        )
+    return adaptive_session
+
+
+# Endpoint to answer the current item, the response holds the next one
+@router.post(
+    "/sessions/{session_id}/answers", response_model=schemas.AdaptiveSessionResponse
+)
+def answer_adaptive_session_endpoint(
+    session_id: int,
+    answer: schemas.AdaptiveAnswer,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    adaptive_session = answer_adaptive_session(db, session_id, answer, user=user)
+    if adaptive_session is None:
+        raise HTTPException(
+            status_code=404, detail=f"Adaptive session with id {session_id} not found"
+        )
+    return adaptive_session
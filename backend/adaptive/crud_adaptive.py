@@ -0,0 +1,101 @@
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from backend import models, schemas
+from backend.adaptive.staircase import AdaptiveTest, generate_adaptive_item
+
+
+def _session_response(db_session: models.AdaptiveSession) -> dict:
+    return {
+        "id": db_session.id,
+        "created": db_session.created,
+        "user_id": db_session.user_id,
+        "trial_count": db_session.trial_count,
+        "finished": db_session.finished,
+        "item": db_session.item,
+        "estimates": AdaptiveTest.from_state(db_session.state).estimates(),
+    }
+
+
+def create_adaptive_session(
+    db: Session, adaptive_session: schemas.AdaptiveSessionCreate, user: models.User
+):
+    test = AdaptiveTest.new(
+        max_trials=adaptive_session.max_trials, target_sd=adaptive_session.target_sd
+    )
+    db_session = models.AdaptiveSession(
+        user_id=user.id,
+        state=test.to_state(),
+        item=generate_adaptive_item(test.next_stimulus()),
+        trials=[],
+        trial_count=0,
+        finished=False,
+    )
+    db.add(db_session)
+    db.commit()
+    db.refresh(db_session)
+    return _session_response(db_session)
+
+
+def _get_own_session(db: Session, session_id: int, user: models.User):
+    db_session = (
+        db.query(models.AdaptiveSession)
+        .filter(models.AdaptiveSession.id == session_id)
+        .first()
+    )
+    if db_session and db_session.user_id != user.id:
+        raise HTTPException(
+            status_code=401,
+            detail=f"User {user.id} does not have access to adaptive session {session_id}",
+        )
+    return db_session
+
+
+def get_adaptive_session(db: Session, session_id: int, user: models.User):
+    db_session = _get_own_session(db, session_id, user)
+    return _session_response(db_session) if db_session else None
+
+
+def answer_adaptive_session(
+    db: Session, session_id: int, answer: schemas.AdaptiveAnswer, user: models.User
+):
+    """Score the answer to the current item and move on to the next one.
+
+    The staircase state is loaded, updated and stored within this request, so a
+    trial costs a single round trip: the response carries the next item.
+    """
+    db_session = _get_own_session(db, session_id, user)
+    if db_session is None:
+        return None
+    if db_session.finished:
+        raise HTTPException(
+            status_code=422, detail=f"Adaptive session {session_id} is finished"
+        )
+    if answer.response not in ("N", "E", "S", "W"):
+        raise HTTPException(
+            status_code=422, detail=f"Invalid response: {answer.response}"
+        )
+
+    item = db_session.item
+    correct = answer.response == item["orientation"]
+    test = AdaptiveTest.from_state(db_session.state)
+    test.record(item["dimension"], item["intensity"], correct)
+    stimulus = test.next_stimulus()
+
+    # JSON columns are replaced, not mutated, so that the changes are detected
+    db_session.trials = db_session.trials + [
+        {
+            "dimension": item["dimension"],
+            "intensity": item["intensity"],
+            "correct": correct,
+            "reaction_time_ms": answer.reaction_time_ms,
+            "response": answer.response,
+        }
+    ]
+    db_session.state = test.to_state()
+    db_session.item = None if stimulus is None else generate_adaptive_item(stimulus)
+    db_session.trial_count = test.trial_count
+    db_session.finished = stimulus is None
+    db.commit()
+    db.refresh(db_session)
+    return _session_response(db_session)
@@ -0,0 +1,228 @@
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from backend.difficulty.color_index import (
+    calculate_luminances,
+    contrast_ratios,
+    sample_color_pairs,
+)
+from backend.difficulty.crud_difficulty import ORIENTATIONS, format_colors
+
+# Chance of guessing the orientation (one of four) and of a careless error
+GUESS_RATE = 0.25
+LAPSE_RATE = 0.02
+# Slope of the Weibull psychometric function on log10 stimulus intensities
+SLOPE = 3.5
+GRID_SIZE = 121
+
+# The measured dimensions. Intensities grow as items get easier; contrast is
+# measured as `contrast ratio - 1`, so that its log scale reaches down to 1.
+# While one dimension is measured the other two stay at their reference value.
+DIMENSIONS = {
+    "contrast": {"min": 0.002, "max": 1.0, "reference": 0.3},
+    "triangle_size": {"min": 5.0, "max": 200.0, "reference": 100.0},
+    "time_visible_ms": {"min": 30.0, "max": 2000.0, "reference": 1000.0},
+}
+
+# Relative width of the contrast window a color pair is drawn from
+CONTRAST_WINDOW = 1.05
+
+
+def psychometric(intensities: np.ndarray, thresholds: np.ndarray) -> np.ndarray:
+    """Probability of a correct answer, both arguments in log10 units."""
+    return GUESS_RATE + (1 - GUESS_RATE - LAPSE_RATE) * (
+        1 - np.exp(-(10 ** (SLOPE * (intensities - thresholds))))
+    )
+
+
+def _entropy(p: np.ndarray) -> np.ndarray:
+    """Entropy of the distributions in the last axis of `p`."""
+    return -np.sum(p * np.log(np.where(p > 0, p, 1)), axis=-1)
+
+
+class Staircase:
+    """QUEST-style Bayesian staircase over the log10 threshold of one dimension.
+
+    The posterior lives on a fixed grid of thresholds, which doubles as the set
+    of candidate intensities. Every step is a handful of vectorized operations on
+    the grid: an update multiplies in the likelihood of the answer, and the next
+    intensity is the candidate with the lowest expected posterior entropy.
+    """
+
+    def __init__(
+        self, dimension: str, log_posterior: Optional[np.ndarray] = None
+    ) -> None:
+        bounds = DIMENSIONS[dimension]
+        self.dimension = dimension
+        self.grid = np.linspace(
+            np.log10(bounds["min"]), np.log10(bounds["max"]), GRID_SIZE
+        )
+        # Uniform prior on the log threshold
+        self.log_posterior = (
+            np.zeros(GRID_SIZE) if log_posterior is None else np.asarray(log_posterior)
+        )
+        # p(correct | candidate intensity i, threshold j)
+        self._likelihood = psychometric(self.grid[:, None], self.grid[None, :])
+
+    @property
+    def posterior(self) -> np.ndarray:
+        p = np.exp(self.log_posterior - self.log_posterior.max())
+        return p / p.sum()
+
+    def update(self, intensity: float, correct: bool):
+        """Multiply in the likelihood of an answer at a log10 intensity."""
+        p = psychometric(intensity, self.grid)
+        self.log_posterior = self.log_posterior + np.log(p if correct else 1 - p)
+
+    def next_intensity(self) -> float:
+        """The candidate log10 intensity with the lowest expected posterior entropy."""
+        prior = self.posterior
+        joint_correct = self._likelihood * prior
+        p_correct = joint_correct.sum(axis=1)
+        joint_wrong = prior - joint_correct
+        expected_entropy = p_correct * _entropy(joint_correct / p_correct[:, None]) + (
+            1 - p_correct
+        ) * _entropy(joint_wrong / (1 - p_correct)[:, None])
+        return float(self.grid[np.argmin(expected_entropy)])
+
+    def estimate(self) -> Dict[str, float]:
+        """Posterior mean and standard deviation of the log10 threshold."""
+        p = self.posterior
+        mean = float(p @ self.grid)
+        sd = float(np.sqrt(p @ (self.grid - mean) ** 2))
+        return {"log10_threshold": mean, "log10_sd": sd}
+
+
+class AdaptiveTest:
+    """Interleaves one staircase per dimension, round robin over the unfinished ones.
+
+    A staircase is finished once the standard deviation of its log10 threshold
+    drops below `target_sd`; the test is finished when all staircases are, or
+    after `max_trials`.
+    """
+
+    def __init__(
+        self,
+        staircases: Dict[str, Staircase],
+        trial_count: int = 0,
+        max_trials: int = 120,
+        target_sd: float = 0.05,
+    ):
+        self.staircases = staircases
+        self.trial_count = trial_count
+        self.max_trials = max_trials
+        self.target_sd = target_sd
+
+    @classmethod
+    def new(cls, max_trials: int = 120, target_sd: float = 0.05) -> "AdaptiveTest":
+        return cls(
+            {dimension: Staircase(dimension) for dimension in DIMENSIONS},
+            max_trials=max_trials,
+            target_sd=target_sd,
+        )
+
+    @classmethod
+    def from_state(cls, state: dict) -> "AdaptiveTest":
+        return cls(
+            {
+                dimension: Staircase(dimension, log_posterior)
+                for dimension, log_posterior in state["log_posteriors"].items()
+            },
+            trial_count=state["trial_count"],
+            max_trials=state["max_trials"],
+            target_sd=state["target_sd"],
+        )
+
+    def to_state(self) -> dict:
+        """JSON-serializable state, restored with `from_state`."""
+        return {
+            "log_posteriors": {
+                dimension: staircase.log_posterior.tolist()
+                for dimension, staircase in self.staircases.items()
+            },
+            "trial_count": self.trial_count,
+            "max_trials": self.max_trials,
+            "target_sd": self.target_sd,
+        }
+
+    def unfinished_dimensions(self) -> List[str]:
+        return [
+            dimension
+            for dimension, staircase in self.staircases.items()
+            if staircase.estimate()["log10_sd"] >= self.target_sd
+        ]
+
+    @property
+    def finished(self) -> bool:
+        return self.trial_count >= self.max_trials or not self.unfinished_dimensions()
+
+    def next_stimulus(self) -> Optional[Dict[str, float]]:
+        """Intensities of all dimensions for the next trial, or None when finished."""
+        if self.finished:
+            return None
+        unfinished = self.unfinished_dimensions()
+        dimension = unfinished[self.trial_count % len(unfinished)]
+        stimulus = {name: bounds["reference"] for name, bounds in DIMENSIONS.items()}
+        stimulus[dimension] = 10 ** self.staircases[dimension].next_intensity()
+        return {"dimension": dimension, **stimulus}
+
+    def record(self, dimension: str, intensity: float, correct: bool):
+        """Record the answer to a trial that measured `dimension` at `intensity`."""
+        self.staircases[dimension].update(np.log10(intensity), correct)
+        self.trial_count += 1
+
+    def estimates(self) -> List[dict]:
+        """Threshold estimate of every dimension, in the dimension's own units."""
+        estimates = []
+        for dimension, staircase in self.staircases.items():
+            estimate = staircase.estimate()
+            threshold = 10 ** estimate["log10_threshold"]
+            estimates.append(
+                {
+                    "dimension": dimension,
+                    "threshold": (
+                        1 + threshold if dimension == "contrast" else threshold
+                    ),
+                    "log10_sd": estimate["log10_sd"],
+                }
+            )
+        return estimates
+
+
+def generate_adaptive_item(
+    stimulus: Dict[str, float], rng: Optional[np.random.Generator] = None
+) -> dict:
+    """Build the item for a stimulus, drawing its colors from the color index.
+
+    The color pair comes from a narrow window above the requested contrast, found
+    by binary search over the luminance-sorted index. The returned item carries
+    the intensity actually shown in the measured dimension.
+    """
+    rng = rng or np.random.default_rng()
+    contrast = stimulus["contrast"]
+    color1, color2 = sample_color_pairs(
+        1 + contrast, 1 + contrast * CONTRAST_WINDOW, 1, rng
+    )
+    if rng.random() < 0.5:
+        color1, color2 = color2, color1
+    triangle_size = max(1, int(round(stimulus["triangle_size"])))
+    time_visible_ms = max(1, int(round(stimulus["time_visible_ms"])))
+    shown_contrast = contrast_ratios(
+        calculate_luminances(color1), calculate_luminances(color2)
+    )
+    shown = {
+        "contrast": float(shown_contrast[0]) - 1,
+        "triangle_size": float(triangle_size),
+        "time_visible_ms": float(time_visible_ms),
+    }
+    return {
+        "triangle_size": triangle_size,
+        "triangle_color": format_colors(color1)[0],
+        "circle_size": int(rng.integers(300, 601)),
+        "circle_color": format_colors(color2)[0],
+        "time_visible_ms": time_visible_ms,
+        "orientation": str(ORIENTATIONS[rng.integers(0, len(ORIENTATIONS))]),
+        "dimension": stimulus["dimension"],
+        "intensity": shown[stimulus["dimension"]],
+    }
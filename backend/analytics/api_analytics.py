@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+
+from backend import schemas
+from backend.analytics.crud_analytics import (
+    get_population_thresholds,
+    get_user_thresholds,
+)
+from backend.user.api_user import get_current_user
+from backend.utils import get_db
+
+router = APIRouter()
+
+
+# Endpoint to get the psychometric thresholds of the current user, refitted
+# when results were added or removed since the last fit
+@router.get("/thresholds/user", response_model=schemas.UserThresholds)
+def read_user_thresholds_endpoint(
+    db: Session = Depends(get_db), user=Depends(get_current_user)
+):
+    return get_user_thresholds(db, user=user)
+
+
+# Endpoint to get the psychometric thresholds of all answers and the spread of
+# the users' thresholds. Refitting reads every result, so only users may ask
+@router.get("/thresholds/population", response_model=schemas.PopulationThresholds)
+def read_population_thresholds_endpoint(
+    db: Session = Depends(get_db), user=Depends(get_current_user)
+):
+    return get_population_thresholds(db)
@@ -0,0 +1,361 @@
+"""Psychometric thresholds of users and of the population.
+
+Thresholds are fitted from the item config results, see
+`psychometrics.fit_thresholds`. The fits of a user are cached in
+`user_threshold` and refitted when the user's answer totals in `user_stats`
+change. The population fit is cached in-process until results are added or
+removed. Run this module to refit every user in one pass over all results:
+
+    python -m backend.analytics.crud_analytics
+"""
+
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import delete, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from backend import models
+from backend.adaptive.staircase import DIMENSIONS
+from backend.analytics.psychometrics import fit_thresholds, log_intensities, to_units
+from backend.database import SessionLocal
+from backend.difficulty.color_index import calculate_luminances, contrast_ratios
+from backend.difficulty.procedural import (
+    GENERATOR_RANGES,
+    generate_procedural_arrays,
+)
+from backend.stats.user_stats import ALL_ANSWERS
+
+CHUNK_SIZE = 10_000
+
+# Trials a user needs in a dimension to count towards the population quartiles
+MIN_USER_TRIALS = 20
+
+# Stimulus value of each dimension, as loaded by `load_answers`
+_STIMULUS_COLUMNS = {
+    "contrast": models.ItemConfig.contrast_ratio,
+    "triangle_size": models.ItemConfig.triangle_size,
+    "time_visible_ms": models.ItemConfig.time_visible_ms,
+}
+
+
+def _load_columns(db: Session, query, dtypes: Dict[str, type]) -> Dict[str, np.ndarray]:
+    """The columns of a query as arrays, read in chunks. Nulls of float columns
+    become NaN."""
+    chunks = {name: [] for name in dtypes}
+    # On the connection, which skips the ORM's processing of every row
+    for rows in (
+        db.connection()
+        .execution_options(stream_results=True, max_row_buffer=CHUNK_SIZE)
+        .execute(query)
+        .partitions(CHUNK_SIZE)
+    ):
+        for (name, dtype), values in zip(dtypes.items(), zip(*rows)):
+            chunks[name].append(np.array(values, dtype=dtype))
+    return {
+        name: np.concatenate(chunks[name]) if chunks[name] else np.array([], dtype)
+        for name, dtype in dtypes.items()
+    }
+
+
+def load_answers(db: Session, user_id: Optional[int] = None) -> Dict[str, np.ndarray]:
+    """Columns of all item config results, or of those of a user.
+
+    Holds `user_id` (0 for anonymous results), `correct` and the stimulus value
+    of every dimension, NaN where unknown. The results are read without their
+    item configs, which are read once each and matched by id in NumPy, and
+    procedural items are regenerated from their seeds.
+    """
+    result = models.ItemConfigResult
+    query = select(
+        func.coalesce(result.user_id, 0),
+        result.correct,
+        result.item_config_id,
+        func.coalesce(result.item_difficulty, ""),
+        result.item_generator_version,
+        result.item_seed,
+    )
+    item_config_query = select(
+        models.ItemConfig.id, *_STIMULUS_COLUMNS.values()
+    ).order_by(models.ItemConfig.id)
+    if user_id is not None:
+        query = query.where(result.user_id == user_id)
+        item_config_query = item_config_query.where(
+            models.ItemConfig.id.in_(
+                select(result.item_config_id).where(result.user_id == user_id)
+            )
+        )
+    # Seeds stay below 2^53 and are exact as floats
+    answers = _load_columns(
+        db,
+        query,
+        {
+            "user_id": np.int64,
+            "correct": np.bool_,
+            "item_config_id": np.float64,
+            "difficulty": np.object_,
+            "version": np.float64,
+            "seed": np.float64,
+        },
+    )
+    item_configs = _load_columns(
+        db,
+        item_config_query,
+        dict.fromkeys(["id", *_STIMULUS_COLUMNS], np.float64),
+    )
+
+    stored = ~np.isnan(answers["item_config_id"])
+    positions = np.searchsorted(item_configs["id"], answers["item_config_id"][stored])
+    for dimension in _STIMULUS_COLUMNS:
+        values = np.full(len(answers["correct"]), np.nan)
+        values[stored] = item_configs[dimension][positions]
+        answers[dimension] = values
+    _fill_procedural_stimuli(answers)
+    for name in ("item_config_id", "difficulty", "version", "seed"):
+        del answers[name]
+    return answers
+
+
+def _fill_procedural_stimuli(answers: Dict[str, np.ndarray]):
+    difficulties = answers["difficulty"]
+    for difficulty in np.unique(difficulties[difficulties != ""]):
+        of_difficulty = difficulties == difficulty
+        for version in np.unique(answers["version"][of_difficulty]):
+            if np.isnan(version) or difficulty not in GENERATOR_RANGES.get(
+                int(version), {}
+            ):
+                continue
+            indices = np.flatnonzero(of_difficulty & (answers["version"] == version))
+            items = generate_procedural_arrays(
+                str(difficulty),
+                answers["seed"][indices].astype(np.uint64),
+                int(version),
+            )
+            answers["contrast"][indices] = contrast_ratios(
+                calculate_luminances(items["triangle_color"]),
+                calculate_luminances(items["circle_color"]),
+            )
+            answers["triangle_size"][indices] = items["triangle_size"]
+            answers["time_visible_ms"][indices] = items["time_visible_ms"]
+
+
+def fit_answers(
+    answers: Dict[str, np.ndarray], groups: np.ndarray, group_count: int
+) -> Dict[str, Dict[str, np.ndarray]]:
+    """Fits of every dimension to every group of answers."""
+    return {
+        dimension: fit_thresholds(
+            dimension,
+            groups,
+            group_count,
+            log_intensities(dimension, answers[dimension]),
+            answers["correct"],
+        )
+        for dimension in DIMENSIONS
+    }
+
+
+def _threshold(dimension: str, fit: Dict[str, np.ndarray], group: int) -> dict:
+    log10_threshold = float(fit["log10_threshold"][group])
+    return {
+        "dimension": dimension,
+        "threshold": float(to_units(dimension, log10_threshold)),
+        "log10_threshold": log10_threshold,
+        "log10_sd": float(fit["log10_sd"][group]),
+        "trials": int(fit["trials"][group]),
+    }
+
+
+def _answer_totals(db: Session, user_id: int) -> Tuple[int, int]:
+    stats = db.get(models.UserStats, (user_id, ALL_ANSWERS))
+    return (stats.answers, stats.correct_answers) if stats else (0, 0)
+
+
+def _threshold_rows(
+    user_id: int, fits: Dict[str, Dict[str, np.ndarray]], group: int, totals
+) -> List[dict]:
+    """`user_threshold` rows of a group of answers, one per dimension.
+
+    Dimensions without trials are stored too, so that a user without any fitted
+    dimension is not refitted on every request; they are not served.
+    """
+    rows = []
+    for dimension, fit in fits.items():
+        threshold = _threshold(dimension, fit, group)
+        rows.append(
+            {
+                "user_id": user_id,
+                "dimension": dimension,
+                "log10_threshold": threshold["log10_threshold"],
+                "log10_sd": threshold["log10_sd"],
+                "trials": threshold["trials"],
+                "answers": totals[0],
+                "correct_answers": totals[1],
+            }
+        )
+    return rows
+
+
+def refresh_user_thresholds(
+    db: Session, user_id: int, totals: Tuple[int, int]
+) -> List[models.UserThreshold]:
+    """Refit the thresholds of a user and replace the cached ones."""
+    answers = load_answers(db, user_id)
+    fits = fit_answers(answers, np.zeros(len(answers["correct"]), np.intp), 1)
+    thresholds = [
+        models.UserThreshold(**row) for row in _threshold_rows(user_id, fits, 0, totals)
+    ]
+    db.execute(
+        delete(models.UserThreshold).where(models.UserThreshold.user_id == user_id)
+    )
+    db.add_all(thresholds)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another request refitted the same user at the same time
+        db.rollback()
+    return thresholds
+
+
+def get_user_thresholds(db: Session, user: models.User) -> dict:
+    """The thresholds of a user, refitted if results were added or removed."""
+    totals = _answer_totals(db, user.id)
+    thresholds = db.scalars(
+        select(models.UserThreshold).where(models.UserThreshold.user_id == user.id)
+    ).all()
+    if not thresholds or any(
+        (threshold.answers, threshold.correct_answers) != totals
+        for threshold in thresholds
+    ):
+        thresholds = refresh_user_thresholds(db, user.id, totals)
+    order = list(DIMENSIONS)
+    thresholds = sorted(
+        (row for row in thresholds if row.trials > 0),
+        key=lambda row: order.index(row.dimension),
+    )
+    return {
+        "thresholds": [
+            {
+                "dimension": row.dimension,
+                "threshold": float(to_units(row.dimension, row.log10_threshold)),
+                "log10_threshold": row.log10_threshold,
+                "log10_sd": row.log10_sd,
+                "trials": row.trials,
+            }
+            for row in thresholds
+        ],
+        "fitted": thresholds[0].fitted if thresholds else None,
+    }
+
+
+class PopulationCache:
+    """The last population fit, keyed by the count and last id of the results
+    it was computed from."""
+
+    def __init__(self):
+        self._entry: Optional[Tuple[tuple, dict]] = None
+        self._lock = threading.Lock()
+        # Held while fitting, so concurrent misses wait for one fit
+        self._fit_lock = threading.Lock()
+
+    def get(self, key: tuple) -> Optional[dict]:
+        with self._lock:
+            if self._entry is not None and self._entry[0] == key:
+                return self._entry[1]
+        return None
+
+    def put(self, key: tuple, population: dict):
+        with self._lock:
+            self._entry = (key, population)
+
+    def get_or_fit(self, key: tuple, fit: Callable[[], dict]) -> dict:
+        """The population of `key`, computed by `fit` once if not cached."""
+        population = self.get(key)
+        if population is None:
+            with self._fit_lock:
+                population = self.get(key)
+                if population is None:
+                    population = fit()
+                    self.put(key, population)
+        return population
+
+    def invalidate(self):
+        with self._lock:
+            self._entry = None
+
+
+population_cache = PopulationCache()
+
+
+def fit_population(answers: Dict[str, np.ndarray]) -> dict:
+    """The pooled fit of all answers and the quartiles of the users' fits."""
+    answer_count = len(answers["correct"])
+    users, groups = np.unique(answers["user_id"], return_inverse=True)
+    pooled = fit_answers(answers, np.zeros(answer_count, np.intp), 1)
+    per_user = fit_answers(answers, groups, len(users))
+    thresholds = []
+    for dimension in DIMENSIONS:
+        if pooled[dimension]["trials"][0] == 0:
+            continue
+        fit = per_user[dimension]
+        counted = (users > 0) & (fit["trials"] >= MIN_USER_TRIALS)
+        quartiles = (
+            np.percentile(
+                to_units(dimension, fit["log10_threshold"][counted]), [25, 50, 75]
+            )
+            if counted.any()
+            else [None] * 3
+        )
+        thresholds.append(
+            dict(
+                _threshold(dimension, pooled[dimension], 0),
+                users=int(counted.sum()),
+                **{
+                    f"user_threshold_p{percent}": (
+                        None if value is None else float(value)
+                    )
+                    for percent, value in zip((25, 50, 75), quartiles)
+                },
+            )
+        )
+    return {"answers": answer_count, "thresholds": thresholds}
+
+
+def get_population_thresholds(db: Session) -> dict:
+    """The population thresholds, refitted if results were added or removed."""
+    result = models.ItemConfigResult
+    key = tuple(db.execute(select(func.count(), func.max(result.id))).one())
+    return population_cache.get_or_fit(key, lambda: fit_population(load_answers(db)))
+
+
+def refresh_all_user_thresholds(db: Session) -> int:
+    """Refit every user in one pass over all results. Returns the number of users."""
+    answers = load_answers(db)
+    users, groups = np.unique(answers["user_id"], return_inverse=True)
+    fits = fit_answers(answers, groups, len(users))
+    totals = {
+        stats.user_id: (stats.answers, stats.correct_answers)
+        for stats in db.scalars(
+            select(models.UserStats).where(models.UserStats.difficulty == ALL_ANSWERS)
+        )
+    }
+    rows = []
+    for group, user_id in enumerate(users.tolist()):
+        if user_id > 0:
+            rows += _threshold_rows(user_id, fits, group, totals.get(user_id, (0, 0)))
+    db.execute(delete(models.UserThreshold))
+    if rows:
+        db.execute(models.UserThreshold.__table__.insert(), rows)
+    db.commit()
+    return int((users > 0).sum())
+
+
+if __name__ == "__main__":
+    db = SessionLocal()
+    try:
+        count = refresh_all_user_thresholds(db)
+    finally:
+        db.close()
+    print(f"Refitted the thresholds of {count} users")
@@ -0,0 +1,72 @@
+from typing import Dict
+
+import numpy as np
+
+from backend.adaptive.staircase import DIMENSIONS, GRID_SIZE, psychometric
+
+
+def threshold_grid(dimension: str) -> np.ndarray:
+    """The log10 thresholds a fit considers, the same grid as the staircases'."""
+    bounds = DIMENSIONS[dimension]
+    return np.linspace(np.log10(bounds["min"]), np.log10(bounds["max"]), GRID_SIZE)
+
+
+def log_intensities(dimension: str, values: np.ndarray) -> np.ndarray:
+    """log10 intensities of stimulus values, clipped to the grid; NaN stays NaN.
+
+    Contrast values are contrast ratios, measured as `ratio - 1` like the
+    staircases do.
+    """
+    bounds = DIMENSIONS[dimension]
+    values = np.asarray(values, dtype=np.float64)
+    if dimension == "contrast":
+        values = values - 1
+    return np.log10(np.clip(values, bounds["min"], bounds["max"]))
+
+
+def to_units(dimension: str, log10_thresholds: np.ndarray) -> np.ndarray:
+    """Thresholds in the units of the dimension, contrast as a contrast ratio."""
+    thresholds = 10 ** np.asarray(log10_thresholds)
+    return 1 + thresholds if dimension == "contrast" else thresholds
+
+
+def fit_thresholds(
+    dimension: str,
+    groups: np.ndarray,
+    group_count: int,
+    intensities: np.ndarray,
+    correct: np.ndarray,
+) -> Dict[str, np.ndarray]:
+    """Fit the psychometric function of one dimension to every group of answers.
+
+    `groups` holds the group (e.g. user) index of each answer, `intensities` its
+    log10 intensity, NaN if unknown. The answers are binned to the nearest grid
+    intensity and counted per group, so the log likelihood of every group and
+    grid threshold is two matrix products of the counts with the log
+    probabilities of the psychometric function, regardless of how many answers
+    there are. With a uniform prior over the grid, the posterior mean and
+    standard deviation of the log10 threshold are returned per group, as the
+    staircases estimate them. Slope, guess and lapse rate are the staircases'.
+
+    Each dimension is fitted on its own, over whatever the other two dimensions
+    were when the answers were given.
+    """
+    grid = threshold_grid(dimension)
+    known = ~np.isnan(intensities)
+    step = grid[1] - grid[0]
+    bins = np.rint((intensities[known] - grid[0]) / step).astype(np.intp)
+    cells = np.asarray(groups)[known] * GRID_SIZE + np.clip(bins, 0, GRID_SIZE - 1)
+    size = group_count * GRID_SIZE
+    totals = np.bincount(cells, minlength=size).reshape(group_count, GRID_SIZE)
+    corrects = np.bincount(
+        cells, weights=np.asarray(correct, dtype=np.float64)[known], minlength=size
+    ).reshape(group_count, GRID_SIZE)
+
+    # p(correct | intensity i, threshold j)
+    p = psychometric(grid[:, None], grid[None, :])
+    log_likelihood = corrects @ np.log(p) + (totals - corrects) @ np.log1p(-p)
+    posterior = np.exp(log_likelihood - log_likelihood.max(axis=1, keepdims=True))
+    posterior /= posterior.sum(axis=1, keepdims=True)
+    mean = posterior @ grid
+    sd = np.sqrt(np.sum(posterior * (grid[None, :] - mean[:, None]) ** 2, axis=1))
+    return {"log10_threshold": mean, "log10_sd": sd, "trials": totals.sum(axis=1)}
@@ -1,10 +1,36 @@
 # config.py
+from typing import Optional
+
 from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
     DATABASE_URL: str = "sqlite:///./test.db"  # Default to SQLite for development
     testing: bool = False
+    # Luminance-sorted index of all sRGB colors, built on first use
+    COLOR_INDEX_PATH: str = "color_index.npy"
+    # The difficulty pools are topped up to the high watermark in the background
+    # whenever they drop below the low watermark
+    POOL_LOW_WATERMARK: int = 5_000
+    POOL_HIGH_WATERMARK: int = 10_000
+    # Serve difficulty item lists from pre-encoded JSON instead of response_model
+    PRESERIALIZED_DIFFICULTY_RESPONSES: bool = True
+    # Sample the difficulty pools from an in-process cache instead of looking up
+    # random positions in the database on every request
+    CACHED_DIFFICULTY_POOLS: bool = True
+    # Serve difficulty items regenerated from random seeds instead of the stored
+    # pools, which are then neither filled nor cached
+    PROCEDURAL_DIFFICULTY_ITEMS: bool = False
+    # Acknowledge item config results once they are queued and write them in
+    # group commits of up to RESULT_QUEUE_BATCH_SIZE results, each waiting at
+    # most RESULT_QUEUE_WINDOW_MS for more results to arrive
+    QUEUED_RESULT_INGESTION: bool = False
+    RESULT_QUEUE_MAX_SIZE: int = 10_000
+    RESULT_QUEUE_BATCH_SIZE: int = 500
+    RESULT_QUEUE_WINDOW_MS: float = 20.0
+    # Key to send in the X-API-Key header of /api/export, which is disabled
+    # while no key is set
+    EXPORT_API_KEY: Optional[str] = None
 
     class ConfigDict:
         env_file = ".env"  # Load environment variables from a .env file
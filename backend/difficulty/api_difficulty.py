@@ -1,18 +1,84 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+import numpy as np
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Union
 
 from backend import schemas
+from backend.config import settings
 from backend.utils import get_db
-from . import crud_difficulty
+from . import crud_difficulty, procedural
+from .pool_cache import pool_cache
+from .replenisher import pool_replenisher
 
 router = APIRouter()
 
 
-@router.get("/{difficulty}", response_model=List[schemas.ItemConfigResponse])
-def get_item_configs(difficulty: str, limit: int = 500, db: Session = Depends(get_db)):
-    """API endpoint to retrieve ItemConfigs for a given difficulty."""
+@router.get("/status", response_model=List[schemas.PoolStatus])
+def get_pool_status(db: Session = Depends(get_db)):
+    """API endpoint to report the fill state of the difficulty pools."""
+    status = pool_replenisher.status()
+    return [
+        schemas.PoolStatus(
+            difficulty=difficulty,
+            count=crud_difficulty.get_item_config_count(db, difficulty),
+            low_watermark=pool_replenisher.low_watermark,
+            high_watermark=pool_replenisher.high_watermark,
+            replenisher_running=pool_replenisher.running,
+            filling=status[difficulty]["filling"],
+            last_filled=status[difficulty]["last_filled"],
+            last_error=status[difficulty]["last_error"],
+        )
+        for difficulty in crud_difficulty.DIFFICULTY_RANGES
+    ]
+
+
+@router.get(
+    "/{difficulty}",
+    response_model=Union[
+        List[schemas.ItemConfigResponse], List[schemas.ProceduralItemConfigResponse]
+    ],
+)
+def get_item_configs(
+    difficulty: str,
+    limit: int = Query(500, ge=1, le=5000),
+    db: Session = Depends(get_db),
+):
+    """API endpoint to retrieve ItemConfigs for a given difficulty.
+
+    In procedural mode the items are freshly drawn seeds instead of stored rows.
+    """
     if difficulty not in ["easy", "medium", "hard"]:
         raise HTTPException(status_code=404, detail="Invalid difficulty level")
-    item_configs = crud_difficulty.get_item_configs_by_difficulty(db, difficulty, limit)
-    return item_configs
+    if settings.PROCEDURAL_DIFFICULTY_ITEMS:
+        return procedural.sample_procedural_items(difficulty, limit)
+    if not settings.CACHED_DIFFICULTY_POOLS:
+        item_configs = crud_difficulty.get_item_configs_by_difficulty(
+            db, difficulty, limit
+        )
+        if len(item_configs) < limit:
+            pool_replenisher.request_refill()
+        return item_configs
+    pool = pool_cache.get(db, difficulty)
+    if len(pool) < limit:
+        # Serve what is there and let the replenisher top up the pool
+        pool_replenisher.request_refill()
+    indices = pool.sample_indices(limit, np.random.default_rng())
+    if settings.PRESERIALIZED_DIFFICULTY_RESPONSES:
+        # Join the JSON encoded when the items were cached, skipping response_model
+        return Response(content=pool.json_array(indices), media_type="application/json")
+    return pool.rows(indices)
+
+
+@router.get(
+    "/{difficulty}/procedural/{seed}",
+    response_model=schemas.ProceduralItemConfigResponse,
+)
+def get_procedural_item(
+    difficulty: str, seed: int, generator_version: int = procedural.GENERATOR_VERSION
+):
+    """API endpoint to regenerate the procedural item with the given identity."""
+    if not procedural.is_procedural_identity(difficulty, generator_version, seed):
+        raise HTTPException(status_code=404, detail="Invalid procedural item")
+    return procedural.generate_procedural_items(difficulty, [seed], generator_version)[
+        0
+    ]
@@ -0,0 +1,207 @@
+import os
+import threading
+from typing import Optional, Tuple
+
+import numpy as np
+
+from backend.config import settings
+
+COLOR_COUNT = 1 << 24
+MAX_LUMINANCE = 1.0
+
+
+def linearize_channel(c):
+    """Linearize an 8-bit sRGB channel value."""
+    c = c / 255.0
+    return c / 12.92 if c <= 0.03928 else ((c + 0.055) / 1.055) ** 2.4
+
+
+# Linearized value of every 8-bit sRGB channel value, computed with the same
+# scalar math as `calculate_luminance` so both give bit-identical results.
+_LINEAR_CHANNEL = np.array([linearize_channel(c) for c in range(256)])
+
+
+def calculate_luminances(colors: np.ndarray) -> np.ndarray:
+    """Vectorized `calculate_luminance` for colors given as 24-bit integers."""
+    colors = np.asarray(colors, dtype=np.int64)
+    return (
+        0.2126 * _LINEAR_CHANNEL[(colors >> 16) & 0xFF]
+        + 0.7152 * _LINEAR_CHANNEL[(colors >> 8) & 0xFF]
+        + 0.0722 * _LINEAR_CHANNEL[colors & 0xFF]
+    )
+
+
+def contrast_ratios(l1: np.ndarray, l2: np.ndarray) -> np.ndarray:
+    """Vectorized `contrast_ratio`."""
+    return (np.maximum(l1, l2) + 0.05) / (np.minimum(l1, l2) + 0.05)
+
+
+def build_color_index(path: str) -> None:
+    """Write all 2^24 sRGB colors sorted by relative luminance to `path`.
+
+    Only the colors are stored (as uint32, 64 MiB); luminances are recomputed from
+    the channel lookup table when searching, which keeps the file compact. The
+    sort is stable so every build produces the same file.
+    """
+    colors = np.arange(COLOR_COUNT, dtype=np.uint32)
+    order = np.argsort(calculate_luminances(colors), kind="stable")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, colors[order])
+    # Atomic so that concurrent workers never load a partially written index
+    os.replace(tmp_path, path)
+
+
+_index: Optional[np.ndarray] = None
+_index_lock = threading.Lock()
+
+
+def get_color_index() -> np.ndarray:
+    """Return the memory-mapped color index, building it on first use."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                path = settings.COLOR_INDEX_PATH
+                if not os.path.exists(path):
+                    build_color_index(path)
+                _index = np.load(path, mmap_mode="r")
+    return _index
+
+
+def search_luminance(
+    index: np.ndarray, luminances: np.ndarray, side: str = "left"
+) -> np.ndarray:
+    """Vectorized binary search for the insertion points of `luminances`.
+
+    Equivalent to `np.searchsorted` on the sorted luminances of `index`, which
+    are computed only at the probed positions (24 steps per search).
+    """
+    luminances = np.asarray(luminances, dtype=np.float64)
+    lo = np.zeros(luminances.shape, dtype=np.int64)
+    hi = np.full(luminances.shape, len(index), dtype=np.int64)
+    while True:
+        active = lo < hi
+        if not active.any():
+            return lo
+        mid = (lo + hi) // 2
+        probe = calculate_luminances(index[np.where(active, mid, 0)])
+        if side == "left":
+            go_right = probe < luminances
+        else:
+            go_right = probe <= luminances
+        lo = np.where(active & go_right, mid + 1, lo)
+        hi = np.where(active & ~go_right, mid, hi)
+
+
+def _partner_ranges(
+    index: np.ndarray, l1: np.ndarray, contrast_min: float, contrast_max: float
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Index ranges of the lighter and darker colors in the contrast window of `l1`."""
+    lighter_lo = search_luminance(index, contrast_min * (l1 + 0.05) - 0.05, "left")
+    lighter_hi = search_luminance(index, contrast_max * (l1 + 0.05) - 0.05, "right")
+    darker_lo = search_luminance(index, (l1 + 0.05) / contrast_max - 0.05, "left")
+    darker_hi = search_luminance(index, (l1 + 0.05) / contrast_min - 0.05, "right")
+    return lighter_lo, lighter_hi, darker_lo, darker_hi
+
+
+def _first_color_ranges(index: np.ndarray, contrast_min: float) -> Tuple[int, int, int]:
+    """Index ranges of the colors that can have a partner at `contrast_min`.
+
+    A color needs either a lighter partner (only possible below some luminance)
+    or a darker one (only possible above some luminance), so the candidates are
+    a prefix and a suffix of the index. Returns the prefix end, the suffix start
+    and the number of candidates.
+    """
+    prefix_end = int(
+        search_luminance(
+            index, [(MAX_LUMINANCE + 0.05) / contrast_min - 0.05], "right"
+        )[0]
+    )
+    suffix_start = int(search_luminance(index, [0.05 * contrast_min - 0.05], "left")[0])
+    if suffix_start <= prefix_end:
+        # Prefix and suffix overlap, every color is a candidate
+        prefix_end = suffix_start = len(index)
+    return prefix_end, suffix_start, prefix_end + len(index) - suffix_start
+
+
+def pairs_from_uniforms(
+    contrast_min: float,
+    contrast_max: float,
+    u_first: np.ndarray,
+    u_second: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Map uniform numbers in [0, 1) to color pairs within the contrast window.
+
+    `u_first` selects the first color among all colors that can reach the window,
+    `u_second` selects the second color uniformly among the colors whose contrast
+    with the first lies in `[contrast_min, contrast_max]`. Returns both colors as
+    24-bit integers and a mask of the pairs that are valid. A pair is invalid when
+    the first color has no partner, which only happens for a handful of colors
+    with extreme windows, or when rounding at a window edge picks a color just
+    outside of it.
+    """
+    if contrast_min > contrast_max or contrast_min > (MAX_LUMINANCE + 0.05) / 0.05:
+        raise ValueError(
+            f"No color pair can have a contrast between {contrast_min} and {contrast_max}"
+        )
+    index = get_color_index()
+    u_first = np.asarray(u_first, dtype=np.float64)
+    u_second = np.asarray(u_second, dtype=np.float64)
+
+    prefix_end, suffix_start, candidates = _first_color_ranges(index, contrast_min)
+    k = np.minimum((u_first * candidates).astype(np.int64), candidates - 1)
+    first_pos = np.where(k < prefix_end, k, suffix_start + k - prefix_end)
+    color1 = np.asarray(index[first_pos], dtype=np.int64)
+    l1 = calculate_luminances(color1)
+
+    lighter_lo, lighter_hi, darker_lo, darker_hi = _partner_ranges(
+        index, l1, contrast_min, contrast_max
+    )
+    lighter_count = np.maximum(lighter_hi - lighter_lo, 0)
+    darker_count = np.maximum(darker_hi - darker_lo, 0)
+    total = lighter_count + darker_count
+    j = np.minimum((u_second * total).astype(np.int64), np.maximum(total - 1, 0))
+    second_pos = np.where(
+        j < lighter_count, lighter_lo + j, darker_lo + j - lighter_count
+    )
+    second_pos = np.clip(second_pos, 0, len(index) - 1)
+    color2 = np.asarray(index[second_pos], dtype=np.int64)
+
+    cr = contrast_ratios(l1, calculate_luminances(color2))
+    valid = (total > 0) & (contrast_min <= cr) & (cr <= contrast_max)
+    return color1, color2, valid
+
+
+def sample_color_pairs(
+    contrast_min: float,
+    contrast_max: float,
+    n: int,
+    rng: Optional[np.random.Generator] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Sample `n` color pairs with a contrast ratio within the specified range.
+
+    The first color is drawn uniformly, the second uniformly from the colors in
+    its contrast window, found by binary search over the luminance-sorted index.
+    """
+    rng = rng or np.random.default_rng()
+    colors1 = np.empty(n, dtype=np.int64)
+    colors2 = np.empty(n, dtype=np.int64)
+    missing = np.arange(n)
+    for _ in range(100):
+        if len(missing) == 0:
+            return colors1, colors2
+        color1, color2, valid = pairs_from_uniforms(
+            contrast_min,
+            contrast_max,
+            rng.random(len(missing)),
+            rng.random(len(missing)),
+        )
+        colors1[missing[valid]] = color1[valid]
+        colors2[missing[valid]] = color2[valid]
+        missing = missing[~valid]
+    if len(missing) == 0:
+        return colors1, colors2
+    raise ValueError(
+        f"No color pair can have a contrast between {contrast_min} and {contrast_max}"
+    )
@@ -1,9 +1,54 @@
-from sqlalchemy import func
+from sqlalchemy import func, insert, select
 from sqlalchemy.orm import Session
+import datetime
+import numpy as np
 import random
-from typing import List
+import re
+from typing import Dict, List, Optional
 
 from backend import models, schemas
+from backend.difficulty.color_index import (
+    calculate_luminances,
+    contrast_ratios,
+    linearize_channel,
+    sample_color_pairs,
+)
+from backend.item_config.dedup import insert_new_item_configs, with_content_hash
+from backend.test_config.item_counts import adjust_item_count, get_item_count
+
+DIFFICULTY_RANGES = {
+    "easy": {
+        "contrast_min": 1.08,
+        "contrast_max": 1.11,
+        "triangle_size_min": 50,
+        "triangle_size_max": 100,
+        "time_visible_min": 300,
+        "time_visible_max": 500,
+    },
+    "medium": {
+        "contrast_min": 1.05,
+        "contrast_max": 1.07,
+        "triangle_size_min": 30,
+        "triangle_size_max": 70,
+        "time_visible_min": 150,
+        "time_visible_max": 300,
+    },
+    "hard": {
+        "contrast_min": 1.03,
+        "contrast_max": 1.05,
+        "triangle_size_min": 8,
+        "triangle_size_max": 15,
+        "time_visible_min": 50,
+        "time_visible_max": 100,
+    },
+}
+
+ORIENTATIONS = np.array(["N", "E", "S", "W"])
+
+# Number of generated item configs inserted per transaction
+FILL_CHUNK_SIZE = 5_000
+# Number of positions looked up per query when sampling a pool
+SAMPLE_CHUNK_SIZE = 500
 
 
 def calculate_luminance(color_hex):
@@ -11,11 +56,7 @@ def calculate_luminance(color_hex):
     color_hex = color_hex.lstrip("#")
     r, g, b = tuple(int(color_hex[i : i + 2], 16) for i in (0, 2, 4))
 
-    def linearize(c):
-        c = c / 255.0
-        return c / 12.92 if c <= 0.03928 else ((c + 0.055) / 1.055) ** 2.4
-
-    R, G, B = linearize(r), linearize(g), linearize(b)
+    R, G, B = linearize_channel(r), linearize_channel(g), linearize_channel(b)
     return 0.2126 * R + 0.7152 * G + 0.0722 * B
 
 
@@ -26,55 +67,129 @@ def contrast_ratio(l1, l2):
     return (lighter + 0.05) / (darker + 0.05)
 
 
+HEX_COLOR = re.compile(r"#?[0-9a-fA-F]{6}")
+
+
+def stimulus_metrics(
+    triangle_color: str, circle_color: str
+) -> Dict[str, Optional[float]]:
+    """Luminances and contrast ratio of an item's colors, as stored on ItemConfig.
+
+    Colors that are not given in hex format (e.g. "red") have no metrics.
+    """
+    if not (HEX_COLOR.fullmatch(triangle_color) and HEX_COLOR.fullmatch(circle_color)):
+        return {
+            "triangle_luminance": None,
+            "circle_luminance": None,
+            "contrast_ratio": None,
+        }
+    triangle_luminance = calculate_luminance(triangle_color)
+    circle_luminance = calculate_luminance(circle_color)
+    return {
+        "triangle_luminance": triangle_luminance,
+        "circle_luminance": circle_luminance,
+        "contrast_ratio": contrast_ratio(triangle_luminance, circle_luminance),
+    }
+
+
 def generate_color_pair_with_contrast(contrast_min, contrast_max):
     """Generate a pair of colors with a contrast ratio within the specified range."""
-    max_attempts = 1000
-    for _ in range(max_attempts):
-        # Generate two random colors
-        color1 = "#{:06x}".format(random.randint(0, 0xFFFFFF))
-        color2 = "#{:06x}".format(random.randint(0, 0xFFFFFF))
-        # Calculate luminance
-        l1 = calculate_luminance(color1)
-        l2 = calculate_luminance(color2)
-        cr = contrast_ratio(l1, l2)
-        if contrast_min <= cr <= contrast_max:
-            return color1, color2
-    raise Exception(
-        f"Could not find color pair with contrast between {contrast_min} and {contrast_max}"
+    color1, color2 = sample_color_pairs(contrast_min, contrast_max, 1)
+    return "#{:06x}".format(color1[0]), "#{:06x}".format(color2[0])
+
+
+def format_colors(colors: np.ndarray) -> List[str]:
+    """Format 24-bit integer colors as hex strings."""
+    return ["#{:06x}".format(color) for color in colors.tolist()]
+
+
+def generate_item_config_arrays(
+    difficulty: str, n: int, rng: Optional[np.random.Generator] = None
+) -> Dict[str, np.ndarray]:
+    """Generate the fields of `n` ItemConfigs for a difficulty level as arrays.
+
+    Colors are returned as 24-bit integers; use `format_colors` to get hex strings.
+    """
+    if difficulty not in DIFFICULTY_RANGES:
+        raise ValueError(f"Unknown difficulty level: {difficulty}")
+    ranges = DIFFICULTY_RANGES[difficulty]
+    rng = rng or np.random.default_rng()
+
+    triangle_size = rng.integers(
+        ranges["triangle_size_min"], ranges["triangle_size_max"] + 1, size=n
+    )
+    time_visible_ms = rng.integers(
+        ranges["time_visible_min"], ranges["time_visible_max"] + 1, size=n
     )
+    circle_size = rng.integers(300, 601, size=n)
+    color1, color2 = sample_color_pairs(
+        ranges["contrast_min"], ranges["contrast_max"], n, rng
+    )
+    # Randomly assign triangle_color and circle_color
+    swap = rng.integers(0, 2, size=n).astype(bool)
+    triangle_color = np.where(swap, color2, color1)
+    circle_color = np.where(swap, color1, color2)
+    orientation = ORIENTATIONS[rng.integers(0, len(ORIENTATIONS), size=n)]
+    return {
+        "triangle_size": triangle_size,
+        "triangle_color": triangle_color,
+        "circle_size": circle_size,
+        "circle_color": circle_color,
+        "time_visible_ms": time_visible_ms,
+        "orientation": orientation,
+    }
+
+
+def item_config_rows(arrays: Dict[str, np.ndarray]) -> List[dict]:
+    """Turn the arrays of `generate_item_config_arrays` into ItemConfig field dicts."""
+    fields = [
+        "triangle_size",
+        "triangle_color",
+        "circle_size",
+        "circle_color",
+        "time_visible_ms",
+        "orientation",
+    ]
+    columns = [
+        (
+            format_colors(arrays[field])
+            if field.endswith("_color")
+            else arrays[field].tolist()
+        )
+        for field in fields
+    ]
+    return [dict(zip(fields, values)) for values in zip(*columns)]
+
+
+def stimulus_metric_columns(arrays: Dict[str, np.ndarray]) -> Dict[str, List[float]]:
+    """Vectorized `stimulus_metrics` for the arrays of `generate_item_config_arrays`."""
+    triangle_luminance = calculate_luminances(arrays["triangle_color"])
+    circle_luminance = calculate_luminances(arrays["circle_color"])
+    return {
+        "triangle_luminance": triangle_luminance.tolist(),
+        "circle_luminance": circle_luminance.tolist(),
+        "contrast_ratio": contrast_ratios(
+            triangle_luminance, circle_luminance
+        ).tolist(),
+    }
+
+
+def generate_item_configs(
+    difficulty: str, n: int, rng: Optional[np.random.Generator] = None
+) -> List[schemas.ItemConfig]:
+    """Generate `n` ItemConfigs with parameters based on the difficulty level.
+
+    Batched equivalent of `generate_item_config` with the same distribution.
+    """
+    arrays = generate_item_config_arrays(difficulty, n, rng)
+    return [schemas.ItemConfig(**row) for row in item_config_rows(arrays)]
 
 
 def generate_item_config(difficulty: str) -> schemas.ItemConfig:
     """Generate an ItemConfig with parameters based on the difficulty level."""
-    difficulty_ranges = {
-        "easy": {
-            "contrast_min": 1.08,
-            "contrast_max": 1.11,
-            "triangle_size_min": 50,
-            "triangle_size_max": 100,
-            "time_visible_min": 300,
-            "time_visible_max": 500,
-        },
-        "medium": {
-            "contrast_min": 1.05,
-            "contrast_max": 1.07,
-            "triangle_size_min": 30,
-            "triangle_size_max": 70,
-            "time_visible_min": 150,
-            "time_visible_max": 300,
-        },
-        "hard": {
-            "contrast_min": 1.03,
-            "contrast_max": 1.05,
-            "triangle_size_min": 8,
-            "triangle_size_max": 15,
-            "time_visible_min": 50,
-            "time_visible_max": 100,
-        },
-    }
-    if difficulty not in difficulty_ranges:
+    if difficulty not in DIFFICULTY_RANGES:
         raise ValueError(f"Unknown difficulty level: {difficulty}")
-    ranges = difficulty_ranges[difficulty]
+    ranges = DIFFICULTY_RANGES[difficulty]
 
     # Generate triangle size
     triangle_size = random.randint(
@@ -118,74 +233,178 @@ def get_test_config_id_by_difficulty(difficulty: str):
 
 
 def get_item_config_count(db: Session, difficulty: str) -> int:
-    """Get the count of ItemConfigs associated with a difficulty level."""
+    """Get the count of ItemConfigs associated with a difficulty level.
+
+    Reads the maintained counter of the difficulty's TestConfig, so this does
+    not scan the pool.
+    """
+    return get_item_count(db, get_test_config_id_by_difficulty(difficulty))
+
+
+def get_next_position(db: Session, test_config_id: int) -> int:
+    """Return the position after the last item of a TestConfig."""
+    association = models.test_config_item_config_association
+    max_position = db.scalar(
+        select(func.max(association.c.position)).where(
+            association.c.test_config_id == test_config_id
+        )
+    )
+    return 0 if max_position is None else max_position + 1
+
+
+def insert_generated_item_configs(
+    db: Session,
+    difficulty: str,
+    test_config_id: int,
+    count: int,
+    chunk_size: int = FILL_CHUNK_SIZE,
+) -> List[int]:
+    """Generate up to `count` item configs for a difficulty and add them to a TestConfig.
+
+    Draws that repeat a stored item config are left out, so fewer items may be
+    added; the ids of those added are returned.
+
+    Rows are written with multi-row Core inserts in chunks of `chunk_size`, each
+    chunk in its own transaction. The generated ids come back through batched
+    INSERT ... RETURNING (SQLite >= 3.35 and PostgreSQL), so the association rows
+    can be inserted without reading the items back. All items of a chunk join the
+    same TestConfig, so the ids are not requested in parameter order, which would
+    force row-at-a-time inserts on SQLite.
+    """
+    association = models.test_config_item_config_association
+    next_position = get_next_position(db, test_config_id)
+    item_config_ids = []
+    for start in range(0, count, chunk_size):
+        arrays = generate_item_config_arrays(difficulty, min(chunk_size, count - start))
+        created = datetime.datetime.utcnow()
+        metrics = stimulus_metric_columns(arrays)
+        rows = [
+            with_content_hash(dict(row, created=created, **dict(zip(metrics, values))))
+            for row, values in zip(item_config_rows(arrays), zip(*metrics.values()))
+        ]
+        # The rare draw that repeats a stored item is left out of the pool
+        ids = insert_new_item_configs(db, rows)
+        db.execute(
+            insert(association),
+            [
+                {
+                    "test_config_id": test_config_id,
+                    "item_config_id": item_config_id,
+                    "position": next_position + i,
+                }
+                for i, item_config_id in enumerate(ids)
+            ],
+        )
+        adjust_item_count(db, test_config_id, len(ids))
+        db.commit()
+        next_position += len(ids)
+        item_config_ids.extend(ids)
+    return item_config_ids
+
+
+def get_or_create_difficulty_test_config(
+    db: Session, difficulty: str
+) -> models.TestConfig:
+    """Make sure the TestConfig backing a difficulty level exists and return it."""
     test_config_id = get_test_config_id_by_difficulty(difficulty)
-    count = (
-        db.query(models.ItemConfig)
-        .join(models.ItemConfig.test_configs)
+    test_config = (
+        db.query(models.TestConfig)
         .filter(models.TestConfig.id == test_config_id)
-        .count()
+        .first()
     )
-    return count
+
+    # If the TestConfig entry is missing, create it
+    if not test_config:
+        test_config = models.TestConfig(
+            id=test_config_id, name=f"{difficulty.capitalize()} TestConfig"
+        )
+        db.add(test_config)
+        db.commit()
+    return test_config
 
 
 def fill_item_configs(db: Session, target_count: int = 10_000):
     """Ensure there are at least `target_count` item configs for each difficulty level in the database,
     and make sure the required TestConfig entries are present."""
-    difficulties = ["easy", "medium", "hard"]
-    test_config_mapping = {"easy": 1, "medium": 3, "hard": 4}
-
-    for difficulty in difficulties:
+    for difficulty in DIFFICULTY_RANGES:
+        test_config = get_or_create_difficulty_test_config(db, difficulty)
         current_count = get_item_config_count(db, difficulty)
 
-        # Ensure TestConfig is present in the database
-        test_config_id = test_config_mapping[difficulty]
-        test_config = (
-            db.query(models.TestConfig)
-            .filter(models.TestConfig.id == test_config_id)
-            .first()
+        # Add new ItemConfigs until the target is reached, drawing again for
+        # draws that repeated a stored item
+        while current_count < target_count:
+            inserted = insert_generated_item_configs(
+                db, difficulty, test_config.id, target_count - current_count
+            )
+            if not inserted:
+                # Nearly every draw repeats a stored item
+                break
+            current_count += len(inserted)
+
+
+def _draw_positions(slots: int, k: int, tried: set) -> List[int]:
+    """Draw up to `k` distinct positions in `range(slots)` that are not in `tried`."""
+    remaining = slots - len(tried)
+    if remaining <= 2 * k:
+        return random.sample(
+            [p for p in range(slots) if p not in tried], min(k, remaining)
         )
+    drawn = set()
+    while len(drawn) < k:
+        position = random.randrange(slots)
+        if position not in tried:
+            drawn.add(position)
+    return list(drawn)
 
-        # If the TestConfig entry is missing, create it
-        if not test_config:
-            test_config = models.TestConfig(
-                id=test_config_id, name=f"{difficulty.capitalize()} TestConfig"
+
+def sample_item_config_ids(db: Session, test_config_id: int, limit: int) -> List[int]:
+    """Uniformly sample up to `limit` distinct item config ids of a TestConfig.
+
+    Draws random positions and looks them up through the (test_config_id,
+    position) index, so the cost grows with `limit`, not with the pool size.
+    Positions freed by deleted items are holes that are simply drawn again.
+    """
+    association = models.test_config_item_config_association
+    slots = get_next_position(db, test_config_id)
+    item_config_ids: List[int] = []
+    tried: set = set()
+    while len(item_config_ids) < limit and len(tried) < slots:
+        positions = _draw_positions(slots, limit - len(item_config_ids), tried)
+        tried.update(positions)
+        for start in range(0, len(positions), SAMPLE_CHUNK_SIZE):
+            found = dict(
+                db.execute(
+                    select(association.c.position, association.c.item_config_id).where(
+                        association.c.test_config_id == test_config_id,
+                        association.c.position.in_(
+                            positions[start : start + SAMPLE_CHUNK_SIZE]
+                        ),
+                    )
+                ).all()
             )
-            db.add(test_config)
-            db.commit()
-
-        # If current count is less than the target, add new ItemConfigs
-        if current_count < target_count:
-            items_to_create = target_count - current_count
-            for _ in range(items_to_create):
-                item_config_schema = generate_item_config(difficulty)
-                # Convert schema to model
-                item_config = models.ItemConfig(**item_config_schema.model_dump())
-                db.add(item_config)
-                # Associate item_config with test_config
-                test_config.item_configs.append(item_config)
-            db.commit()
+            item_config_ids.extend(
+                found[position]
+                for position in positions[start : start + SAMPLE_CHUNK_SIZE]
+                if position in found
+            )
+    return item_config_ids
 
 
 def get_item_configs_by_difficulty(
     db: Session, difficulty: str, limit: int = 10
 ) -> List[models.ItemConfig]:
-    """Retrieve a list of random ItemConfigs for a given difficulty level, generating more if needed."""
-    # Get the current count of item configs for the given difficulty
-    current_count = get_item_config_count(db, difficulty)
-
-    # If there are not enough item configs, fill them up to ensure we have at least the requested limit
-    if current_count < limit:
-        fill_item_configs(db, target_count=limit)
+    """Retrieve a list of random ItemConfigs for a given difficulty level.
 
-    # Retrieve item configs after ensuring we have enough
+    Only serves what is already in the pool, which may be fewer than `limit`
+    items; topping up the pool is left to the background replenisher.
+    """
     test_config_id = get_test_config_id_by_difficulty(difficulty)
-    item_configs = (
-        db.query(models.ItemConfig)
-        .join(models.ItemConfig.test_configs)
-        .filter(models.TestConfig.id == test_config_id)
-        .order_by(func.random())  # Order by random
-        .limit(limit)
+    item_config_ids = sample_item_config_ids(db, test_config_id, limit)
+    item_configs = {
+        item_config.id: item_config
+        for item_config in db.query(models.ItemConfig)
+        .filter(models.ItemConfig.id.in_(item_config_ids))
         .all()
-    )
-    return item_configs
+    }
+    # Keep the random order of the sample
+    return [item_configs[item_config_id] for item_config_id in item_config_ids]
@@ -0,0 +1,213 @@
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from backend import models, schemas
+from backend.difficulty.crud_difficulty import get_test_config_id_by_difficulty
+
+# Columns of schemas.ItemConfigResponse, in the order they are loaded
+FIELDS = [
+    "id",
+    "created",
+    "triangle_size",
+    "triangle_color",
+    "circle_size",
+    "circle_color",
+    "time_visible_ms",
+    "orientation",
+    "user_id",
+]
+
+
+class DifficultyPool:
+    """The item configs of one difficulty pool, stored column-wise in NumPy arrays.
+
+    Every item also keeps its ItemConfigResponse JSON, encoded once when it is
+    loaded: `fragments` holds all of them back to back and item `i` is
+    `fragments[offsets[i]:offsets[i + 1]]`.
+
+    Instances are never modified; extending a pool builds a new instance, so a
+    request can keep sampling from the instance it picked up without locking.
+    """
+
+    def __init__(
+        self,
+        columns: Dict[str, np.ndarray],
+        fragments: bytes,
+        offsets: np.ndarray,
+        next_position: int,
+    ):
+        self.columns = columns
+        self.fragments = fragments
+        self.offsets = offsets
+        self.next_position = next_position
+        self.loaded_at = time.monotonic()
+
+    def __len__(self):
+        return len(self.columns["id"])
+
+    @classmethod
+    def from_rows(cls, rows: List[tuple], next_position: int) -> "DifficultyPool":
+        values = list(zip(*rows)) if rows else [[] for _ in FIELDS]
+        columns = {
+            "id": np.array(values[0], dtype=np.int64),
+            "created": np.array(values[1], dtype="datetime64[us]"),
+            "triangle_size": np.array(values[2], dtype=np.int32),
+            "triangle_color": np.array(values[3], dtype=np.str_),
+            "circle_size": np.array(values[4], dtype=np.int32),
+            "circle_color": np.array(values[5], dtype=np.str_),
+            "time_visible_ms": np.array(values[6], dtype=np.int32),
+            "orientation": np.array(values[7], dtype=np.str_),
+            # -1 stands for items without an owner
+            "user_id": np.array(
+                [-1 if user_id is None else user_id for user_id in values[8]],
+                dtype=np.int64,
+            ),
+        }
+        encoded = [
+            schemas.ItemConfigResponse(**dict(zip(FIELDS, row)))
+            .model_dump_json()
+            .encode()
+            for row in rows
+        ]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(fragment) for fragment in encoded])
+        return cls(columns, b"".join(encoded), offsets, next_position)
+
+    def extended(self, other: "DifficultyPool") -> "DifficultyPool":
+        return DifficultyPool(
+            {
+                field: np.concatenate([self.columns[field], other.columns[field]])
+                for field in FIELDS
+            },
+            self.fragments + other.fragments,
+            np.concatenate([self.offsets, other.offsets[1:] + self.offsets[-1]]),
+            other.next_position,
+        )
+
+    def rows(self, indices: np.ndarray) -> List[dict]:
+        """Materialize the items at `indices` as ItemConfigResponse dicts."""
+        columns = {
+            field: self.columns[field][indices].tolist()
+            for field in FIELDS
+            if field != "user_id"
+        }
+        columns["user_id"] = [
+            None if user_id < 0 else user_id
+            for user_id in self.columns["user_id"][indices].tolist()
+        ]
+        return [dict(zip(FIELDS, values)) for values in zip(*columns.values())]
+
+    def json_array(self, indices: np.ndarray) -> bytes:
+        """Build the JSON array of the items at `indices` from their fragments."""
+        fragments = self.fragments
+        starts = self.offsets[indices].tolist()
+        ends = self.offsets[indices + 1].tolist()
+        return (
+            b"["
+            + b",".join(fragments[start:end] for start, end in zip(starts, ends))
+            + b"]"
+        )
+
+    def sample_indices(self, limit: int, rng: np.random.Generator) -> np.ndarray:
+        """Uniformly sample up to `limit` distinct row indices."""
+        return rng.choice(len(self), size=min(limit, len(self)), replace=False)
+
+
+class PoolCache:
+    """In-process cache of the difficulty pools, so game starts skip the database.
+
+    Pools are loaded on first use. The replenisher calls `extend` after each
+    chunk it writes, which appends the new items by position. CRUD writes to an
+    item of a cached pool drop that pool in the writing process, which reloads
+    it on next use. Other processes only see those writes once their pool is
+    empty or older than `refresh_interval_s` and is reloaded in full, so they
+    may serve deleted or outdated items for up to that long.
+    """
+
+    def __init__(self, refresh_interval_s: float = 30.0):
+        self.refresh_interval_s = refresh_interval_s
+        self._pools: Dict[str, DifficultyPool] = {}
+        self._lock = threading.Lock()
+
+    def _load(
+        self, db: Session, difficulty: str, since_position: int
+    ) -> DifficultyPool:
+        association = models.test_config_item_config_association
+        rows = db.execute(
+            select(
+                *[getattr(models.ItemConfig, field) for field in FIELDS],
+                association.c.position,
+            )
+            .join(association, association.c.item_config_id == models.ItemConfig.id)
+            .where(
+                association.c.test_config_id
+                == get_test_config_id_by_difficulty(difficulty),
+                association.c.position >= since_position,
+            )
+            .order_by(association.c.position)
+        ).all()
+        next_position = rows[-1][-1] + 1 if rows else since_position
+        return DifficultyPool.from_rows([row[:-1] for row in rows], next_position)
+
+    def get(self, db: Session, difficulty: str) -> DifficultyPool:
+        """Return the cached pool of a difficulty, loading or refreshing it if needed."""
+        pool = self._pools.get(difficulty)
+        if pool is None:
+            with self._lock:
+                pool = self._pools.get(difficulty)
+                if pool is None:
+                    pool = self._pools[difficulty] = self._load(db, difficulty, 0)
+        elif (
+            len(pool) == 0
+            or time.monotonic() - pool.loaded_at > self.refresh_interval_s
+        ):
+            # Items may have been changed or deleted by other processes, which
+            # extending by position would not notice
+            pool = self.reload(db, difficulty)
+        return pool
+
+    def reload(self, db: Session, difficulty: str) -> DifficultyPool:
+        """Replace the cached pool of a difficulty with a fresh load."""
+        with self._lock:
+            pool = self._pools[difficulty] = self._load(db, difficulty, 0)
+            return pool
+
+    def extend(self, db: Session, difficulty: str) -> Optional[DifficultyPool]:
+        """Append the items written to a cached pool since it was loaded."""
+        with self._lock:
+            pool = self._pools.get(difficulty)
+            if pool is None:
+                # Not loaded yet, the next `get` loads everything
+                return None
+            pool = self._pools[difficulty] = pool.extended(
+                self._load(db, difficulty, pool.next_position)
+            )
+            return pool
+
+    def invalidate(self, difficulty: Optional[str] = None):
+        """Drop one cached pool, or all of them."""
+        with self._lock:
+            if difficulty is None:
+                self._pools.clear()
+            else:
+                self._pools.pop(difficulty, None)
+
+    def invalidate_item(self, item_config_id: int):
+        """Drop every cached pool that contains the given item config."""
+        with self._lock:
+            for difficulty, pool in list(self._pools.items()):
+                if np.any(pool.columns["id"] == item_config_id):
+                    del self._pools[difficulty]
+
+    def sample(self, db: Session, difficulty: str, limit: int) -> List[dict]:
+        """Uniformly sample up to `limit` distinct items of a difficulty from memory."""
+        pool = self.get(db, difficulty)
+        return pool.rows(pool.sample_indices(limit, np.random.default_rng()))
+
+
+pool_cache = PoolCache()
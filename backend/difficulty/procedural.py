@@ -0,0 +1,165 @@
+import zlib
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from backend.difficulty.color_index import pairs_from_uniforms
+from backend.difficulty.crud_difficulty import (
+    DIFFICULTY_RANGES,
+    ORIENTATIONS,
+    format_colors,
+)
+
+GENERATOR_VERSION = 1
+
+# Ranges used by every generator version. Items are regenerated from their seed
+# whenever they are served or scored, so a change to the ranges or to the
+# generation below must add a new version and keep the old ranges here as they
+# were, otherwise stored results would point at different items.
+GENERATOR_RANGES = {1: DIFFICULTY_RANGES}
+
+# Seeds stay below 2^53 so they survive a round trip through JavaScript numbers
+SEED_LIMIT = 1 << 53
+
+# Independent random streams of an item
+_STREAM_TRIANGLE_SIZE = 0
+_STREAM_TIME_VISIBLE = 1
+_STREAM_CIRCLE_SIZE = 2
+_STREAM_SWAP = 3
+_STREAM_ORIENTATION = 4
+# Color pair attempt `r` uses the streams `_STREAM_COLORS + 2r` and `+ 2r + 1`
+_STREAM_COLORS = 5
+_COLOR_ATTEMPTS = 100
+
+_GOLDEN_GAMMA = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _splitmix64(x: np.ndarray) -> np.ndarray:
+    """The SplitMix64 output function, applied elementwise."""
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _uniforms(key: np.uint64, seeds: np.ndarray, stream: int) -> np.ndarray:
+    """Uniform numbers in [0, 1) for one stream of every seed.
+
+    Counter-based: the value depends only on the key, the seed and the stream, so
+    any item can be regenerated on its own, in any order and on any worker.
+    """
+    with np.errstate(over="ignore"):
+        state = (seeds ^ key) + np.uint64(stream + 1) * _GOLDEN_GAMMA
+    return (_splitmix64(state) >> np.uint64(11)) * (1.0 / (1 << 53))
+
+
+def _integers(u: np.ndarray, low: int, high: int) -> np.ndarray:
+    """Map uniform numbers to integers in [low, high]."""
+    return low + np.minimum((u * (high - low + 1)).astype(np.int64), high - low)
+
+
+def _generator_key(difficulty: str, generator_version: int) -> np.uint64:
+    return np.uint64(zlib.crc32(f"{difficulty}:{generator_version}".encode()) << 32)
+
+
+def is_procedural_identity(difficulty: str, generator_version: int, seed: int) -> bool:
+    """Whether (difficulty, generator_version, seed) identifies a procedural item."""
+    return (
+        generator_version in GENERATOR_RANGES
+        and difficulty in GENERATOR_RANGES[generator_version]
+        and 0 <= seed < SEED_LIMIT
+    )
+
+
+def generate_procedural_arrays(
+    difficulty: str,
+    seeds: np.ndarray,
+    generator_version: int = GENERATOR_VERSION,
+) -> Dict[str, np.ndarray]:
+    """Regenerate the fields of the items identified by (difficulty, version, seed).
+
+    Same distribution as `generate_item_config_arrays`, but every field is a pure
+    function of the identity. Colors are returned as 24-bit integers.
+    """
+    if generator_version not in GENERATOR_RANGES:
+        raise ValueError(f"Unknown generator version: {generator_version}")
+    if difficulty not in GENERATOR_RANGES[generator_version]:
+        raise ValueError(f"Unknown difficulty level: {difficulty}")
+    ranges = GENERATOR_RANGES[generator_version][difficulty]
+    seeds = np.asarray(seeds, dtype=np.uint64)
+    key = _generator_key(difficulty, generator_version)
+    n = len(seeds)
+
+    color1 = np.empty(n, dtype=np.int64)
+    color2 = np.empty(n, dtype=np.int64)
+    missing = np.arange(n)
+    for attempt in range(_COLOR_ATTEMPTS):
+        if len(missing) == 0:
+            break
+        stream = _STREAM_COLORS + 2 * attempt
+        first, second, valid = pairs_from_uniforms(
+            ranges["contrast_min"],
+            ranges["contrast_max"],
+            _uniforms(key, seeds[missing], stream),
+            _uniforms(key, seeds[missing], stream + 1),
+        )
+        color1[missing[valid]] = first[valid]
+        color2[missing[valid]] = second[valid]
+        missing = missing[~valid]
+    if len(missing):
+        raise ValueError(
+            f"No color pair can have a contrast between {ranges['contrast_min']} "
+            f"and {ranges['contrast_max']}"
+        )
+
+    swap = _uniforms(key, seeds, _STREAM_SWAP) < 0.5
+    return {
+        "triangle_size": _integers(
+            _uniforms(key, seeds, _STREAM_TRIANGLE_SIZE),
+            ranges["triangle_size_min"],
+            ranges["triangle_size_max"],
+        ),
+        "triangle_color": np.where(swap, color2, color1),
+        "circle_size": _integers(_uniforms(key, seeds, _STREAM_CIRCLE_SIZE), 300, 600),
+        "circle_color": np.where(swap, color1, color2),
+        "time_visible_ms": _integers(
+            _uniforms(key, seeds, _STREAM_TIME_VISIBLE),
+            ranges["time_visible_min"],
+            ranges["time_visible_max"],
+        ),
+        "orientation": ORIENTATIONS[
+            _integers(
+                _uniforms(key, seeds, _STREAM_ORIENTATION), 0, len(ORIENTATIONS) - 1
+            )
+        ],
+    }
+
+
+def generate_procedural_items(
+    difficulty: str,
+    seeds: List[int],
+    generator_version: int = GENERATOR_VERSION,
+) -> List[dict]:
+    """Regenerate items as ProceduralItemConfigResponse dicts."""
+    arrays = generate_procedural_arrays(difficulty, seeds, generator_version)
+    columns = {
+        field: (format_colors(values) if field.endswith("_color") else values.tolist())
+        for field, values in arrays.items()
+    }
+    return [
+        dict(
+            zip(columns, values),
+            difficulty=difficulty,
+            generator_version=generator_version,
+            seed=seed,
+        )
+        for seed, values in zip(np.asarray(seeds).tolist(), zip(*columns.values()))
+    ]
+
+
+def sample_procedural_items(
+    difficulty: str, limit: int, rng: Optional[np.random.Generator] = None
+) -> List[dict]:
+    """Draw `limit` fresh items of a difficulty without touching the database."""
+    rng = rng or np.random.default_rng()
+    seeds = rng.integers(0, SEED_LIMIT, size=limit, dtype=np.uint64)
+    return generate_procedural_items(difficulty, seeds)
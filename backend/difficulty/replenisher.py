@@ -0,0 +1,145 @@
+import datetime
+import logging
+import threading
+from typing import Callable, Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from backend.config import settings
+from backend.database import SessionLocal
+from backend.difficulty.crud_difficulty import (
+    DIFFICULTY_RANGES,
+    FILL_CHUNK_SIZE,
+    get_item_config_count,
+    get_or_create_difficulty_test_config,
+    insert_generated_item_configs,
+)
+from backend.difficulty.pool_cache import pool_cache
+
+logger = logging.getLogger(__name__)
+
+
+class PoolReplenisher:
+    """Keeps the item pool of every difficulty between a low and a high watermark.
+
+    Runs in a background thread so that neither startup nor requests wait for
+    item generation. Whenever a pool is below `low_watermark` it is topped up to
+    `high_watermark` chunk by chunk; each chunk is committed on its own, so
+    requests can serve the new items while the fill is still running.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        low_watermark: int = settings.POOL_LOW_WATERMARK,
+        high_watermark: int = settings.POOL_HIGH_WATERMARK,
+        chunk_size: int = FILL_CHUNK_SIZE,
+        interval_s: float = 60.0,
+    ):
+        self.session_factory = session_factory
+        self.low_watermark = low_watermark
+        self.high_watermark = max(high_watermark, low_watermark)
+        self.chunk_size = chunk_size
+        self.interval_s = interval_s
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._status: Dict[str, dict] = {
+            difficulty: {
+                "count": None,
+                "filling": False,
+                "last_filled": None,
+                "last_error": None,
+            }
+            for difficulty in DIFFICULTY_RANGES
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start the background thread, which immediately checks all pools."""
+        if self.running:
+            return
+        self._stopping.clear()
+        self._wakeup.set()
+        self._thread = threading.Thread(
+            target=self._run, name="pool-replenisher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop the background thread after the chunk it is currently writing."""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def request_refill(self):
+        """Ask the background thread to check the pools now."""
+        self._wakeup.set()
+
+    def status(self) -> Dict[str, dict]:
+        with self._lock:
+            return {
+                difficulty: dict(status) for difficulty, status in self._status.items()
+            }
+
+    def _update_status(self, difficulty: str, **values):
+        with self._lock:
+            self._status[difficulty].update(values)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.interval_s)
+            self._wakeup.clear()
+            if self._stopping.is_set():
+                break
+            self.replenish()
+
+    def replenish(self):
+        """Top up every pool that is below the low watermark."""
+        for difficulty in DIFFICULTY_RANGES:
+            if self._stopping.is_set():
+                return
+            db = self.session_factory()
+            try:
+                self._replenish_difficulty(db, difficulty)
+                self._update_status(difficulty, last_error=None)
+            except Exception as e:
+                db.rollback()
+                logger.exception("Replenishing the %s pool failed", difficulty)
+                self._update_status(difficulty, last_error=str(e))
+            finally:
+                self._update_status(difficulty, filling=False)
+                db.close()
+
+    def _replenish_difficulty(self, db: Session, difficulty: str):
+        test_config = get_or_create_difficulty_test_config(db, difficulty)
+        count = get_item_config_count(db, difficulty)
+        self._update_status(difficulty, count=count)
+        if count >= self.low_watermark:
+            return
+
+        self._update_status(difficulty, filling=True)
+        while count < self.high_watermark and not self._stopping.is_set():
+            chunk = min(self.chunk_size, self.high_watermark - count)
+            # Draws that repeat a stored item are not inserted
+            inserted = len(
+                insert_generated_item_configs(
+                    db, difficulty, test_config.id, chunk, chunk_size=chunk
+                )
+            )
+            count += inserted
+            self._update_status(difficulty, count=count)
+            pool_cache.extend(db, difficulty)
+            if inserted == 0:
+                # Nearly every draw repeats a stored item, the next run retries
+                break
+        self._update_status(difficulty, last_filled=datetime.datetime.utcnow())
+
+
+pool_replenisher = PoolReplenisher()
@@ -0,0 +1,54 @@
+import datetime
+import secrets
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from backend.config import settings
+from backend.utils import get_db
+from .results_export import MEDIA_TYPES, arrow_available, export_results
+
+router = APIRouter()
+
+
+def check_api_key(x_api_key: Optional[str] = Header(None)):
+    if settings.EXPORT_API_KEY is None:
+        raise HTTPException(status_code=404, detail="Export is disabled")
+    if x_api_key is None or not secrets.compare_digest(
+        x_api_key, settings.EXPORT_API_KEY
+    ):
+        raise HTTPException(status_code=401, detail="Invalid API key")
+
+
+# Endpoint to download the results joined with their item configs, streamed in
+# chunks so that the export never has to fit into memory
+@router.get("/results", dependencies=[Depends(check_api_key)])
+def export_results_endpoint(
+    format: Literal["csv", "arrow"] = "csv",
+    created_after: Optional[datetime.datetime] = None,
+    created_before: Optional[datetime.datetime] = None,
+    test_config_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+):
+    if format == "arrow" and not arrow_available():
+        raise HTTPException(
+            status_code=422, detail="The arrow format needs pyarrow installed"
+        )
+    pieces = export_results(
+        # The stream outlives the request session, so it reads on its own
+        # connection of the same engine
+        db.get_bind(),
+        format=format,
+        created_after=created_after,
+        created_before=created_before,
+        test_config_id=test_config_id,
+        user_id=user_id,
+    )
+    return StreamingResponse(
+        pieces,
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="results.{format}"'},
+    )
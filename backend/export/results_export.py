@@ -0,0 +1,224 @@
+"""Export of item config results for analysis.
+
+The results are joined with their item configs and the test config results
+they belong to, and streamed in chunks of `CHUNK_SIZE` rows from a server-side
+cursor, so memory stays constant however many results are exported. Run this
+module to write an export to a file or stdout:
+
+    python -m backend.export.results_export --format csv --output results.csv \
+        --created-after 2024-01-01 --test-config-id 3
+
+The "arrow" format writes an Arrow IPC stream and needs pyarrow installed.
+"""
+
+import argparse
+import csv
+import datetime
+import io
+import sys
+from typing import Iterator, Optional
+
+from sqlalchemy import Engine, select
+
+from backend import models
+from backend.database import engine as default_engine
+
+CHUNK_SIZE = 10_000
+
+FORMATS = ("csv", "arrow")
+MEDIA_TYPES = {"csv": "text/csv", "arrow": "application/vnd.apache.arrow.stream"}
+
+_result = models.ItemConfigResult
+_item_config = models.ItemConfig
+_test_config_result = models.TestConfigResult
+_association = models.test_config_result_item_config_result_association
+
+# Exported column names and their columns. Procedural results have no item
+# config, their stimulus columns are empty.
+COLUMNS = {
+    "id": _result.id,
+    "created": _result.created,
+    "user_id": _result.user_id,
+    "test_config_result_id": _test_config_result.id,
+    "test_config_id": _test_config_result.test_config_id,
+    "correct": _result.correct,
+    "reaction_time_ms": _result.reaction_time_ms,
+    "response": _result.response,
+    "item_config_id": _result.item_config_id,
+    "item_difficulty": _result.item_difficulty,
+    "item_generator_version": _result.item_generator_version,
+    "item_seed": _result.item_seed,
+    "triangle_size": _item_config.triangle_size,
+    "triangle_color": _item_config.triangle_color,
+    "circle_size": _item_config.circle_size,
+    "circle_color": _item_config.circle_color,
+    "time_visible_ms": _item_config.time_visible_ms,
+    "orientation": _item_config.orientation,
+    "triangle_luminance": _item_config.triangle_luminance,
+    "circle_luminance": _item_config.circle_luminance,
+    "contrast_ratio": _item_config.contrast_ratio,
+}
+
+
+def export_query(
+    created_after: Optional[datetime.datetime] = None,
+    created_before: Optional[datetime.datetime] = None,
+    test_config_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+):
+    """The exported rows in creation order.
+
+    A result that belongs to several test config results is exported once for
+    each of them; with a test config filter only results of that test config
+    are exported.
+    """
+    query = (
+        select(*(column.label(name) for name, column in COLUMNS.items()))
+        .select_from(_result)
+        .outerjoin(_item_config, _item_config.id == _result.item_config_id)
+        .outerjoin(_association, _association.c.item_config_result_id == _result.id)
+        .outerjoin(
+            _test_config_result,
+            _test_config_result.id == _association.c.test_config_result_id,
+        )
+        # Walks the index on created instead of sorting the export
+        .order_by(_result.created, _result.id)
+    )
+    if created_after is not None:
+        query = query.where(_result.created >= created_after)
+    if created_before is not None:
+        query = query.where(_result.created < created_before)
+    if test_config_id is not None:
+        # Looks up the results of the test config first, instead of checking
+        # every result in creation order
+        results_of_test_config = (
+            select(_association.c.item_config_result_id)
+            .join(
+                _test_config_result,
+                _test_config_result.id == _association.c.test_config_result_id,
+            )
+            .where(_test_config_result.test_config_id == test_config_id)
+        )
+        query = query.where(
+            _result.id.in_(results_of_test_config),
+            _test_config_result.test_config_id == test_config_id,
+        )
+    if user_id is not None:
+        query = query.where(_result.user_id == user_id)
+    return query
+
+
+def stream_rows(engine: Engine, query, chunk_size: int = CHUNK_SIZE) -> Iterator:
+    """The rows of `query` in lists of at most `chunk_size` rows.
+
+    Uses its own connection so that it can outlive the request session.
+    """
+    with engine.connect() as conn:
+        result = conn.execution_options(
+            stream_results=True, yield_per=chunk_size
+        ).execute(query)
+        yield from result.partitions()
+
+
+def csv_chunks(chunks) -> Iterator[bytes]:
+    """Encode row chunks as CSV with a header row, one piece per chunk."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # Only the header, nothing was exported
+        yield buffer.getvalue().encode()
+
+
+def arrow_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def arrow_chunks(chunks) -> Iterator[bytes]:
+    """Encode row chunks as an Arrow IPC stream, one record batch per chunk."""
+    import pyarrow as pa
+
+    types = {
+        int: pa.int64(),
+        float: pa.float64(),
+        str: pa.string(),
+        bool: pa.bool_(),
+        datetime.datetime: pa.timestamp("us"),
+    }
+    schema = pa.schema(
+        [(name, types[column.type.python_type]) for name, column in COLUMNS.items()]
+    )
+    sink = io.BytesIO()
+
+    def take():
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    with pa.ipc.new_stream(sink, schema) as writer:
+        yield take()
+        for rows in chunks:
+            writer.write_batch(
+                pa.RecordBatch.from_arrays(
+                    [
+                        pa.array(values, type=field.type)
+                        for values, field in zip(zip(*rows), schema)
+                    ],
+                    schema=schema,
+                )
+            )
+            yield take()
+    yield take()
+
+
+def export_results(
+    engine: Engine, format: str = "csv", chunk_size: int = CHUNK_SIZE, **filters
+) -> Iterator[bytes]:
+    """The encoded export of the results matching `filters`, see `export_query`."""
+    chunks = stream_rows(engine, export_query(**filters), chunk_size)
+    return arrow_chunks(chunks) if format == "arrow" else csv_chunks(chunks)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--output", help="file to write, stdout if omitted")
+    parser.add_argument("--created-after", type=datetime.datetime.fromisoformat)
+    parser.add_argument("--created-before", type=datetime.datetime.fromisoformat)
+    parser.add_argument("--test-config-id", type=int)
+    parser.add_argument("--user-id", type=int)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+    if args.format == "arrow" and not arrow_available():
+        parser.error("the arrow format needs pyarrow installed")
+
+    pieces = export_results(
+        default_engine,
+        format=args.format,
+        chunk_size=args.chunk_size,
+        created_after=args.created_after,
+        created_before=args.created_before,
+        test_config_id=args.test_config_id,
+        user_id=args.user_id,
+    )
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for piece in pieces:
+            out.write(piece)
+    finally:
+        if args.output:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
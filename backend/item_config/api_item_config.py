@@ -1,14 +1,21 @@
-from fastapi import HTTPException, Depends, APIRouter
+import datetime
+from typing import Optional
+
+from fastapi import HTTPException, Depends, APIRouter, Query, Response
 from sqlalchemy.orm import Session
 
 from backend import schemas
 from backend.item_config.crud_item_config import (
+    apply_item_config_batch,
     create_item_config,
-    get_all_item_configs,
+    count_item_configs,
+    get_item_configs,
     delete_item_config,
     update_item_config,
     get_item_config_by_id,
+    get_item_configs_by_contrast,
 )
+from backend.difficulty.crud_difficulty import DIFFICULTY_RANGES
 from backend.user.api_user import get_current_user
 from backend.utils import get_db
 
@@ -25,10 +32,59 @@ def create_item_config_endpoint(
     return create_item_config(db=db, item_config=item_config, user=user)
 
 
-# Endpoint to get all item configs
+# Endpoint to create, update, delete and link many item configs in one
+# transaction, optionally making them the items of a test config
+@router.post("/batch", response_model=schemas.ItemConfigBatchResponse)
+def apply_item_config_batch_endpoint(
+    batch: schemas.ItemConfigBatch,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    return apply_item_config_batch(db, batch=batch, user=user)
+
+
+# Endpoint to get a page of item configs. The cursor of the next page is
+# returned in the X-Next-Cursor header (absent on the last page) and, when
+# requested, the number of matching item configs in X-Total-Count.
 @router.get("/", response_model=list[schemas.ItemConfigResponse])
-def read_all_item_configs_endpoint(db: Session = Depends(get_db)):
-    return get_all_item_configs(db)
+def read_all_item_configs_endpoint(
+    response: Response,
+    after_id: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    user_id: Optional[int] = None,
+    difficulty: Optional[str] = None,
+    created_after: Optional[datetime.datetime] = None,
+    created_before: Optional[datetime.datetime] = None,
+    include_total: bool = False,
+    db: Session = Depends(get_db),
+):
+    if difficulty is not None and difficulty not in DIFFICULTY_RANGES:
+        raise HTTPException(status_code=404, detail="Invalid difficulty level")
+    filters = {
+        "user_id": user_id,
+        "difficulty": difficulty,
+        "created_after": created_after,
+        "created_before": created_before,
+    }
+    item_configs, next_cursor = get_item_configs(
+        db, after_id=after_id, limit=limit, **filters
+    )
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
+    if include_total:
+        response.headers["X-Total-Count"] = str(count_item_configs(db, **filters))
+    return item_configs
+
+
+# Endpoint to get the item configs within a contrast ratio range
+@router.get("/by_contrast", response_model=list[schemas.ItemConfigResponse])
+def read_item_configs_by_contrast_endpoint(
+    contrast_min: float,
+    contrast_max: float,
+    limit: int = Query(500, ge=1, le=5000),
+    db: Session = Depends(get_db),
+):
+    return get_item_configs_by_contrast(db, contrast_min, contrast_max, limit)
 
 
 # Endpoint to get an item config by id
@@ -0,0 +1,49 @@
+import hashlib
+from typing import Optional
+
+CONTENT_FIELDS = (
+    "triangle_size",
+    "triangle_color",
+    "circle_size",
+    "circle_color",
+    "time_visible_ms",
+    "orientation",
+)
+
+
+def item_config_content_hash(
+    triangle_size: int,
+    triangle_color: str,
+    circle_size: int,
+    circle_color: str,
+    time_visible_ms: int,
+    orientation: str,
+    user_id: Optional[int] = None,
+) -> str:
+    """Canonical SHA-256 of an item config's stimulus parameters and owner.
+
+    Colors are compared case-insensitively. The owner is part of the identity so
+    that deduplication never hands one user's item config to another, who could
+    then not update or delete it.
+    """
+    canonical = "|".join(
+        [
+            str(triangle_size),
+            triangle_color.strip().lower(),
+            str(circle_size),
+            circle_color.strip().lower(),
+            str(time_visible_ms),
+            orientation,
+            "" if user_id is None else str(user_id),
+        ]
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def content_hash_default(context) -> str:
+    """Column default computing `content_hash` from the inserted row."""
+    parameters = context.get_current_parameters()
+    return item_config_content_hash(
+        *(parameters[field] for field in CONTENT_FIELDS),
+        user_id=parameters.get("user_id"),
+    )
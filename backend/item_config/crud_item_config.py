@@ -1,25 +1,151 @@
+import datetime
+from typing import List, Optional, Tuple
+
 from fastapi import HTTPException
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
+from sqlalchemy import delete, func, select, update
+
 from backend import models, schemas
+from backend.difficulty.crud_difficulty import (
+    get_item_config_count,
+    get_test_config_id_by_difficulty,
+    stimulus_metrics,
+)
+from backend.difficulty.pool_cache import pool_cache
+from backend.item_config.dedup import (
+    get_ids_by_content_hash,
+    upsert_item_configs,
+    with_content_hash,
+)
+from backend.stats.user_stats import adjust_answers_in_games, adjust_answers_of_users
+from backend.test_config.crud_test_config import set_test_config_items
+from backend.test_config.item_counts import adjust_item_count
+
+
+def _item_config_row(item_config: schemas.ItemConfig, user_id: Optional[int]) -> dict:
+    """Column values of an ItemConfig, including its metrics and content hash."""
+    return with_content_hash(
+        dict(
+            item_config.model_dump(),
+            **stimulus_metrics(item_config.triangle_color, item_config.circle_color),
+            user_id=user_id,
+        )
+    )
 
 
 def create_item_config(db: Session, item_config: schemas.ItemConfig, user: models.User):
-    db_item_config = models.ItemConfig(**item_config.model_dump(), user_id=user.id)
-    db.add(db_item_config)
+    """Create an ItemConfig, or return the user's identical one if it exists."""
+    row = dict(
+        _item_config_row(item_config, user.id), created=datetime.datetime.utcnow()
+    )
     try:
+        (item_config_id,) = upsert_item_configs(db, [row])
         db.commit()
     except IntegrityError as e:
         db.rollback()
         raise HTTPException(status_code=422, detail=f"Constraint error: {e.orig}")
 
-    db.refresh(db_item_config)
-    return db_item_config
+    return db.get(models.ItemConfig, item_config_id)
+
+
+def _filter_item_configs(
+    query,
+    user_id: Optional[int] = None,
+    difficulty: Optional[str] = None,
+    created_after: Optional[datetime.datetime] = None,
+    created_before: Optional[datetime.datetime] = None,
+):
+    if user_id is not None:
+        query = query.filter(models.ItemConfig.user_id == user_id)
+    if difficulty is not None:
+        association = models.test_config_item_config_association
+        query = query.join(
+            association, association.c.item_config_id == models.ItemConfig.id
+        ).filter(
+            association.c.test_config_id == get_test_config_id_by_difficulty(difficulty)
+        )
+    if created_after is not None:
+        query = query.filter(models.ItemConfig.created >= created_after)
+    if created_before is not None:
+        query = query.filter(models.ItemConfig.created < created_before)
+    return query
+
+
+def get_item_configs(
+    db: Session,
+    after_id: Optional[int] = None,
+    limit: int = 100,
+    user_id: Optional[int] = None,
+    difficulty: Optional[str] = None,
+    created_after: Optional[datetime.datetime] = None,
+    created_before: Optional[datetime.datetime] = None,
+) -> Tuple[List[models.ItemConfig], Optional[int]]:
+    """Return one page of ItemConfigs in id order and the cursor of the next page.
+
+    Keyset pagination: the page starts after the id `after_id` instead of at an
+    offset, so every page costs the same however deep it is. The cursor is None
+    on the last page.
+    """
+    query = _filter_item_configs(
+        db.query(models.ItemConfig),
+        user_id=user_id,
+        difficulty=difficulty,
+        created_after=created_after,
+        created_before=created_before,
+    )
+    if after_id is not None:
+        query = query.filter(models.ItemConfig.id > after_id)
+    # One extra row tells whether there is a next page
+    item_configs = query.order_by(models.ItemConfig.id).limit(limit + 1).all()
+    if len(item_configs) > limit:
+        return item_configs[:limit], item_configs[limit - 1].id
+    return item_configs, None
 
 
-def get_all_item_configs(db: Session):
-    return db.query(models.ItemConfig).all()
+def count_item_configs(
+    db: Session,
+    user_id: Optional[int] = None,
+    difficulty: Optional[str] = None,
+    created_after: Optional[datetime.datetime] = None,
+    created_before: Optional[datetime.datetime] = None,
+) -> int:
+    """Count the ItemConfigs matching the filters of `get_item_configs`.
+
+    A difficulty pool without further filters is answered from its maintained
+    item count.
+    """
+    other_filters = (user_id, created_after, created_before)
+    if difficulty is not None and all(value is None for value in other_filters):
+        return get_item_config_count(db, difficulty)
+    query = _filter_item_configs(
+        db.query(func.count(models.ItemConfig.id)),
+        user_id=user_id,
+        difficulty=difficulty,
+        created_after=created_after,
+        created_before=created_before,
+    )
+    return query.scalar()
+
+
+def get_item_configs_by_contrast(
+    db: Session, contrast_min: float, contrast_max: float, limit: int = 500
+):
+    """Return ItemConfigs whose contrast ratio lies in [contrast_min, contrast_max].
+
+    Served by the index on `contrast_ratio`, in ascending contrast order.
+    """
+    return (
+        db.query(models.ItemConfig)
+        .filter(
+            models.ItemConfig.contrast_ratio >= contrast_min,
+            models.ItemConfig.contrast_ratio <= contrast_max,
+        )
+        .order_by(models.ItemConfig.contrast_ratio)
+        .limit(limit)
+        .all()
+    )
 
 
 def get_item_config_by_id(db: Session, item_config_id: int):
@@ -45,14 +171,22 @@ def update_item_config(
                 status_code=401,
                 detail=f"User {user.id} does not have access to Item Config with id {item_config_id}",
             )
-        db_item_config.triangle_size = item_config.triangle_size
-        db_item_config.triangle_color = item_config.triangle_color
-        db_item_config.circle_size = item_config.circle_size
-        db_item_config.circle_color = item_config.circle_color
-        db_item_config.time_visible_ms = item_config.time_visible_ms
-        db_item_config.orientation = item_config.orientation
-        db.commit()
+        row = _item_config_row(item_config, user.id)
+        for field, value in row.items():
+            setattr(db_item_config, field, value)
+        try:
+            db.commit()
+        except IntegrityError as e:
+            db.rollback()
+            identical_ids = get_ids_by_content_hash(db, [row["content_hash"]])
+            if identical_ids:
+                raise HTTPException(
+                    status_code=422,
+                    detail=f"An identical Item Config already exists with id {identical_ids[row['content_hash']]}",
+                )
+            raise HTTPException(status_code=422, detail=f"Constraint error: {e.orig}")
         db.refresh(db_item_config)
+        pool_cache.invalidate_item(item_config_id)
     return db_item_config
 
 
@@ -69,12 +203,190 @@ def delete_item_config(db: Session, item_config_id: int, user: models.User):
                 status_code=401,
                 detail=f"User {user.id} does not have access to Item Config with id {item_config_id}",
             )
+        association = models.test_config_item_config_association
+        for test_config_id in db.scalars(
+            select(association.c.test_config_id).where(
+                association.c.item_config_id == item_config_id
+            )
+        ).all():
+            adjust_item_count(db, test_config_id, -1)
+        # also delete all item config results associated with this item config,
+        # before the item config's delete would set their item_config_id to NULL
+        _delete_results_of_item_configs(db, [item_config_id])
         db.delete(db_item_config)
 
-        # also delete all item config results associated with this item config
-        db.query(models.ItemConfigResult).filter(
-            models.ItemConfigResult.item_config_id == item_config_id
-        ).delete()
-
         db.commit()
+        pool_cache.invalidate_item(item_config_id)
     return db_item_config
+
+
+def _insert_item_configs(
+    db: Session, item_configs: List[schemas.ItemConfig], user: models.User
+) -> List[int]:
+    """Insert item configs in bulk, resolving duplicates to the stored ones.
+
+    Returns the ids in the order of `item_configs`.
+    """
+    created = datetime.datetime.utcnow()
+    rows = [
+        dict(_item_config_row(item_config, user.id), created=created)
+        for item_config in item_configs
+    ]
+    return upsert_item_configs(db, rows)
+
+
+def _delete_results_of_item_configs(db: Session, item_config_ids: List[int]):
+    """Delete the results of item configs and their links to games, and take
+    them out of the statistics of their users."""
+    of_item_configs = models.ItemConfigResult.item_config_id.in_(item_config_ids)
+    adjust_answers_of_users(db, of_item_configs, sign=-1)
+    adjust_answers_in_games(db, of_item_configs, sign=-1)
+    result_links = models.test_config_result_item_config_result_association
+    db.execute(
+        delete(result_links).where(
+            result_links.c.item_config_result_id.in_(
+                select(models.ItemConfigResult.id).where(of_item_configs)
+            )
+        )
+    )
+    db.execute(delete(models.ItemConfigResult).where(of_item_configs))
+
+
+def _delete_item_configs(db: Session, item_config_ids: List[int]):
+    """Bulk version of `delete_item_config` for already authorized ids."""
+    association = models.test_config_item_config_association
+    for test_config_id, count in db.execute(
+        select(association.c.test_config_id, func.count())
+        .where(association.c.item_config_id.in_(item_config_ids))
+        .group_by(association.c.test_config_id)
+    ).all():
+        adjust_item_count(db, test_config_id, -count)
+    db.execute(
+        delete(association).where(association.c.item_config_id.in_(item_config_ids))
+    )
+    _delete_results_of_item_configs(db, item_config_ids)
+    db.execute(
+        delete(models.ItemConfig).where(models.ItemConfig.id.in_(item_config_ids))
+    )
+
+
+def _set_test_config_items(
+    db: Session, batch: schemas.ItemConfigBatch, item_config_ids: List[int], user
+) -> int:
+    """Make `item_config_ids` the items of the batch's target test config."""
+    if batch.test_config_id is None:
+        db_test_config = models.TestConfig(name=batch.test_config_name, user_id=user.id)
+        db.add(db_test_config)
+        db.flush()
+    else:
+        db_test_config = (
+            db.query(models.TestConfig)
+            .filter(models.TestConfig.id == batch.test_config_id)
+            .first()
+        )
+        if db_test_config is None:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Test config with id {batch.test_config_id} not found",
+            )
+        if db_test_config.user_id != user.id:
+            raise HTTPException(
+                status_code=401,
+                detail=f"User {user.id} is not authorized to update test config {batch.test_config_id}",
+            )
+        if batch.test_config_name is not None:
+            db_test_config.name = batch.test_config_name
+    adjust_item_count(
+        db,
+        db_test_config.id,
+        set_test_config_items(db, db_test_config.id, item_config_ids),
+    )
+    return db_test_config.id
+
+
+def apply_item_config_batch(
+    db: Session, batch: schemas.ItemConfigBatch, user: models.User
+):
+    """Apply item config creates, updates, deletes and links in one transaction.
+
+    Each kind of operation is a single bulk statement (or a few, for large
+    creates), and the whole batch is committed once. Returns the item config id
+    of every operation in order and the id of the target test config.
+
+    Creates of identical content, within the batch or with a stored item config
+    of the user, resolve to the same id; the test config holds that item once.
+    """
+    operations = batch.operations
+    existing_ids = {
+        operation.id
+        for operation in operations
+        if operation.action in ("update", "delete")
+    }
+    linked_ids = {
+        operation.id for operation in operations if operation.action == "link"
+    }
+    owners = dict(
+        db.execute(
+            select(models.ItemConfig.id, models.ItemConfig.user_id).where(
+                models.ItemConfig.id.in_(existing_ids | linked_ids)
+            )
+        ).all()
+    )
+    # Any item config can be linked, only the user's own can be changed
+    for item_config_id in sorted(existing_ids | linked_ids):
+        if item_config_id not in owners:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Item Config with id {item_config_id} not found",
+            )
+    for item_config_id in existing_ids:
+        if owners[item_config_id] != user.id:
+            raise HTTPException(
+                status_code=401,
+                detail=f"User {user.id} does not have access to Item Config with id {item_config_id}",
+            )
+
+    try:
+        created_ids = iter(
+            _insert_item_configs(
+                db,
+                [op.item_config for op in operations if op.action == "create"],
+                user,
+            )
+        )
+        item_config_ids = [
+            next(created_ids) if op.action == "create" else op.id for op in operations
+        ]
+
+        updates = [
+            dict(_item_config_row(op.item_config, user.id), id=op.id)
+            for op in operations
+            if op.action == "update"
+        ]
+        if updates:
+            db.execute(update(models.ItemConfig), updates)
+
+        deleted_ids = [op.id for op in operations if op.action == "delete"]
+        if deleted_ids:
+            _delete_item_configs(db, deleted_ids)
+
+        test_config_id = None
+        if batch.test_config_id is not None or batch.test_config_name is not None:
+            test_config_id = _set_test_config_items(
+                db,
+                batch,
+                [
+                    item_config_id
+                    for op, item_config_id in zip(operations, item_config_ids)
+                    if op.action != "delete"
+                ],
+                user,
+            )
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        raise HTTPException(status_code=422, detail=f"Constraint error: {e.orig}")
+
+    for item_config_id in existing_ids:
+        pool_cache.invalidate_item(item_config_id)
+    return {"item_config_ids": item_config_ids, "test_config_id": test_config_id}
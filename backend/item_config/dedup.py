@@ -0,0 +1,85 @@
+from typing import Dict, List
+
+from sqlalchemy import insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from backend import models
+from backend.item_config.content_hash import CONTENT_FIELDS, item_config_content_hash
+
+
+def with_content_hash(row: dict) -> dict:
+    """Add the `content_hash` of an ItemConfig row."""
+    return dict(
+        row,
+        content_hash=item_config_content_hash(
+            *(row[field] for field in CONTENT_FIELDS), user_id=row.get("user_id")
+        ),
+    )
+
+
+def _insert_ignoring_duplicates(db: Session):
+    """INSERT into item_config that skips rows whose content hash already exists."""
+    table = models.ItemConfig.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        return sqlite.insert(table).on_conflict_do_nothing(
+            index_elements=[table.c.content_hash]
+        )
+    if dialect == "postgresql":
+        return postgresql.insert(table).on_conflict_do_nothing(
+            index_elements=[table.c.content_hash]
+        )
+    return None
+
+
+# Hashes per IN (...) lookup, well below SQLite's bound parameter limit
+LOOKUP_CHUNK_SIZE = 500
+
+
+def get_ids_by_content_hash(db: Session, content_hashes: List[str]) -> Dict[str, int]:
+    ids = {}
+    for start in range(0, len(content_hashes), LOOKUP_CHUNK_SIZE):
+        chunk = content_hashes[start : start + LOOKUP_CHUNK_SIZE]
+        ids.update(
+            db.execute(
+                select(models.ItemConfig.content_hash, models.ItemConfig.id).where(
+                    models.ItemConfig.content_hash.in_(chunk)
+                )
+            ).all()
+        )
+    return ids
+
+
+def insert_new_item_configs(db: Session, rows: List[dict]) -> List[int]:
+    """Insert the rows that are not stored yet and return the ids of those rows.
+
+    Rows need their `content_hash`, see `with_content_hash`. Duplicates within
+    `rows` are inserted once.
+    """
+    if not rows:
+        return []
+    statement = _insert_ignoring_duplicates(db)
+    if statement is None:
+        # Without ON CONFLICT support, leave out the stored and repeated rows
+        existing = get_ids_by_content_hash(db, [row["content_hash"] for row in rows])
+        new_rows = {}
+        for row in rows:
+            if row["content_hash"] not in existing:
+                new_rows.setdefault(row["content_hash"], row)
+        if not new_rows:
+            return []
+        statement = insert(models.ItemConfig.__table__)
+        rows = list(new_rows.values())
+    return list(db.scalars(statement.returning(models.ItemConfig.id), rows).all())
+
+
+def upsert_item_configs(db: Session, rows: List[dict]) -> List[int]:
+    """Insert the rows that are not stored yet and return the ids of all rows.
+
+    Every row resolves to the item config with its content hash, whether that was
+    inserted now or already existed; the ids are returned in the order of `rows`.
+    """
+    insert_new_item_configs(db, rows)
+    ids = get_ids_by_content_hash(db, [row["content_hash"] for row in rows])
+    return [ids[row["content_hash"]] for row in rows]
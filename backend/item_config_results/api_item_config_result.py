@@ -1,14 +1,19 @@
 # api_item_configs_results.py
-from fastapi import HTTPException, Depends, APIRouter
+from typing import Union
+
+from fastapi import HTTPException, Depends, APIRouter, Response
 from sqlalchemy.orm import Session
 
 from backend import schemas
+from backend.config import settings
 from backend.item_config_results.crud_item_config_result import (
     create_item_config_result,
+    enqueue_item_config_result,
     get_all_item_config_results_for_item_config,
     get_item_config_result_by_id,
     get_all_item_config_results_for_user,  # New CRUD function
 )
+from backend.item_config_results.ingestion import result_ingestion_queue
 from backend.user.api_user import get_current_user
 from backend.utils import get_db
 
@@ -23,17 +28,38 @@ def read_all_item_config_results_for_user_endpoint(
     return get_all_item_config_results_for_user(db, user=user)
 
 
-@router.post("/", response_model=schemas.ItemConfigResultResponse)
+@router.post(
+    "/",
+    response_model=Union[
+        schemas.ItemConfigResultResponse, schemas.QueuedItemConfigResult
+    ],
+)
 def create_item_config_result_endpoint(
     item_config_result: schemas.ItemConfigResult,
+    response: Response,
     db: Session = Depends(get_db),
     user=Depends(get_current_user),
 ):
+    if settings.QUEUED_RESULT_INGESTION:
+        # Accepted now, written with the next group commit
+        response.status_code = 202
+        return enqueue_item_config_result(
+            db=db, item_config_result=item_config_result, user=user
+        )
     return create_item_config_result(
         db=db, item_config_result=item_config_result, user=user
     )
 
 
+@router.get("/queue", response_model=schemas.ResultQueueStatus)
+def read_result_queue_status_endpoint():
+    """Depth and commit metrics of the write-behind result queue."""
+    status = result_ingestion_queue.status()
+    return schemas.ResultQueueStatus(
+        **status, has_error=status["last_error"] is not None
+    )
+
+
 @router.get(
     "/item_config/{item_config_id}",
     response_model=list[schemas.ItemConfigResultResponse],
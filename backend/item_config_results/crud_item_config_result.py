@@ -1,17 +1,41 @@
+import datetime
+
 from fastapi import HTTPException
+from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from backend import models, schemas
+from backend.difficulty.procedural import is_procedural_identity
+from backend.item_config_results.ingestion import QueueFull, result_ingestion_queue
+from backend.stats.user_stats import ALL_ANSWERS, adjust_user_stats, answer_deltas
+
+
+def check_procedural_identity(item_config_result: schemas.ItemConfigResult):
+    if item_config_result.item_config_id is None and not is_procedural_identity(
+        item_config_result.item_difficulty,
+        item_config_result.item_generator_version,
+        item_config_result.item_seed,
+    ):
+        raise HTTPException(status_code=422, detail="Invalid procedural item")
 
 
 def create_item_config_result(
     db: Session, item_config_result: schemas.ItemConfigResult, user: models.User
 ):
+    check_procedural_identity(item_config_result)
     db_item_config_result = models.ItemConfigResult(
         **item_config_result.model_dump(), user_id=user.id
     )
     db.add(db_item_config_result)
+    adjust_user_stats(
+        db,
+        user.id,
+        ALL_ANSWERS,
+        **answer_deltas(
+            [(item_config_result.correct, item_config_result.reaction_time_ms)]
+        ),
+    )
     try:
         db.commit()
     except IntegrityError as e:
@@ -22,6 +46,39 @@ def create_item_config_result(
     return db_item_config_result
 
 
+def enqueue_item_config_result(
+    db: Session, item_config_result: schemas.ItemConfigResult, user: models.User
+):
+    """Validate a result and hand it to the write-behind queue.
+
+    The constraints the writer would run into are checked up front, so that the
+    result can be acknowledged before it is written.
+    """
+    check_procedural_identity(item_config_result)
+    item_config_id = item_config_result.item_config_id
+    if item_config_id is not None and (
+        db.scalar(
+            select(models.ItemConfig.id).where(models.ItemConfig.id == item_config_id)
+        )
+        is None
+    ):
+        raise HTTPException(
+            status_code=422, detail=f"Item config {item_config_id} not found"
+        )
+    row = dict(
+        item_config_result.model_dump(),
+        user_id=user.id,
+        created=datetime.datetime.utcnow(),
+    )
+    try:
+        result_ingestion_queue.submit(row)
+    except QueueFull as e:
+        raise HTTPException(
+            status_code=503, detail=str(e), headers={"Retry-After": "1"}
+        )
+    return row
+
+
 def get_all_item_config_results_for_item_config(
     db: Session, item_config_id: int, user: models.User
 ):
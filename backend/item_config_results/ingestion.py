@@ -0,0 +1,192 @@
+import logging
+import queue
+import threading
+import time
+from typing import Callable, List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from backend import models
+from backend.config import settings
+from backend.database import SessionLocal
+from backend.stats.user_stats import ALL_ANSWERS, adjust_user_stats, answer_deltas
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """Raised when a result is submitted while the queue is full or stopped."""
+
+
+class ResultIngestionQueue:
+    """Write-behind queue for item config results.
+
+    Requests only validate a result and put it on a bounded in-process queue. A
+    single writer thread drains the queue and inserts the results in groups of up
+    to `batch_size`, waiting at most `window_ms` after the first result of a
+    group, so that many answers share one commit instead of paying for one each.
+
+    A full queue refuses new results instead of growing, which the API turns
+    into a 503. Stopping the writer drains the queue first. Results that were
+    acknowledged but not yet committed are lost if the process dies.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        max_size: int = settings.RESULT_QUEUE_MAX_SIZE,
+        batch_size: int = settings.RESULT_QUEUE_BATCH_SIZE,
+        window_ms: float = settings.RESULT_QUEUE_WINDOW_MS,
+    ):
+        self.session_factory = session_factory
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.window_ms = window_ms
+        self._queue: queue.Queue = queue.Queue(maxsize=max_size)
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._metrics = {
+            "committed": 0,
+            "failed": 0,
+            "batches": 0,
+            "last_batch_size": 0,
+            "last_commit_ms": None,
+            "max_commit_ms": None,
+            "last_error": None,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start the writer thread."""
+        if self.running:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="result-ingestion", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Refuse new results, write the queued ones and stop the writer thread."""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, row: dict):
+        """Queue the column values of an item config result without blocking."""
+        if self._stopping.is_set() or not self.running:
+            raise QueueFull("The result queue is not running")
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            raise QueueFull("The result queue is full")
+
+    def flush(self):
+        """Block until every result queued so far has been written."""
+        self._queue.join()
+
+    def status(self) -> dict:
+        with self._lock:
+            metrics = dict(self._metrics)
+        return dict(
+            metrics,
+            running=self.running,
+            depth=self._queue.qsize(),
+            max_size=self.max_size,
+        )
+
+    def _run(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            rows = self._next_batch()
+            if not rows:
+                continue
+            try:
+                self._write(rows)
+            finally:
+                for _ in rows:
+                    self._queue.task_done()
+
+    def _next_batch(self) -> List[dict]:
+        """The next group of results, empty if none arrived for a while."""
+        try:
+            rows = [self._queue.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.window_ms / 1000
+        while len(rows) < self.batch_size:
+            # While stopping only take what is already queued
+            remaining = 0 if self._stopping.is_set() else deadline - time.monotonic()
+            try:
+                rows.append(self._queue.get(timeout=max(remaining, 0)))
+            except queue.Empty:
+                break
+        return rows
+
+    def _write(self, rows: List[dict]):
+        started = time.perf_counter()
+        db = self.session_factory()
+        try:
+            try:
+                db.execute(insert(models.ItemConfigResult), rows)
+                _adjust_user_stats(db, rows)
+                db.commit()
+                committed, failed = len(rows), 0
+            except IntegrityError:
+                # One bad row, e.g. of an item config deleted in the meantime,
+                # must not take the rest of the group with it
+                db.rollback()
+                committed, failed = self._write_one_by_one(db, rows)
+            error = None
+        except Exception as e:
+            db.rollback()
+            logger.exception("Writing %d queued results failed", len(rows))
+            committed, failed, error = 0, len(rows), str(e)
+        finally:
+            db.close()
+
+        commit_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            metrics = self._metrics
+            metrics["committed"] += committed
+            metrics["failed"] += failed
+            metrics["batches"] += 1
+            metrics["last_batch_size"] = len(rows)
+            metrics["last_commit_ms"] = commit_ms
+            metrics["max_commit_ms"] = max(metrics["max_commit_ms"] or 0, commit_ms)
+            if error is not None or failed:
+                metrics["last_error"] = (
+                    error or f"{failed} results violated constraints"
+                )
+
+    def _write_one_by_one(self, db: Session, rows: List[dict]):
+        committed = 0
+        for row in rows:
+            try:
+                db.execute(insert(models.ItemConfigResult), [row])
+                _adjust_user_stats(db, [row])
+                db.commit()
+                committed += 1
+            except IntegrityError:
+                db.rollback()
+                logger.warning("Dropped a queued result that violates a constraint")
+        return committed, len(rows) - committed
+
+
+def _adjust_user_stats(db: Session, rows: List[dict]):
+    answers_by_user = {}
+    for row in rows:
+        answers_by_user.setdefault(row["user_id"], []).append(
+            (row["correct"], row["reaction_time_ms"])
+        )
+    for user_id, answers in answers_by_user.items():
+        adjust_user_stats(db, user_id, ALL_ANSWERS, **answer_deltas(answers))
+
+
+result_ingestion_queue = ResultIngestionQueue()
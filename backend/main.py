@@ -6,21 +6,25 @@ from starlette.middleware.sessions import SessionMiddleware
 from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 
-from backend.database import engine, SessionLocal
+from backend.config import settings
+from backend.database import engine
+from backend.adaptive.api_adaptive import router as adaptive_router
+from backend.analytics.api_analytics import router as analytics_router
+from backend.export.api_export import router as export_router
 from backend.item_config.api_item_config import router as item_config_router
 from backend.item_config_results.api_item_config_result import (
     router as item_config_result_router,
 )
-from backend.difficulty.crud_difficulty import fill_item_configs
+from backend.difficulty.replenisher import pool_replenisher
+from backend.item_config_results.ingestion import result_ingestion_queue
 from backend.models import Base
+from backend.stats.api_stats import router as stats_router
 from backend.test_config.api_test_config import router as test_config_router
 from backend.test_config_results.api_test_config_results import (
     router as test_config_result_router,
 )
 from backend.user.api_user import router as user_router, init_oauth
 from backend.difficulty.api_difficulty import router as difficulty_router
-from backend.config import settings
-
 
 load_dotenv()
 
@@ -29,14 +33,18 @@ init_oauth()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    print("Fill item configs")
-    db = SessionLocal()
-    count = 10 if settings.testing else 10_000
+    # Fill the difficulty pools in the background instead of blocking startup.
+    # Procedural items are generated on demand and need no pools.
+    if not settings.PROCEDURAL_DIFFICULTY_ITEMS:
+        pool_replenisher.start()
+    if settings.QUEUED_RESULT_INGESTION:
+        result_ingestion_queue.start()
     try:
-        fill_item_configs(db, count)
         yield
     finally:
-        db.close()
+        pool_replenisher.stop()
+        # Write the results that were already acknowledged
+        result_ingestion_queue.stop()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -50,6 +58,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # pagination headers of the list endpoints
+    expose_headers=["X-Next-Cursor", "X-Total-Count"],
 )
 
 app.add_middleware(SessionMiddleware, secret_key=os.getenv("SECRET_KEY"))
@@ -60,3 +70,7 @@ app.include_router(test_config_router, prefix="/api/test_configs")
 app.include_router(test_config_result_router, prefix="/api/test_config_results")
 app.include_router(user_router, prefix="/api/users")
 app.include_router(difficulty_router, prefix="/api/difficulty")
+app.include_router(adaptive_router, prefix="/api/adaptive")
+app.include_router(stats_router, prefix="/api/stats")
+app.include_router(export_router, prefix="/api/export")
+app.include_router(analytics_router, prefix="/api/analytics")
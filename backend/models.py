@@ -11,11 +11,15 @@ from sqlalchemy import (
     ForeignKey,
     Table,
     Column,
+    Index,
+    BigInteger,
+    Float,
+    JSON,
 )
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 
 from backend.database import Base
-
+from backend.item_config.content_hash import content_hash_default
 
 # Association table for the many-to-many relationship between TestConfig and ItemConfig
 test_config_item_config_association = Table(
@@ -23,6 +27,17 @@ test_config_item_config_association = Table(
     Base.metadata,
     Column("test_config_id", ForeignKey("test_config.id"), primary_key=True),
     Column("item_config_id", ForeignKey("item_config.id"), primary_key=True),
+    # Dense 0-based position of the item within its TestConfig, used to sample
+    # random items by position instead of sorting the whole pool
+    Column("position", Integer, nullable=True),
+    Index(
+        "ix_test_config_item_config_test_config_id_position",
+        "test_config_id",
+        "position",
+    ),
+    # Reverse lookup of the TestConfigs of an ItemConfig; the primary key
+    # only serves lookups by test_config_id
+    Index("ix_test_config_item_config_item_config_id", "item_config_id"),
 )
 
 # Association table for the many-to-many relationship between TestConfigResult and ItemConfigResult
@@ -35,6 +50,10 @@ test_config_result_item_config_result_association = Table(
     Column(
         "item_config_result_id", ForeignKey("item_config_result.id"), primary_key=True
     ),
+    Index(
+        "ix_test_config_result_item_config_result_item_config_result_id",
+        "item_config_result_id",
+    ),
 )
 
 
@@ -43,7 +62,7 @@ class ItemConfig(Base):
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     created: Mapped[datetime.datetime] = mapped_column(
-        DateTime, default=datetime.datetime.utcnow
+        DateTime, default=datetime.datetime.utcnow, index=True
     )
 
     # triangle size and color
@@ -65,7 +84,27 @@ class ItemConfig(Base):
         String, CheckConstraint("orientation IN ('N', 'E', 'S', 'W')")
     )
 
-    user_id: Mapped[Optional[int]] = mapped_column(ForeignKey("user.id"), nullable=True)
+    # relative luminances and contrast ratio of the colors, NULL for colors that
+    # are not given in hex format
+    triangle_luminance: Mapped[Optional[float]] = mapped_column(
+        Float, nullable=True, index=True
+    )
+    circle_luminance: Mapped[Optional[float]] = mapped_column(
+        Float, nullable=True, index=True
+    )
+    contrast_ratio: Mapped[Optional[float]] = mapped_column(
+        Float, nullable=True, index=True
+    )
+
+    user_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey("user.id"), nullable=True, index=True
+    )
+
+    # hash of the stimulus parameters and the owner, so that identical item
+    # configs of an owner are stored once
+    content_hash: Mapped[Optional[str]] = mapped_column(
+        String(64), unique=True, index=True, default=content_hash_default
+    )
 
     # Relationship with ItemConfigResult
     item_config_results: Mapped[List["ItemConfigResult"]] = relationship(
@@ -89,8 +128,8 @@ class User(Base):
         DateTime, default=datetime.datetime.utcnow
     )
 
-    username: Mapped[str] = mapped_column(String)
-    email: Mapped[str] = mapped_column(String)
+    username: Mapped[str] = mapped_column(String, index=True)
+    email: Mapped[str] = mapped_column(String, index=True)
     hashed_password: Mapped[str] = mapped_column(String, nullable=True)
 
     issued_at: Mapped[datetime.datetime] = mapped_column(
@@ -116,17 +155,37 @@ class User(Base):
         back_populates="user"
     )
 
+    # Relationship with AdaptiveSession
+    adaptive_sessions: Mapped[List["AdaptiveSession"]] = relationship(
+        back_populates="user"
+    )
+
 
 class ItemConfigResult(Base):
     __tablename__ = "item_config_result"
+    __table_args__ = (
+        # The results of a user, optionally for one item config
+        Index(
+            "ix_item_config_result_user_id_item_config_id", "user_id", "item_config_id"
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
+    # indexed for exports of a time range
     created: Mapped[datetime.datetime] = mapped_column(
-        DateTime, default=datetime.datetime.utcnow
+        DateTime, default=datetime.datetime.utcnow, index=True
     )
 
     user_id: Mapped[Optional[int]] = mapped_column(ForeignKey("user.id"), nullable=True)
-    item_config_id: Mapped[int] = mapped_column(ForeignKey("item_config.id"))
+    item_config_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey("item_config.id"), nullable=True, index=True
+    )
+    # Identity of a procedural item, set instead of item_config_id
+    item_difficulty: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    item_generator_version: Mapped[Optional[int]] = mapped_column(
+        Integer, nullable=True
+    )
+    item_seed: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
     correct: Mapped[bool] = mapped_column(Boolean)
     reaction_time_ms: Mapped[int] = mapped_column(Integer)
     response: Mapped[str] = mapped_column(
@@ -134,7 +193,7 @@ class ItemConfigResult(Base):
     )
 
     # Relationships
-    item_config: Mapped["ItemConfig"] = relationship(
+    item_config: Mapped[Optional["ItemConfig"]] = relationship(
         back_populates="item_config_results"
     )
     user: Mapped[Optional["User"]] = relationship(back_populates="item_config_results")
@@ -154,12 +213,16 @@ class TestConfig(Base):
         DateTime, default=datetime.datetime.utcnow
     )
 
-    user_id: Mapped[Optional[int]] = mapped_column(ForeignKey("user.id"), nullable=True)
+    user_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey("user.id"), nullable=True, index=True
+    )
     name: Mapped[str] = mapped_column(String)
 
-    # Many-to-many relationship with ItemConfig
+    # Many-to-many relationship with ItemConfig, in the order of the test
     item_configs: Mapped[List["ItemConfig"]] = relationship(
-        secondary=test_config_item_config_association, back_populates="test_configs"
+        secondary=test_config_item_config_association,
+        back_populates="test_configs",
+        order_by=test_config_item_config_association.c.position,
     )
 
     # Relationship with User
@@ -171,8 +234,28 @@ class TestConfig(Base):
     )
 
 
+class TestConfigItemCount(Base):
+    """Number of ItemConfigs associated with a TestConfig, maintained on every
+    insert and delete of `test_config_item_config` rows."""
+
+    __tablename__ = "test_config_item_count"
+
+    test_config_id: Mapped[int] = mapped_column(
+        ForeignKey("test_config.id"), primary_key=True
+    )
+    item_count: Mapped[int] = mapped_column(Integer, default=0)
+
+
 class TestConfigResult(Base):
     __tablename__ = "test_config_result"
+    __table_args__ = (
+        # The results of a user, optionally for one test config
+        Index(
+            "ix_test_config_result_user_id_test_config_id", "user_id", "test_config_id"
+        ),
+        # The recent results of a user
+        Index("ix_test_config_result_user_id_time", "user_id", "time"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     created: Mapped[datetime.datetime] = mapped_column(
@@ -181,7 +264,7 @@ class TestConfigResult(Base):
 
     user_id: Mapped[Optional[int]] = mapped_column(ForeignKey("user.id"), nullable=True)
     test_config_id: Mapped[int] = mapped_column(
-        ForeignKey("test_config.id"), nullable=False
+        ForeignKey("test_config.id"), nullable=False, index=True
     )
     time: Mapped[datetime.datetime] = mapped_column(
         DateTime, default=datetime.datetime.utcnow
@@ -204,6 +287,56 @@ class TestConfigResult(Base):
     )
 
 
+class UserStats(Base):
+    """Running totals of the answers and games of a user, maintained on every
+    write of results.
+
+    The row of difficulty "all" holds every answer of the user, the rows of the
+    difficulty levels and of free play the answers and games of their tests.
+    """
+
+    __tablename__ = "user_stats"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("user.id"), primary_key=True)
+    difficulty: Mapped[str] = mapped_column(String, primary_key=True)
+
+    answers: Mapped[int] = mapped_column(Integer, default=0)
+    correct_answers: Mapped[int] = mapped_column(Integer, default=0)
+    # Sums of reaction times and their squares, for the mean and deviation
+    reaction_time_sum_ms: Mapped[int] = mapped_column(BigInteger, default=0)
+    reaction_time_sum_sq_ms: Mapped[int] = mapped_column(BigInteger, default=0)
+
+    games: Mapped[int] = mapped_column(Integer, default=0)
+    game_correct_answers: Mapped[int] = mapped_column(Integer, default=0)
+    game_wrong_answers: Mapped[int] = mapped_column(Integer, default=0)
+    last_played: Mapped[Optional[datetime.datetime]] = mapped_column(
+        DateTime, nullable=True
+    )
+
+
+class UserThreshold(Base):
+    """Cached psychometric threshold fit of a user in one dimension.
+
+    Refitted when the answer totals of the user's "all" statistics no longer
+    match the ones the fit was computed from.
+    """
+
+    __tablename__ = "user_threshold"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("user.id"), primary_key=True)
+    dimension: Mapped[str] = mapped_column(String, primary_key=True)
+
+    log10_threshold: Mapped[float] = mapped_column(Float)
+    log10_sd: Mapped[float] = mapped_column(Float)
+    trials: Mapped[int] = mapped_column(Integer)
+    # Answer totals of the user when fitted
+    answers: Mapped[int] = mapped_column(Integer)
+    correct_answers: Mapped[int] = mapped_column(Integer)
+    fitted: Mapped[datetime.datetime] = mapped_column(
+        DateTime, default=datetime.datetime.utcnow
+    )
+
+
 class PasswordResetToken(Base):
     __tablename__ = "password_reset_token"
 
@@ -214,3 +347,25 @@ class PasswordResetToken(Base):
     # ForeignKey relationship with User
     user_id: Mapped[int] = mapped_column(ForeignKey("user.id"), nullable=False)
     user: Mapped["User"] = relationship("User", back_populates="password_reset_tokens")
+
+
+class AdaptiveSession(Base):
+    __tablename__ = "adaptive_session"
+
+    id: Mapped[int] = mapped_column(primary_key=True, index=True)
+    created: Mapped[datetime.datetime] = mapped_column(
+        DateTime, default=datetime.datetime.utcnow
+    )
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("user.id"), index=True)
+
+    # staircase posteriors, see backend.adaptive.staircase.AdaptiveTest.to_state
+    state: Mapped[dict] = mapped_column(JSON)
+    # the item currently shown, None once the session is finished
+    item: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
+    # every answered trial: dimension, intensity, correct, reaction time, response
+    trials: Mapped[list] = mapped_column(JSON, default=list)
+    trial_count: Mapped[int] = mapped_column(Integer, default=0)
+    finished: Mapped[bool] = mapped_column(Boolean, default=False)
+
+    user: Mapped["User"] = relationship(back_populates="adaptive_sessions")
@@ -1,7 +1,7 @@
-from datetime import datetime
+from datetime import date, datetime
 from typing import List, Optional
 
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field, model_validator
 
 
 class ItemConfig(BaseModel):
@@ -29,6 +29,63 @@ class ItemConfigResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class ItemConfigBatchOperation(BaseModel):
+    """One step of an item config batch.
+
+    `create` needs `item_config`, `update` needs `id` and `item_config`, `delete`
+    needs `id`, and `link` adds the existing item config `id` to the target test
+    config without changing it.
+    """
+
+    action: str
+    id: Optional[int] = None
+    item_config: Optional[ItemConfig] = None
+
+    @model_validator(mode="after")
+    def check_operation(self):
+        if self.action not in ("create", "update", "delete", "link"):
+            raise ValueError(f"Invalid action: {self.action}")
+        if self.action != "create" and self.id is None:
+            raise ValueError(f"{self.action} requires an id")
+        if self.action in ("create", "update") and self.item_config is None:
+            raise ValueError(f"{self.action} requires an item_config")
+        return self
+
+
+class ItemConfigBatch(BaseModel):
+    operations: List[ItemConfigBatchOperation]
+    # The item configs created, updated or linked by the batch become the items
+    # of this test config, in order. Without an id but with a name a new test
+    # config is created; without both no test config is touched.
+    test_config_id: Optional[int] = None
+    test_config_name: Optional[str] = None
+
+
+class ItemConfigBatchResponse(BaseModel):
+    # The id of every operation's item config, in order
+    item_config_ids: List[int]
+    test_config_id: Optional[int]
+
+
+class ProceduralItemConfigResponse(ItemConfig):
+    """An item regenerated from its (difficulty, generator_version, seed) identity."""
+
+    difficulty: str
+    generator_version: int
+    seed: int
+
+
+class PoolStatus(BaseModel):
+    difficulty: str
+    count: int
+    low_watermark: int
+    high_watermark: int
+    replenisher_running: bool
+    filling: bool
+    last_filled: Optional[datetime]
+    last_error: Optional[str]
+
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -55,19 +112,38 @@ class UserResponse(BaseModel):
 
 
 class ItemConfigResult(BaseModel):
-    item_config_id: int
+    # Either a stored item config or the identity of a procedural item
+    item_config_id: Optional[int] = None
+    item_difficulty: Optional[str] = None
+    item_generator_version: Optional[int] = None
+    item_seed: Optional[int] = None
     correct: bool
     reaction_time_ms: int
     response: str
 
     model_config = ConfigDict(from_attributes=True)
 
+    @model_validator(mode="after")
+    def check_item_identity(self):
+        procedural = (self.item_difficulty, self.item_generator_version, self.item_seed)
+        if self.item_config_id is None and None in procedural:
+            raise ValueError(
+                "Either item_config_id or item_difficulty, item_generator_version "
+                "and item_seed are required"
+            )
+        if self.item_config_id is not None and procedural != (None, None, None):
+            raise ValueError("item_config_id and a procedural item are exclusive")
+        return self
+
 
 class ItemConfigResultResponse(BaseModel):
     id: int
     created: datetime
     user_id: int
-    item_config_id: int
+    item_config_id: Optional[int]
+    item_difficulty: Optional[str] = None
+    item_generator_version: Optional[int] = None
+    item_seed: Optional[int] = None
     correct: bool
     reaction_time_ms: int
     response: str
@@ -75,6 +151,27 @@ class ItemConfigResultResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class QueuedItemConfigResult(ItemConfigResult):
+    """An item config result that was accepted but not yet written."""
+
+    created: datetime
+    user_id: int
+
+
+class ResultQueueStatus(BaseModel):
+    running: bool
+    depth: int
+    max_size: int
+    committed: int
+    failed: int
+    batches: int
+    last_batch_size: int
+    last_commit_ms: Optional[float]
+    max_commit_ms: Optional[float]
+    # The last error itself is only logged, it may contain SQL and parameters
+    has_error: bool
+
+
 class TestConfig(BaseModel):
     name: str
     item_config_ids: List[int]
@@ -92,6 +189,18 @@ class TestConfigResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class TestConfigSummary(BaseModel):
+    """A TestConfig without its items, for listings."""
+
+    id: int
+    created: datetime
+    user_id: Optional[int]
+    name: str
+    item_count: int
+
+    model_config = ConfigDict(from_attributes=True)
+
+
 class TestConfigResult(BaseModel):
     test_config_id: int
     time: datetime
@@ -102,6 +211,18 @@ class TestConfigResult(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class TestConfigResultSession(BaseModel):
+    """A finished game: its summary together with the answers to all items."""
+
+    test_config_id: int
+    time: datetime
+    correct_answers: int
+    wrong_answers: int
+    item_config_results: List[ItemConfigResult]
+
+    model_config = ConfigDict(from_attributes=True)
+
+
 class TestConfigResultResponse(BaseModel):
     id: int
     created: datetime
@@ -126,3 +247,103 @@ class ResetPassword(BaseModel):
     new_password: str
 
     model_config = ConfigDict(from_attributes=True)
+
+
+class AdaptiveItem(ItemConfig):
+    """An item of an adaptive session and the intensity it measures."""
+
+    dimension: str
+    intensity: float
+
+
+class AdaptiveEstimate(BaseModel):
+    dimension: str
+    threshold: float
+    log10_sd: float
+
+
+class AdaptiveSessionCreate(BaseModel):
+    max_trials: int = Field(default=120, ge=1, le=500)
+    target_sd: float = Field(default=0.05, gt=0)
+
+
+class AdaptiveAnswer(BaseModel):
+    response: str
+    reaction_time_ms: int
+
+
+class AdaptiveSessionResponse(BaseModel):
+    id: int
+    created: datetime
+    user_id: int
+    trial_count: int
+    finished: bool
+    item: Optional[AdaptiveItem]
+    estimates: List[AdaptiveEstimate]
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class AnswerStats(BaseModel):
+    answers: int
+    correct_answers: int
+    accuracy: Optional[float]
+    reaction_time_mean_ms: Optional[float]
+    reaction_time_sd_ms: Optional[float]
+    # Only computed on request
+    reaction_time_p50_ms: Optional[int]
+    reaction_time_p90_ms: Optional[int]
+
+
+class DifficultyStats(AnswerStats):
+    difficulty: str
+    games: int
+    last_played: Optional[datetime]
+
+
+class ScorePoint(BaseModel):
+    """The games of one difficulty on one day."""
+
+    day: date
+    difficulty: str
+    games: int
+    mean_score: float
+    best_score: int
+
+
+class UserStats(BaseModel):
+    overall: AnswerStats
+    games: int
+    difficulties: List[DifficultyStats]
+    scores: List[ScorePoint]
+
+
+class Threshold(BaseModel):
+    """Fitted psychometric threshold of one dimension.
+
+    `threshold` is in the units of the dimension, contrast as a contrast ratio.
+    """
+
+    dimension: str
+    threshold: float
+    log10_threshold: float
+    log10_sd: float
+    trials: int
+
+
+class UserThresholds(BaseModel):
+    thresholds: List[Threshold]
+    fitted: Optional[datetime]
+
+
+class PopulationThreshold(Threshold):
+    # Quartiles of the thresholds of the users with enough trials
+    users: int
+    user_threshold_p25: Optional[float]
+    user_threshold_p50: Optional[float]
+    user_threshold_p75: Optional[float]
+
+
+class PopulationThresholds(BaseModel):
+    answers: int
+    thresholds: List[PopulationThreshold]
@@ -1,6 +1,9 @@
 from sqlalchemy.orm import Session
 from backend import models
 from backend.database import SessionLocal
+from backend.difficulty.crud_difficulty import stimulus_metrics
+from backend.test_config.crud_test_config import set_test_config_items
+from backend.test_config.item_counts import reconcile_item_counts
 from backend.user.api_user import get_password_hash
 
 users_to_insert = [
@@ -65,14 +68,6 @@ item_configs_to_insert = [
         time_visible_ms=4912,
         orientation="E",
     ),
-    models.ItemConfig(
-        triangle_size=220,
-        triangle_color="#c3f322",
-        circle_size=266,
-        circle_color="#0dae61",
-        time_visible_ms=4191,
-        orientation="N",
-    ),
     models.ItemConfig(
         triangle_size=154,
         triangle_color="#dd2677",
@@ -84,30 +79,15 @@ item_configs_to_insert = [
 ]
 
 test_configs_to_insert = [
-    models.TestConfig(
-        name="easy",
-        item_configs=item_configs_to_insert[:6],
-    ),
-    models.TestConfig(
-        name="medium",
-        item_configs=item_configs_to_insert[6:8],
-    ),
-    models.TestConfig(
-        name="hard",
-        item_configs=item_configs_to_insert[4:6],
-    ),
-    models.TestConfig(
-        name="super-hard",
-        item_configs=item_configs_to_insert[4:6],
-    ),
-    models.TestConfig(
-        name="expert",
-        item_configs=item_configs_to_insert[4:6],
-    ),
-    models.TestConfig(
-        name="impossible",
-        item_configs=item_configs_to_insert[4:6],
-    ),
+    (models.TestConfig(name="easy"), item_configs_to_insert[:6]),
+    (
+        models.TestConfig(name="medium"),
+        [item_configs_to_insert[0], item_configs_to_insert[6]],
+    ),
+    (models.TestConfig(name="hard"), item_configs_to_insert[4:6]),
+    (models.TestConfig(name="super-hard"), item_configs_to_insert[4:6]),
+    (models.TestConfig(name="expert"), item_configs_to_insert[4:6]),
+    (models.TestConfig(name="impossible"), item_configs_to_insert[4:6]),
 ]
 
 
@@ -122,13 +102,27 @@ def seed_data():
 
         # insert the item configs
         for item_config in item_configs_to_insert:
+            for field, value in stimulus_metrics(
+                item_config.triangle_color, item_config.circle_color
+            ).items():
+                setattr(item_config, field, value)
             db.add(item_config)
 
         # insert the test configs
-        for test_config in test_configs_to_insert:
+        for test_config, _ in test_configs_to_insert:
             db.add(test_config)
 
         db.commit()
+
+        # add their items in order
+        for test_config, item_configs in test_configs_to_insert:
+            set_test_config_items(
+                db, test_config.id, [item_config.id for item_config in item_configs]
+            )
+        db.commit()
+
+        # count the items of the seeded test configs
+        reconcile_item_counts(db)
     except Exception as e:
         pass
     finally:
@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from backend import schemas
+from backend.stats.crud_stats import get_user_stats
+from backend.user.api_user import get_current_user
+from backend.utils import get_db
+
+router = APIRouter()
+
+
+# Endpoint to get the statistics of the profile page from the maintained
+# totals; the percentiles read the full result history and are opt-in
+@router.get("/user", response_model=schemas.UserStats)
+def read_user_stats_endpoint(
+    days: int = Query(90, ge=1, le=3650),
+    include_percentiles: bool = False,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    return get_user_stats(
+        db, user=user, days=days, include_percentiles=include_percentiles
+    )
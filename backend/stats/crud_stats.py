@@ -0,0 +1,153 @@
+import datetime
+import math
+from typing import Optional
+
+from sqlalchemy import Select, case, func, select
+from sqlalchemy.orm import Session
+
+from backend import models
+from backend.difficulty.crud_difficulty import DIFFICULTY_RANGES
+from backend.stats.user_stats import (
+    ALL_ANSWERS,
+    FREE_DIFFICULTY,
+    difficulty_of,
+    get_user_stats_rows,
+)
+
+# Reaction time percentiles reported for every group of answers
+PERCENTILES = {"p50": 0.5, "p90": 0.9}
+
+
+def _reaction_time_percentiles(answers: Select) -> Select:
+    """Percentiles of the answers selected as (bucket, reaction_time_ms) rows.
+
+    The percentiles are nearest-rank: ranking the answers of a bucket by
+    reaction time in a window, the p-th percentile is the fastest answer whose
+    rank is at least p times the size of the bucket. Everything happens in one
+    GROUP BY over the windowed answers, so no answer leaves the database.
+    """
+    answers = answers.subquery()
+    ranked = select(
+        answers.c.bucket,
+        answers.c.reaction_time_ms,
+        func.row_number()
+        .over(partition_by=answers.c.bucket, order_by=answers.c.reaction_time_ms)
+        .label("rank"),
+        func.count().over(partition_by=answers.c.bucket).label("size"),
+    ).subquery()
+    return select(
+        ranked.c.bucket,
+        *(
+            func.min(
+                case(
+                    (
+                        ranked.c.rank >= fraction * ranked.c.size,
+                        ranked.c.reaction_time_ms,
+                    )
+                )
+            ).label(f"reaction_time_{name}_ms")
+            for name, fraction in PERCENTILES.items()
+        ),
+    ).group_by(ranked.c.bucket)
+
+
+def _get_percentiles(db: Session, user: models.User) -> dict:
+    """Reaction time percentiles of a user by difficulty, read from the results."""
+    item_config_result = models.ItemConfigResult
+    test_config_result = models.TestConfigResult
+    association = models.test_config_result_item_config_result_association
+    overall = select(
+        item_config_result.user_id.label("bucket"),
+        item_config_result.reaction_time_ms,
+    ).where(item_config_result.user_id == user.id)
+    by_difficulty = (
+        select(
+            difficulty_of(test_config_result.test_config_id).label("bucket"),
+            item_config_result.reaction_time_ms,
+        )
+        .select_from(test_config_result)
+        .join(association, association.c.test_config_result_id == test_config_result.id)
+        .join(
+            item_config_result,
+            item_config_result.id == association.c.item_config_result_id,
+        )
+        .where(test_config_result.user_id == user.id)
+    )
+    percentiles = {}
+    for row in db.execute(_reaction_time_percentiles(overall)):
+        percentiles[ALL_ANSWERS] = row._asdict()
+    for row in db.execute(_reaction_time_percentiles(by_difficulty)):
+        percentiles[row.bucket] = row._asdict()
+    return percentiles
+
+
+def _answer_stats(row: Optional[models.UserStats], percentiles: Optional[dict]) -> dict:
+    answers = row.answers if row else 0
+    stats = {
+        "answers": answers,
+        "correct_answers": row.correct_answers if row else 0,
+        "accuracy": None,
+        "reaction_time_mean_ms": None,
+        "reaction_time_sd_ms": None,
+    }
+    if answers:
+        mean = row.reaction_time_sum_ms / answers
+        variance = row.reaction_time_sum_sq_ms / answers - mean**2
+        stats.update(
+            accuracy=row.correct_answers / answers,
+            reaction_time_mean_ms=mean,
+            reaction_time_sd_ms=math.sqrt(max(variance, 0)),
+        )
+    for name in PERCENTILES:
+        key = f"reaction_time_{name}_ms"
+        stats[key] = percentiles.get(key) if percentiles else None
+    return stats
+
+
+def get_user_stats(
+    db: Session, user: models.User, days: int, include_percentiles: bool = False
+) -> dict:
+    """Answer and game statistics of a user.
+
+    The totals come from the maintained `user_stats` rows of the user. Reaction
+    time percentiles cannot be maintained that way and are only computed from
+    the results with `include_percentiles`. The score series holds one point
+    per day and difficulty of the last `days` days.
+    """
+    rows = get_user_stats_rows(db, user.id)
+    percentiles = _get_percentiles(db, user) if include_percentiles else {}
+
+    test_config_result = models.TestConfigResult
+    difficulty = difficulty_of(test_config_result.test_config_id)
+    day = func.date(test_config_result.time)
+    since = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+    scores = db.execute(
+        select(
+            day.label("day"),
+            difficulty.label("difficulty"),
+            func.count().label("games"),
+            func.avg(test_config_result.correct_answers).label("mean_score"),
+            func.max(test_config_result.correct_answers).label("best_score"),
+        )
+        .where(test_config_result.user_id == user.id, test_config_result.time >= since)
+        .group_by(day, difficulty)
+        .order_by(day, difficulty)
+    ).all()
+
+    difficulties = []
+    for name in [*DIFFICULTY_RANGES, FREE_DIFFICULTY]:
+        row = rows.get(name)
+        difficulties.append(
+            dict(
+                _answer_stats(row, percentiles.get(name)),
+                difficulty=name,
+                games=row.games if row else 0,
+                last_played=row.last_played if row else None,
+            )
+        )
+    return {
+        "overall": _answer_stats(rows.get(ALL_ANSWERS), percentiles.get(ALL_ANSWERS)),
+        "games": sum(stats["games"] for stats in difficulties),
+        "difficulties": difficulties,
+        "scores": [score._asdict() for score in scores],
+    }
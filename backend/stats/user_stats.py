@@ -0,0 +1,321 @@
+"""Maintained statistics of users.
+
+Every code path that writes item config results or test config results adjusts
+the matching `user_stats` rows in the same transaction, so reading the
+statistics of a user is a primary-key lookup instead of aggregating the whole
+result history. Run this module to rebuild all rows from the results, e.g.
+after results were written by hand:
+
+    python -m backend.stats.user_stats
+"""
+
+from typing import Dict, Iterable, Tuple
+
+from sqlalchemy import case, delete, func, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from backend import models
+from backend.database import SessionLocal
+from backend.difficulty.crud_difficulty import (
+    DIFFICULTY_RANGES,
+    get_test_config_id_by_difficulty,
+)
+
+# The row holding every answer of a user, also those given outside a test
+ALL_ANSWERS = "all"
+# Test configs other than those of the difficulty levels are played freely
+FREE_DIFFICULTY = "free"
+
+ANSWER_COUNTERS = (
+    "answers",
+    "correct_answers",
+    "reaction_time_sum_ms",
+    "reaction_time_sum_sq_ms",
+)
+GAME_COUNTERS = ("games", "game_correct_answers", "game_wrong_answers")
+
+
+def difficulty_of(test_config_id):
+    """SQL expression for the difficulty level a test config belongs to."""
+    return case(
+        {
+            get_test_config_id_by_difficulty(difficulty): difficulty
+            for difficulty in DIFFICULTY_RANGES
+        },
+        value=test_config_id,
+        else_=FREE_DIFFICULTY,
+    )
+
+
+def difficulty_of_test_config(test_config_id: int) -> str:
+    """The difficulty level a test config belongs to."""
+    for difficulty in DIFFICULTY_RANGES:
+        if get_test_config_id_by_difficulty(difficulty) == test_config_id:
+            return difficulty
+    return FREE_DIFFICULTY
+
+
+def _later(current, played):
+    return case(
+        (or_(current.is_(None), current < played), played),
+        else_=current,
+    )
+
+
+def adjust_user_stats(
+    db: Session,
+    user_id: int,
+    difficulty: str,
+    played=None,
+    **deltas: int,
+):
+    """Add `deltas` to the counters of a user and difficulty, creating the row if
+    needed, and move `last_played` forward to `played`.
+
+    Does not commit, so the change lands in the caller's transaction.
+    """
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas and played is None:
+        return
+    table = models.UserStats.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        statement = insert(table).values(
+            user_id=user_id,
+            difficulty=difficulty,
+            last_played=played,
+            **{name: deltas.get(name, 0) for name in ANSWER_COUNTERS + GAME_COUNTERS},
+        )
+        set_ = {
+            name: table.c[name] + statement.excluded[name] for name in deltas.keys()
+        }
+        if played is not None:
+            set_["last_played"] = _later(
+                table.c.last_played, statement.excluded.last_played
+            )
+        db.execute(
+            statement.on_conflict_do_update(
+                index_elements=[table.c.user_id, table.c.difficulty], set_=set_
+            )
+        )
+    else:
+        values = {name: table.c[name] + delta for name, delta in deltas.items()}
+        if played is not None:
+            values["last_played"] = _later(table.c.last_played, played)
+        result = db.execute(
+            update(table)
+            .where(table.c.user_id == user_id, table.c.difficulty == difficulty)
+            .values(**values)
+        )
+        if result.rowcount == 0:
+            db.execute(
+                table.insert().values(
+                    user_id=user_id,
+                    difficulty=difficulty,
+                    last_played=played,
+                    **{
+                        name: deltas.get(name, 0)
+                        for name in ANSWER_COUNTERS + GAME_COUNTERS
+                    },
+                )
+            )
+
+
+def answer_deltas(answers: Iterable[Tuple[bool, int]], sign: int = 1) -> dict:
+    """Counter deltas of (correct, reaction_time_ms) answers."""
+    deltas = dict.fromkeys(ANSWER_COUNTERS, 0)
+    for correct, reaction_time_ms in answers:
+        deltas["answers"] += sign
+        deltas["correct_answers"] += sign * bool(correct)
+        deltas["reaction_time_sum_ms"] += sign * reaction_time_ms
+        deltas["reaction_time_sum_sq_ms"] += sign * reaction_time_ms**2
+    return deltas
+
+
+def _answer_sums():
+    reaction_time = models.ItemConfigResult.reaction_time_ms
+    return (
+        func.count(),
+        func.coalesce(func.sum(case((models.ItemConfigResult.correct, 1), else_=0)), 0),
+        func.coalesce(func.sum(reaction_time), 0),
+        func.coalesce(func.sum(reaction_time * reaction_time), 0),
+    )
+
+
+def _signed(sums, sign: int) -> dict:
+    return {name: sign * value for name, value in zip(ANSWER_COUNTERS, sums)}
+
+
+def adjust_answers_of_users(db: Session, *where, sign: int = 1):
+    """Add the item config results matching `where` to the "all" row of their users.
+
+    Called with `sign=-1` before the results are deleted.
+    """
+    result = models.ItemConfigResult
+    for user_id, *sums in db.execute(
+        select(result.user_id, *_answer_sums())
+        .where(result.user_id.is_not(None), *where)
+        .group_by(result.user_id)
+    ).all():
+        adjust_user_stats(db, user_id, ALL_ANSWERS, **_signed(sums, sign))
+
+
+def adjust_answers_in_games(db: Session, *where, sign: int = 1):
+    """Add the item config results matching `where` to the rows of the users and
+    difficulties of the test config results they are linked to.
+
+    Called with `sign=-1` before the results are deleted; the games themselves
+    are left counted.
+    """
+    result = models.ItemConfigResult
+    test_config_result = models.TestConfigResult
+    association = models.test_config_result_item_config_result_association
+    difficulty = difficulty_of(test_config_result.test_config_id)
+    for user_id, name, *sums in db.execute(
+        select(test_config_result.user_id, difficulty, *_answer_sums())
+        .select_from(result)
+        .join(association, association.c.item_config_result_id == result.id)
+        .join(
+            test_config_result,
+            test_config_result.id == association.c.test_config_result_id,
+        )
+        .where(test_config_result.user_id.is_not(None), *where)
+        .group_by(test_config_result.user_id, difficulty)
+    ).all():
+        adjust_user_stats(db, user_id, name, **_signed(sums, sign))
+
+
+def adjust_test_config_result(
+    db: Session, test_config_result: models.TestConfigResult, sign: int = 1
+):
+    """Add a flushed test config result and its linked answers to the row of its
+    user and difficulty.
+
+    Called with `sign=-1` before the result or its links change; `last_played`
+    is then left for `refresh_last_played`.
+    """
+    association = models.test_config_result_item_config_result_association
+    sums = db.execute(
+        select(*_answer_sums())
+        .select_from(association)
+        .join(
+            models.ItemConfigResult,
+            models.ItemConfigResult.id == association.c.item_config_result_id,
+        )
+        .where(association.c.test_config_result_id == test_config_result.id)
+    ).one()
+    adjust_user_stats(
+        db,
+        test_config_result.user_id,
+        difficulty_of_test_config(test_config_result.test_config_id),
+        played=test_config_result.time if sign > 0 else None,
+        games=sign,
+        game_correct_answers=sign * test_config_result.correct_answers,
+        game_wrong_answers=sign * test_config_result.wrong_answers,
+        **_signed(sums, sign),
+    )
+
+
+def refresh_last_played(db: Session, user_id: int, difficulty: str):
+    """Recompute `last_played` after a test config result was changed or removed."""
+    result = models.TestConfigResult
+    db.execute(
+        update(models.UserStats)
+        .where(
+            models.UserStats.user_id == user_id,
+            models.UserStats.difficulty == difficulty,
+        )
+        .values(
+            last_played=select(func.max(result.time))
+            .where(
+                result.user_id == user_id,
+                difficulty_of(result.test_config_id) == difficulty,
+            )
+            .scalar_subquery()
+        )
+    )
+
+
+def get_user_stats_rows(db: Session, user_id: int) -> Dict[str, models.UserStats]:
+    """The rows of a user by difficulty."""
+    return {
+        row.difficulty: row
+        for row in db.scalars(
+            select(models.UserStats).where(models.UserStats.user_id == user_id)
+        )
+    }
+
+
+def rebuild_user_stats(db: Session) -> int:
+    """Recompute all rows from the results. Returns the number of rows."""
+    item_config_result = models.ItemConfigResult
+    test_config_result = models.TestConfigResult
+    association = models.test_config_result_item_config_result_association
+    difficulty = difficulty_of(test_config_result.test_config_id)
+
+    rows: Dict[Tuple[int, str], dict] = {}
+
+    def row(user_id: int, difficulty: str) -> dict:
+        return rows.setdefault(
+            (user_id, difficulty),
+            dict(
+                dict.fromkeys(ANSWER_COUNTERS + GAME_COUNTERS, 0),
+                user_id=user_id,
+                difficulty=difficulty,
+                last_played=None,
+            ),
+        )
+
+    for user_id, *sums in db.execute(
+        select(item_config_result.user_id, *_answer_sums())
+        .where(item_config_result.user_id.is_not(None))
+        .group_by(item_config_result.user_id)
+    ):
+        row(user_id, ALL_ANSWERS).update(_signed(sums, 1))
+    for user_id, name, *sums in db.execute(
+        select(test_config_result.user_id, difficulty, *_answer_sums())
+        .select_from(test_config_result)
+        .join(association, association.c.test_config_result_id == test_config_result.id)
+        .join(
+            item_config_result,
+            item_config_result.id == association.c.item_config_result_id,
+        )
+        .where(test_config_result.user_id.is_not(None))
+        .group_by(test_config_result.user_id, difficulty)
+    ):
+        row(user_id, name).update(_signed(sums, 1))
+    for user_id, name, games, correct, wrong, last_played in db.execute(
+        select(
+            test_config_result.user_id,
+            difficulty,
+            func.count(),
+            func.sum(test_config_result.correct_answers),
+            func.sum(test_config_result.wrong_answers),
+            func.max(test_config_result.time),
+        )
+        .where(test_config_result.user_id.is_not(None))
+        .group_by(test_config_result.user_id, difficulty)
+    ):
+        row(user_id, name).update(
+            games=games,
+            game_correct_answers=correct,
+            game_wrong_answers=wrong,
+            last_played=last_played,
+        )
+
+    db.execute(delete(models.UserStats))
+    if rows:
+        db.execute(models.UserStats.__table__.insert(), list(rows.values()))
+    db.commit()
+    return len(rows)
+
+
+if __name__ == "__main__":
+    db = SessionLocal()
+    try:
+        count = rebuild_user_stats(db)
+    finally:
+        db.close()
+    print(f"Rebuilt {count} user stats")
@@ -1,4 +1,6 @@
-from fastapi import HTTPException, Depends, APIRouter
+from typing import Optional
+
+from fastapi import HTTPException, Depends, APIRouter, Query, Response
 from sqlalchemy.orm import Session
 
 from backend import schemas
@@ -8,6 +10,9 @@ from backend.test_config.crud_test_config import (
     delete_test_config,
     update_test_config,
     get_test_config_by_id,
+    get_test_config_items,
+    get_test_config_summaries,
+    get_test_config_summary,
 )
 from backend.user.api_user import get_current_user
 from backend.utils import get_db
@@ -31,6 +36,14 @@ def read_all_test_configs_endpoint(db: Session = Depends(get_db)):
     return get_all_test_configs(db)
 
 
+# Endpoint to list test configs without their items
+@router.get("/summary", response_model=list[schemas.TestConfigSummary])
+def read_test_config_summaries_endpoint(
+    user_id: Optional[int] = None, db: Session = Depends(get_db)
+):
+    return get_test_config_summaries(db, user_id=user_id)
+
+
 # Endpoint to get a test config by id
 @router.get("/{test_config_id}", response_model=schemas.TestConfigResponse)
 def read_test_config_endpoint(test_config_id: int, db: Session = Depends(get_db)):
@@ -42,6 +55,42 @@ def read_test_config_endpoint(test_config_id: int, db: Session = Depends(get_db)
     return test_config
 
 
+# Endpoint to get a test config without its items
+@router.get("/{test_config_id}/header", response_model=schemas.TestConfigSummary)
+def read_test_config_header_endpoint(
+    test_config_id: int, db: Session = Depends(get_db)
+):
+    summary = get_test_config_summary(db, test_config_id)
+    if summary is None:
+        raise HTTPException(
+            status_code=404, detail=f"Test Config with id {test_config_id} not found"
+        )
+    return summary
+
+
+# Endpoint to get the items of a test config from position `start` on. The
+# position the next page starts at is returned in the X-Next-Cursor header,
+# which is absent on the last page.
+@router.get("/{test_config_id}/items", response_model=list[schemas.ItemConfigResponse])
+def read_test_config_items_endpoint(
+    test_config_id: int,
+    response: Response,
+    start: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+):
+    if get_test_config_summary(db, test_config_id) is None:
+        raise HTTPException(
+            status_code=404, detail=f"Test Config with id {test_config_id} not found"
+        )
+    item_configs, next_cursor = get_test_config_items(
+        db, test_config_id, start=start, limit=limit
+    )
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
+    return item_configs
+
+
 # Endpoint to delete a test config by id
 @router.delete("/{test_config_id}", response_model=schemas.TestConfigResponse)
 def delete_test_config_endpoint(
@@ -1,20 +1,24 @@
+from typing import List, Optional, Tuple
+
 from fastapi import HTTPException
+from sqlalchemy import bindparam, delete, func, insert, select, update
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 
 from backend import models, schemas
+from backend.test_config.item_counts import adjust_item_count, delete_item_count
 
 
 def create_test_config(db: Session, test_config: schemas.TestConfig, user: models.User):
-    db_test_config = models.TestConfig(
-        name=test_config.name,
-        user_id=user.id,
-        item_configs=db.query(models.ItemConfig)
-        .filter(models.ItemConfig.id.in_(test_config.item_config_ids))
-        .all(),
-    )
+    db_test_config = models.TestConfig(name=test_config.name, user_id=user.id)
     db.add(db_test_config)
     try:
+        db.flush()
+        adjust_item_count(
+            db,
+            db_test_config.id,
+            set_test_config_items(db, db_test_config.id, test_config.item_config_ids),
+        )
         db.commit()
     except IntegrityError as e:
         db.rollback()
@@ -25,17 +29,159 @@ def create_test_config(db: Session, test_config: schemas.TestConfig, user: model
 
 
 def get_all_test_configs(db: Session):
-    return db.query(models.TestConfig).all()
+    """Return all TestConfigs with their items.
+
+    The items of all test configs are loaded with one additional SELECT ... IN
+    query instead of one lazy load per test config.
+    """
+    return (
+        db.query(models.TestConfig)
+        .options(selectinload(models.TestConfig.item_configs))
+        .all()
+    )
+
+
+def _test_config_summary_query():
+    return select(
+        models.TestConfig.id,
+        models.TestConfig.created,
+        models.TestConfig.user_id,
+        models.TestConfig.name,
+        func.coalesce(models.TestConfigItemCount.item_count, 0).label("item_count"),
+    ).outerjoin(
+        models.TestConfigItemCount,
+        models.TestConfigItemCount.test_config_id == models.TestConfig.id,
+    )
+
+
+def get_test_config_summaries(db: Session, user_id: Optional[int] = None):
+    """Return id, owner, name and item count of the TestConfigs in one query.
+
+    The item count comes from the maintained counter, so the items themselves
+    are never read.
+    """
+    query = _test_config_summary_query().order_by(models.TestConfig.id)
+    if user_id is not None:
+        query = query.where(models.TestConfig.user_id == user_id)
+    return db.execute(query).all()
+
+
+def get_test_config_summary(db: Session, test_config_id: int):
+    """Return the summary of one TestConfig, or None if it does not exist."""
+    return db.execute(
+        _test_config_summary_query().where(models.TestConfig.id == test_config_id)
+    ).first()
+
+
+def get_test_config_items(
+    db: Session, test_config_id: int, start: int = 0, limit: int = 100
+) -> Tuple[List[models.ItemConfig], Optional[int]]:
+    """Return the items of a TestConfig from position `start` on, at most `limit`.
+
+    A range scan of the (test_config_id, position) index, so any slice of a test
+    costs the same wherever it starts. Also returns the position the next page
+    starts at, or None on the last page.
+    """
+    association = models.test_config_item_config_association
+    rows = (
+        db.query(models.ItemConfig, association.c.position)
+        .join(association, association.c.item_config_id == models.ItemConfig.id)
+        .filter(
+            association.c.test_config_id == test_config_id,
+            association.c.position >= start,
+        )
+        .order_by(association.c.position)
+        # One extra row tells whether there is a next page
+        .limit(limit + 1)
+        .all()
+    )
+    item_configs = [item_config for item_config, _ in rows[:limit]]
+    if len(rows) > limit:
+        return item_configs, rows[limit].position
+    return item_configs, None
 
 
 def get_test_config_by_id(db: Session, test_config_id: int):
     return (
         db.query(models.TestConfig)
+        .options(selectinload(models.TestConfig.item_configs))
         .filter(models.TestConfig.id == test_config_id)
         .first()
     )
 
 
+def set_test_config_items(
+    db: Session, test_config_id: int, item_config_ids: List[int]
+) -> int:
+    """Make the existing ItemConfigs among `item_config_ids` the items of a TestConfig.
+
+    The items are numbered densely from position 0 in the given order; unknown
+    ids and repeats are skipped. Only the difference to the stored association
+    rows is written: one bulk delete for removed items, one bulk update for kept
+    items that moved and one bulk insert for added items. No ItemConfig is
+    loaded. Returns the change in the number of items.
+    """
+    association = models.test_config_item_config_association
+    current = dict(
+        db.execute(
+            select(association.c.item_config_id, association.c.position).where(
+                association.c.test_config_id == test_config_id
+            )
+        ).all()
+    )
+    requested_ids = list(dict.fromkeys(item_config_ids))
+    new_ids = [i for i in requested_ids if i not in current]
+    known_new_ids = set()
+    if new_ids:
+        known_new_ids = set(
+            db.scalars(
+                select(models.ItemConfig.id).where(models.ItemConfig.id.in_(new_ids))
+            )
+        )
+    positions = {
+        item_config_id: position
+        for position, item_config_id in enumerate(
+            i for i in requested_ids if i in current or i in known_new_ids
+        )
+    }
+
+    removed_ids = [i for i in current if i not in positions]
+    if removed_ids:
+        db.execute(
+            delete(association).where(
+                association.c.test_config_id == test_config_id,
+                association.c.item_config_id.in_(removed_ids),
+            )
+        )
+    moved = [
+        {"tc_id": test_config_id, "ic_id": item_config_id, "new_position": position}
+        for item_config_id, position in positions.items()
+        if item_config_id in current and current[item_config_id] != position
+    ]
+    if moved:
+        db.execute(
+            update(association)
+            .where(
+                association.c.test_config_id == bindparam("tc_id"),
+                association.c.item_config_id == bindparam("ic_id"),
+            )
+            .values(position=bindparam("new_position")),
+            moved,
+        )
+    added = [
+        {
+            "test_config_id": test_config_id,
+            "item_config_id": item_config_id,
+            "position": position,
+        }
+        for item_config_id, position in positions.items()
+        if item_config_id not in current
+    ]
+    if added:
+        db.execute(insert(association), added)
+    return len(added) - len(removed_ids)
+
+
 def update_test_config(
     db: Session, test_config_id: int, test_config: schemas.TestConfig, user: models.User
 ):
@@ -51,10 +197,10 @@ def update_test_config(
                 detail=f"User {user.id} is not authorized to update test config {test_config_id}",
             )
         db_test_config.name = test_config.name
-        db_test_config.item_configs = (
-            db.query(models.ItemConfig)
-            .filter(models.ItemConfig.id.in_(test_config.item_config_ids))
-            .all()
+        adjust_item_count(
+            db,
+            test_config_id,
+            set_test_config_items(db, test_config_id, test_config.item_config_ids),
         )
         db.commit()
         db.refresh(db_test_config)
@@ -73,6 +219,7 @@ def delete_test_config(db: Session, test_config_id: int, user: models.User):
                 status_code=401,
                 detail=f"User {user.id} is not authorized to delete test config {test_config_id}",
             )
+        delete_item_count(db, test_config_id)
         db.delete(db_test_config)
         db.commit()
     return db_test_config
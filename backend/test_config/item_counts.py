@@ -0,0 +1,129 @@
+"""Maintained item counts of test configs.
+
+Every code path that inserts or deletes `test_config_item_config` rows adjusts
+the matching `test_config_item_count` row in the same transaction, so counting
+the items of a test config is a primary-key lookup instead of a join and
+COUNT(*). Run this module to repair counters that drifted, e.g. after rows were
+written by hand:
+
+    python -m backend.test_config.item_counts
+"""
+
+from typing import Dict
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from backend import models
+from backend.database import SessionLocal
+
+
+def get_item_count(db: Session, test_config_id: int) -> int:
+    """Return the number of ItemConfigs associated with a TestConfig."""
+    count = db.scalar(
+        select(models.TestConfigItemCount.item_count).where(
+            models.TestConfigItemCount.test_config_id == test_config_id
+        )
+    )
+    return count or 0
+
+
+def adjust_item_count(db: Session, test_config_id: int, delta: int):
+    """Add `delta` to the item count of a TestConfig, creating the counter if needed.
+
+    Does not commit, so the change lands in the caller's transaction.
+    """
+    if delta == 0:
+        return
+    table = models.TestConfigItemCount.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        statement = insert(table).values(
+            test_config_id=test_config_id, item_count=delta
+        )
+        db.execute(
+            statement.on_conflict_do_update(
+                index_elements=[table.c.test_config_id],
+                set_={"item_count": table.c.item_count + statement.excluded.item_count},
+            )
+        )
+    else:
+        result = db.execute(
+            update(table)
+            .where(table.c.test_config_id == test_config_id)
+            .values(item_count=table.c.item_count + delta)
+        )
+        if result.rowcount == 0:
+            db.execute(
+                table.insert().values(test_config_id=test_config_id, item_count=delta)
+            )
+
+
+def delete_item_count(db: Session, test_config_id: int):
+    """Remove the counter of a TestConfig that is about to be deleted."""
+    db.execute(
+        delete(models.TestConfigItemCount).where(
+            models.TestConfigItemCount.test_config_id == test_config_id
+        )
+    )
+
+
+def reconcile_item_counts(db: Session) -> Dict[int, tuple]:
+    """Recount all associations and repair counters that drifted.
+
+    Returns `{test_config_id: (stored, actual)}` for every repaired counter.
+    """
+    association = models.test_config_item_config_association
+    actual = dict(
+        db.execute(
+            select(models.TestConfig.id, func.count(association.c.item_config_id))
+            .outerjoin(
+                association, association.c.test_config_id == models.TestConfig.id
+            )
+            .group_by(models.TestConfig.id)
+        ).all()
+    )
+    stored = dict(
+        db.execute(
+            select(
+                models.TestConfigItemCount.test_config_id,
+                models.TestConfigItemCount.item_count,
+            )
+        ).all()
+    )
+
+    repaired = {}
+    for test_config_id in stored.keys() - actual.keys():
+        # Counter of a test config that no longer exists
+        repaired[test_config_id] = (stored[test_config_id], 0)
+        delete_item_count(db, test_config_id)
+    for test_config_id, count in actual.items():
+        if stored.get(test_config_id) != count:
+            repaired[test_config_id] = (stored.get(test_config_id), count)
+            if test_config_id in stored:
+                db.execute(
+                    update(models.TestConfigItemCount)
+                    .where(models.TestConfigItemCount.test_config_id == test_config_id)
+                    .values(item_count=count)
+                )
+            else:
+                db.add(
+                    models.TestConfigItemCount(
+                        test_config_id=test_config_id, item_count=count
+                    )
+                )
+    db.commit()
+    return repaired
+
+
+if __name__ == "__main__":
+    db = SessionLocal()
+    try:
+        repaired = reconcile_item_counts(db)
+    finally:
+        db.close()
+    for test_config_id, (stored, actual) in sorted(repaired.items()):
+        print(f"test config {test_config_id}: {stored} -> {actual}")
+    print(f"Repaired {len(repaired)} item counts")
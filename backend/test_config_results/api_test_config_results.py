@@ -5,6 +5,7 @@ from sqlalchemy.orm import Session
 from backend import schemas
 from backend.test_config_results.crud_test_config_results import (
     create_test_config_result,
+    create_test_config_result_session,
     get_all_test_config_results_for_test_config,
     get_test_config_result_by_id,
     update_test_config_result,
@@ -37,6 +38,16 @@ def create_test_config_result_endpoint(
     )
 
 
+# A finished game in a single request, instead of one request per answer
+@router.post("/session", response_model=schemas.TestConfigResultResponse)
+def create_test_config_result_session_endpoint(
+    session: schemas.TestConfigResultSession,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    return create_test_config_result_session(db=db, session=session, user=user)
+
+
 @router.get(
     "/test_config/{test_config_id}",
     response_model=list[schemas.TestConfigResultResponse],
@@ -1,9 +1,21 @@
 # crud_test_config_results.py
 from fastapi import HTTPException
+from sqlalchemy import insert
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from backend import models, schemas
+from backend.item_config_results.crud_item_config_result import (
+    check_procedural_identity,
+)
+from backend.stats.user_stats import (
+    ALL_ANSWERS,
+    adjust_test_config_result,
+    adjust_user_stats,
+    answer_deltas,
+    difficulty_of_test_config,
+    refresh_last_played,
+)
 
 
 def create_test_config_result(
@@ -23,6 +35,66 @@ def create_test_config_result(
     )
     db.add(db_test_config_result)
     try:
+        db.flush()
+        adjust_test_config_result(db, db_test_config_result)
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        raise HTTPException(status_code=422, detail=f"Constraint error: {e.orig}")
+
+    db.refresh(db_test_config_result)
+    return db_test_config_result
+
+
+def create_test_config_result_session(
+    db: Session, session: schemas.TestConfigResultSession, user: models.User
+):
+    """Store a finished game in one transaction.
+
+    The item config results and their association rows are bulk inserted. The
+    ids of the results come back from the insert itself; all of them are linked
+    to the test config result, so their order does not matter.
+    """
+    for item_config_result in session.item_config_results:
+        check_procedural_identity(item_config_result)
+    db_test_config_result = models.TestConfigResult(
+        test_config_id=session.test_config_id,
+        correct_answers=session.correct_answers,
+        wrong_answers=session.wrong_answers,
+        time=session.time,
+        user_id=user.id,
+    )
+    db.add(db_test_config_result)
+    try:
+        db.flush()
+        if session.item_config_results:
+            item_config_result_ids = db.scalars(
+                insert(models.ItemConfigResult).returning(models.ItemConfigResult.id),
+                [
+                    dict(item_config_result.model_dump(), user_id=user.id)
+                    for item_config_result in session.item_config_results
+                ],
+            ).all()
+            db.execute(
+                insert(models.test_config_result_item_config_result_association),
+                [
+                    {
+                        "test_config_result_id": db_test_config_result.id,
+                        "item_config_result_id": item_config_result_id,
+                    }
+                    for item_config_result_id in item_config_result_ids
+                ],
+            )
+        adjust_user_stats(
+            db,
+            user.id,
+            ALL_ANSWERS,
+            **answer_deltas(
+                (item_config_result.correct, item_config_result.reaction_time_ms)
+                for item_config_result in session.item_config_results
+            ),
+        )
+        adjust_test_config_result(db, db_test_config_result)
         db.commit()
     except IntegrityError as e:
         db.rollback()
@@ -80,6 +152,7 @@ def update_test_config_result(
                 status_code=401,
                 detail=f"User {user.id} is not authorized to update test config result {test_config_result_id}",
             )
+        adjust_test_config_result(db, db_test_config_result, sign=-1)
         db_test_config_result.correct_answers = test_config_result.correct_answers
         db_test_config_result.wrong_answers = test_config_result.wrong_answers
         db_test_config_result.time = test_config_result.time
@@ -92,6 +165,13 @@ def update_test_config_result(
             )
             .all()
         )
+        db.flush()
+        adjust_test_config_result(db, db_test_config_result)
+        refresh_last_played(
+            db,
+            user.id,
+            difficulty_of_test_config(db_test_config_result.test_config_id),
+        )
         db.commit()
         db.refresh(db_test_config_result)
     else:
@@ -113,7 +193,14 @@ def delete_test_config_result(
                 status_code=401,
                 detail=f"User {user.id} is not authorized to delete test config result {test_config_result_id}",
             )
+        adjust_test_config_result(db, db_test_config_result, sign=-1)
         db.delete(db_test_config_result)
+        db.flush()
+        refresh_last_played(
+            db,
+            user.id,
+            difficulty_of_test_config(db_test_config_result.test_config_id),
+        )
         db.commit()
     else:
         raise HTTPException(status_code=404, detail="TestConfigResult not found")
@@ -0,0 +1,166 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend.adaptive.staircase import (
+    CONTRAST_WINDOW,
+    AdaptiveTest,
+    generate_adaptive_item,
+    psychometric,
+)
+from backend.main import app
+from backend.models import Base
+from backend.tests.utils import get_user_id_and_token
+from backend.utils import get_db
+
+SQLALCHEMY_DATABASE_URL = "sqlite:///./temp_for_tests.db"
+
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+)
+
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def setup_database():
+    # Set here rather than on import, where the last imported test module wins
+    previous = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override_get_db
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+    if previous is None:
+        del app.dependency_overrides[get_db]
+    else:
+        app.dependency_overrides[get_db] = previous
+
+
+client = TestClient(app)
+
+
+def test_adaptive_test_converges_to_observer_thresholds():
+    thresholds = {"contrast": 0.02, "triangle_size": 25.0, "time_visible_ms": 200.0}
+    rng = np.random.default_rng(3)
+    test = AdaptiveTest.new()
+    while (stimulus := test.next_stimulus()) is not None:
+        item = generate_adaptive_item(stimulus, rng)
+        dimension = item["dimension"]
+        p_correct = psychometric(
+            np.log10(item["intensity"]), np.log10(thresholds[dimension])
+        )
+        # Restore from the stored state every trial, like the API does
+        test = AdaptiveTest.from_state(test.to_state())
+        test.record(dimension, item["intensity"], bool(rng.random() < p_correct))
+
+    assert test.trial_count < test.max_trials
+    for estimate in test.estimates():
+        threshold = thresholds[estimate["dimension"]]
+        if estimate["dimension"] == "contrast":
+            threshold += 1
+        assert estimate["log10_sd"] < test.target_sd
+        assert abs(np.log10(estimate["threshold"] / threshold)) < 0.15
+
+
+def test_generate_adaptive_item_contrast_window():
+    stimulus = {
+        "dimension": "contrast",
+        "contrast": 0.01,
+        "triangle_size": 100.0,
+        "time_visible_ms": 1000.0,
+    }
+    for _ in range(20):
+        item = generate_adaptive_item(stimulus)
+        assert 0.01 <= item["intensity"] <= 0.01 * CONTRAST_WINDOW
+        assert item["triangle_size"] == 100
+        assert item["time_visible_ms"] == 1000
+
+
+def test_adaptive_session_endpoints(setup_database):
+    token, user_id = get_user_id_and_token(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.post(
+        "/api/adaptive/sessions", json={"max_trials": 4}, headers=headers
+    )
+    assert response.status_code == 200
+    session = response.json()
+    assert session["user_id"] == user_id
+    assert session["trial_count"] == 0
+    assert len(session["estimates"]) == 3
+
+    for trial in range(4):
+        assert not session["finished"]
+        response = client.post(
+            f"/api/adaptive/sessions/{session['id']}/answers",
+            json={"response": session["item"]["orientation"], "reaction_time_ms": 400},
+            headers=headers,
+        )
+        assert response.status_code == 200
+        session = response.json()
+        assert session["trial_count"] == trial + 1
+
+    assert session["finished"]
+    assert session["item"] is None
+    response = client.get(f"/api/adaptive/sessions/{session['id']}", headers=headers)
+    assert response.json() == session
+    response = client.post(
+        f"/api/adaptive/sessions/{session['id']}/answers",
+        json={"response": "N", "reaction_time_ms": 400},
+        headers=headers,
+    )
+    assert response.status_code == 422
+
+
+def test_adaptive_session_invalid_response(setup_database):
+    token, user_id = get_user_id_and_token(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    session = client.post("/api/adaptive/sessions", headers=headers).json()
+    response = client.post(
+        f"/api/adaptive/sessions/{session['id']}/answers",
+        json={"response": "X", "reaction_time_ms": 400},
+        headers=headers,
+    )
+    assert response.status_code == 422
+
+
+def test_adaptive_session_other_user(setup_database):
+    token, user_id = get_user_id_and_token(client)
+    session = client.post(
+        "/api/adaptive/sessions", headers={"Authorization": f"Bearer {token}"}
+    ).json()
+    other_token, other_user_id = get_user_id_and_token(client, "otheruser")
+    other_headers = {"Authorization": f"Bearer {other_token}"}
+    response = client.get(
+        f"/api/adaptive/sessions/{session['id']}", headers=other_headers
+    )
+    assert response.status_code == 401
+    response = client.post(
+        f"/api/adaptive/sessions/{session['id']}/answers",
+        json={"response": "N", "reaction_time_ms": 400},
+        headers=other_headers,
+    )
+    assert response.status_code == 401
+
+
+def test_adaptive_session_invalid_id(setup_database):
+    token, user_id = get_user_id_and_token(client)
+    response = client.get(
+        "/api/adaptive/sessions/9999", headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 404
+
+
+def test_adaptive_session_unauthorized(setup_database):
+    response = client.post("/api/adaptive/sessions")
+    assert response.status_code == 401
@@ -0,0 +1,306 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from backend import models
+from backend.adaptive.staircase import psychometric
+from backend.analytics.crud_analytics import (
+    MIN_USER_TRIALS,
+    PopulationCache,
+    load_answers,
+    population_cache,
+    refresh_all_user_thresholds,
+)
+from backend.analytics.psychometrics import fit_thresholds, log_intensities
+from backend.difficulty.procedural import generate_procedural_items
+from backend.main import app
+from backend.models import Base
+from backend.tests.utils import get_user_id_and_token
+from backend.utils import get_db
+
+SQLALCHEMY_DATABASE_URL = "sqlite:///./temp_for_tests.db"
+
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+)
+
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def setup_database():
+    Base.metadata.create_all(bind=engine)
+    population_cache.invalidate()
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+
+app.dependency_overrides[get_db] = override_get_db
+
+client = TestClient(app)
+
+# Contrast ratios of the inserted item configs, from 1.002 to 2
+CONTRASTS = 1 + np.logspace(np.log10(0.002), 0, 25)
+
+
+def auth(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def insert_item_configs():
+    """Item configs of every contrast in CONTRASTS; returns their ids."""
+    db = TestingSessionLocal()
+    item_configs = [
+        models.ItemConfig(
+            triangle_size=100,
+            triangle_color="#000000",
+            # Distinct, as item configs are deduplicated by content
+            circle_size=300 + i,
+            circle_color="#FFFFFF",
+            time_visible_ms=1000,
+            orientation="N",
+            contrast_ratio=float(contrast),
+        )
+        for i, contrast in enumerate(CONTRASTS)
+    ]
+    db.add_all(item_configs)
+    db.commit()
+    ids = [item_config.id for item_config in item_configs]
+    db.close()
+    return ids
+
+
+def answer(token, item_config_id, correct):
+    response = client.post(
+        "/api/item_config_results/",
+        json={
+            "item_config_id": item_config_id,
+            "correct": correct,
+            "reaction_time_ms": 500,
+            "response": "N",
+        },
+        headers=auth(token),
+    )
+    assert response.status_code == 200
+
+
+def answer_all(token, item_config_ids, threshold):
+    """Answer every item config, correctly above a contrast ratio."""
+    for item_config_id, contrast in zip(item_config_ids, CONTRASTS):
+        answer(token, item_config_id, bool(contrast > threshold))
+
+
+def test_fit_thresholds_recovers_simulated_thresholds():
+    rng = np.random.default_rng(0)
+    true_thresholds = np.log10([0.01, 0.2, 0.05])
+    n = 3_000
+    groups = np.repeat([0, 1, 2], n)
+    intensities = rng.uniform(np.log10(0.002), 0, 3 * n)
+    correct = rng.random(3 * n) < psychometric(intensities, true_thresholds[groups])
+    # Unknown intensities are left out
+    intensities[::10] = np.nan
+
+    fit = fit_thresholds("contrast", groups, 4, intensities, correct)
+
+    assert np.allclose(fit["log10_threshold"][:3], true_thresholds, atol=0.05)
+    assert np.all(fit["log10_sd"][:3] < 0.05)
+    assert fit["trials"].tolist() == [2_700, 2_700, 2_700, 0]
+    # Without answers the posterior stays the uniform prior
+    assert fit["log10_sd"][3] > 0.5
+
+
+def test_read_user_thresholds(setup_database):
+    token, user_id = get_user_id_and_token(client)
+    item_config_ids = insert_item_configs()
+    answer_all(token, item_config_ids, threshold=1.1)
+
+    response = client.get("/api/analytics/thresholds/user", headers=auth(token))
+    assert response.status_code == 200
+    data = response.json()
+    thresholds = {threshold["dimension"]: threshold for threshold in data["thresholds"]}
+    assert list(thresholds) == ["contrast", "triangle_size", "time_visible_ms"]
+    contrast = thresholds["contrast"]
+    assert contrast["trials"] == len(CONTRASTS)
+    assert 1.03 < contrast["threshold"] < 1.2
+    assert contrast["threshold"] == pytest.approx(1 + 10 ** contrast["log10_threshold"])
+    assert data["fitted"] is not None
+
+    db = TestingSessionLocal()
+    cached = db.scalars(
+        select(models.UserThreshold).where(models.UserThreshold.user_id == user_id)
+    ).all()
+    assert {row.dimension for row in cached} == set(thresholds)
+    assert {row.answers for row in cached} == {len(CONTRASTS)}
+    db.close()
+
+    # Served from the cache until results change
+    response = client.get("/api/analytics/thresholds/user", headers=auth(token))
+    assert response.json() == data
+    answer(token, item_config_ids[-1], True)
+    response = client.get("/api/analytics/thresholds/user", headers=auth(token))
+    thresholds = response.json()["thresholds"]
+    assert thresholds[0]["trials"] == len(CONTRASTS) + 1
+
+
+def test_user_without_results_has_no_thresholds(setup_database):
+    token, user_id = get_user_id_and_token(client)
+
+    response = client.get("/api/analytics/thresholds/user", headers=auth(token))
+    assert response.status_code == 200
+    assert response.json() == {"thresholds": [], "fitted": None}
+
+    # The empty fit is stored, so the next request does not refit
+    db = TestingSessionLocal()
+    fitted = {
+        row.dimension: row.fitted
+        for row in db.scalars(
+            select(models.UserThreshold).where(models.UserThreshold.user_id == user_id)
+        )
+    }
+    db.close()
+    assert set(fitted) == {"contrast", "triangle_size", "time_visible_ms"}
+    response = client.get("/api/analytics/thresholds/user", headers=auth(token))
+    assert response.json() == {"thresholds": [], "fitted": None}
+    db = TestingSessionLocal()
+    assert {
+        row.dimension: row.fitted
+        for row in db.scalars(
+            select(models.UserThreshold).where(models.UserThreshold.user_id == user_id)
+        )
+    } == fitted
+    db.close()
+
+
+def test_read_user_thresholds_unauthorized(setup_database):
+    response = client.get("/api/analytics/thresholds/user")
+    assert response.status_code == 401
+
+
+def test_read_population_thresholds(setup_database):
+    item_config_ids = insert_item_configs()
+    token, _ = get_user_id_and_token(client)
+    other_token, _ = get_user_id_and_token(client, "otheruser")
+    answer_all(token, item_config_ids, threshold=1.05)
+    answer_all(other_token, item_config_ids, threshold=1.3)
+    # Too few trials for the quartiles of the users, but part of the pooled fit
+    few_token, _ = get_user_id_and_token(client, "fewuser")
+    answer(few_token, item_config_ids[0], True)
+
+    response = client.get("/api/analytics/thresholds/population", headers=auth(token))
+    assert response.status_code == 200
+    data = response.json()
+    assert data["answers"] == 2 * len(CONTRASTS) + 1
+    contrast = data["thresholds"][0]
+    assert contrast["dimension"] == "contrast"
+    assert contrast["trials"] == 2 * len(CONTRASTS) + 1
+    assert len(CONTRASTS) >= MIN_USER_TRIALS
+    assert contrast["users"] == 2
+    user_thresholds = [
+        client.get("/api/analytics/thresholds/user", headers=auth(t)).json()[
+            "thresholds"
+        ][0]["threshold"]
+        for t in (token, other_token)
+    ]
+    assert 1.03 < user_thresholds[0] < 1.1 < 1.2 < user_thresholds[1] < 1.4
+    assert contrast["user_threshold_p25"] == pytest.approx(
+        np.percentile(user_thresholds, 25)
+    )
+    assert contrast["user_threshold_p50"] == pytest.approx(np.mean(user_thresholds))
+    assert contrast["user_threshold_p75"] == pytest.approx(
+        np.percentile(user_thresholds, 75)
+    )
+
+    # Refitted once results are added
+    answer(token, item_config_ids[0], False)
+    response = client.get("/api/analytics/thresholds/population", headers=auth(token))
+    assert response.json()["answers"] == 2 * len(CONTRASTS) + 2
+
+
+def test_read_population_thresholds_unauthorized(setup_database):
+    response = client.get("/api/analytics/thresholds/population")
+    assert response.status_code == 401
+
+
+def test_population_cache_fits_once_for_concurrent_misses():
+    cache = PopulationCache()
+    fits = []
+
+    def fit():
+        fits.append(1)
+        time.sleep(0.1)
+        return {"answers": 1, "thresholds": []}
+
+    threads = [
+        threading.Thread(target=cache.get_or_fit, args=((1, 1), fit)) for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(fits) == 1
+    assert cache.get((1, 1)) == {"answers": 1, "thresholds": []}
+
+
+def test_procedural_results_are_regenerated(setup_database):
+    token, user_id = get_user_id_and_token(client)
+    seed = 2**52 + 17
+    response = client.post(
+        "/api/item_config_results/",
+        json={
+            "item_difficulty": "hard",
+            "item_generator_version": 1,
+            "item_seed": seed,
+            "correct": True,
+            "reaction_time_ms": 500,
+            "response": "N",
+        },
+        headers=auth(token),
+    )
+    assert response.status_code == 200
+
+    db = TestingSessionLocal()
+    answers = load_answers(db, user_id)
+    db.close()
+
+    (item,) = generate_procedural_items("hard", [seed])
+    assert answers["user_id"].tolist() == [user_id]
+    assert answers["triangle_size"].tolist() == [item["triangle_size"]]
+    assert answers["time_visible_ms"].tolist() == [item["time_visible_ms"]]
+    assert np.isfinite(log_intensities("contrast", answers["contrast"])).all()
+
+
+def test_refresh_all_user_thresholds(setup_database):
+    item_config_ids = insert_item_configs()
+    token, _ = get_user_id_and_token(client)
+    other_token, _ = get_user_id_and_token(client, "otheruser")
+    answer_all(token, item_config_ids, threshold=1.05)
+    answer_all(other_token, item_config_ids, threshold=1.3)
+    expected = [
+        client.get("/api/analytics/thresholds/user", headers=auth(t)).json()
+        for t in (token, other_token)
+    ]
+
+    db = TestingSessionLocal()
+    assert refresh_all_user_thresholds(db) == 2
+    db.close()
+
+    for t, data in zip((token, other_token), expected):
+        response = client.get("/api/analytics/thresholds/user", headers=auth(t))
+        for threshold, expected_threshold in zip(
+            response.json()["thresholds"], data["thresholds"]
+        ):
+            assert threshold == pytest.approx(expected_threshold)
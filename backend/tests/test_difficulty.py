@@ -1,18 +1,65 @@
+import random
+import time
+
+import numpy as np
 import pytest
 from fastapi.testclient import TestClient
-from backend.difficulty.crud_difficulty import fill_item_configs
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend import models, schemas
+from backend.difficulty.color_index import (
+    calculate_luminances,
+    contrast_ratios,
+    get_color_index,
+    sample_color_pairs,
+)
+from backend.difficulty.crud_difficulty import (
+    DIFFICULTY_RANGES,
+    calculate_luminance,
+    contrast_ratio,
+    fill_item_configs,
+    generate_item_config,
+    get_item_config_count,
+    generate_item_configs,
+    insert_generated_item_configs,
+    sample_item_config_ids,
+    stimulus_metrics,
+)
 from backend.main import app
+from backend.models import Base
 from backend.config import settings
 from backend.database import SessionLocal
+from backend.difficulty.pool_cache import PoolCache, pool_cache
+from backend.difficulty.procedural import (
+    GENERATOR_VERSION,
+    generate_procedural_items,
+    sample_procedural_items,
+)
+from backend.difficulty import crud_difficulty
+from backend.difficulty import replenisher as replenisher_module
+from backend.difficulty.replenisher import PoolReplenisher
 from backend.seed import seed_data
+from backend.utils import get_db
 
 settings.testing = True
 
 client = TestClient(app)
 
 
+@pytest.fixture
+def filled_pools():
+    # The endpoint only serves what is already in the pools
+    get_session = app.dependency_overrides.get(get_db, get_db)
+    for db in get_session():
+        Base.metadata.create_all(bind=db.get_bind())
+        fill_item_configs(db, 10)
+    pool_cache.invalidate()
+
+
 @pytest.mark.parametrize("difficulty", ["easy", "medium", "hard"])
-def test_get_difficulty_endpoint_valid(difficulty):
+def test_get_difficulty_endpoint_valid(filled_pools, difficulty):
     response = client.get(f"/api/difficulty/{difficulty}")
     assert response.status_code == 200
     data = response.json()
@@ -49,3 +96,501 @@ def test_get_difficulty_endpoint_invalid(difficulty):
 def test_get_difficulty_endpoint_missing():
     response = client.get("/api/difficulty/")
     assert response.status_code == 404, "Missing difficulty level should return 404"
+
+
+@pytest.mark.parametrize("difficulty", ["easy", "medium", "hard"])
+def test_generate_item_configs_within_ranges(difficulty):
+    ranges = DIFFICULTY_RANGES[difficulty]
+    item_configs = generate_item_configs(difficulty, 500)
+    assert len(item_configs) == 500
+    for item_config in item_configs:
+        assert (
+            ranges["triangle_size_min"]
+            <= item_config.triangle_size
+            <= ranges["triangle_size_max"]
+        )
+        assert (
+            ranges["time_visible_min"]
+            <= item_config.time_visible_ms
+            <= ranges["time_visible_max"]
+        )
+        assert 300 <= item_config.circle_size <= 600
+        assert item_config.orientation in ["N", "E", "S", "W"]
+        cr = contrast_ratio(
+            calculate_luminance(item_config.triangle_color),
+            calculate_luminance(item_config.circle_color),
+        )
+        assert ranges["contrast_min"] <= cr <= ranges["contrast_max"]
+
+
+def reference_color_pairs(contrast_min, contrast_max, n, rng):
+    """Color pairs by rejection, without the color index: a uniform first color,
+    then uniform second colors until one lies in the contrast window. First
+    colors without a partner after many draws are left out."""
+    color1 = rng.integers(0, 1 << 24, size=n)
+    color2 = np.full(n, -1)
+    missing = np.arange(n)
+    for _ in range(10_000):
+        if len(missing) == 0:
+            break
+        candidates = rng.integers(0, 1 << 24, size=len(missing))
+        cr = contrast_ratios(
+            calculate_luminances(color1[missing]), calculate_luminances(candidates)
+        )
+        hit = (contrast_min <= cr) & (cr <= contrast_max)
+        color2[missing[hit]] = candidates[hit]
+        missing = missing[~hit]
+    found = color2 >= 0
+    return color1[found], color2[found]
+
+
+def test_generate_item_configs_matches_reference_distribution():
+    n = 2000
+    ranges = DIFFICULTY_RANGES["hard"]
+    batched = generate_item_configs("hard", n, np.random.default_rng(0))
+    color1, color2 = reference_color_pairs(
+        ranges["contrast_min"], ranges["contrast_max"], n, np.random.default_rng(1)
+    )
+    random.seed(0)
+    scalar = [generate_item_config("hard") for _ in range(n)]
+
+    def luminance_quantiles(luminances):
+        return np.quantile(luminances, [0.1, 0.25, 0.5, 0.75, 0.9])
+
+    # Triangle and circle colors are swapped at random, so compare the lighter
+    # and the darker color of each pair
+    triangle = np.array([calculate_luminance(i.triangle_color) for i in batched])
+    circle = np.array([calculate_luminance(i.circle_color) for i in batched])
+    reference1 = calculate_luminances(color1)
+    reference2 = calculate_luminances(color2)
+    for pick in (np.maximum, np.minimum):
+        assert np.allclose(
+            luminance_quantiles(pick(triangle, circle)),
+            luminance_quantiles(pick(reference1, reference2)),
+            atol=0.03,
+        )
+
+    def mean_size(item_configs):
+        return np.mean([i.triangle_size for i in item_configs])
+
+    assert abs(mean_size(batched) - mean_size(scalar)) < 0.3
+
+
+def test_generate_item_configs_is_reproducible():
+    first = generate_item_configs("medium", 50, np.random.default_rng(42))
+    second = generate_item_configs("medium", 50, np.random.default_rng(42))
+    assert first == second
+
+
+def test_color_index_is_sorted_by_luminance():
+    index = get_color_index()
+    assert len(index) == 1 << 24
+    luminances = calculate_luminances(np.asarray(index[::997]))
+    assert np.all(np.diff(luminances) >= 0)
+
+
+@pytest.mark.parametrize(
+    "contrast_min, contrast_max",
+    [(1.03, 1.05), (1.0001, 1.0002), (20.5, 21.0), (15.0, 15.1)],
+)
+def test_sample_color_pairs_within_window(contrast_min, contrast_max):
+    color1, color2 = sample_color_pairs(contrast_min, contrast_max, 1000)
+    cr = contrast_ratios(calculate_luminances(color1), calculate_luminances(color2))
+    assert np.all(cr >= contrast_min)
+    assert np.all(cr <= contrast_max)
+
+
+def test_sample_color_pairs_impossible_window():
+    with pytest.raises(ValueError):
+        sample_color_pairs(22, 23, 1)
+
+
+def test_insert_generated_item_configs_links_items():
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    try:
+        db.add(models.TestConfig(id=1, name="Easy TestConfig"))
+        db.commit()
+        ids = insert_generated_item_configs(db, "easy", 1, 25, chunk_size=10)
+        assert len(ids) == len(set(ids)) == 25
+        linked = db.scalars(
+            select(models.test_config_item_config_association.c.item_config_id)
+        ).all()
+        assert sorted(linked) == sorted(ids)
+        assert get_item_config_count(db, "easy") == 25
+        for item_config in db.scalars(select(models.ItemConfig)):
+            assert stimulus_metrics(
+                item_config.triangle_color, item_config.circle_color
+            ) == {
+                "triangle_luminance": item_config.triangle_luminance,
+                "circle_luminance": item_config.circle_luminance,
+                "contrast_ratio": item_config.contrast_ratio,
+            }
+    finally:
+        db.close()
+
+
+def test_get_difficulty_endpoint_does_not_block_on_generation(filled_pools):
+    response = client.get("/api/difficulty/easy?limit=5000")
+    assert response.status_code == 200
+    assert len(response.json()) < 5000
+
+
+@pytest.mark.parametrize("limit", [0, -1, 5001])
+def test_get_difficulty_endpoint_limit_is_bounded(filled_pools, limit):
+    response = client.get(f"/api/difficulty/easy?limit={limit}")
+    assert response.status_code == 422
+
+
+def test_pool_status_endpoint(filled_pools):
+    response = client.get("/api/difficulty/status")
+    assert response.status_code == 200
+    data = response.json()
+    assert [status["difficulty"] for status in data] == ["easy", "medium", "hard"]
+    for status in data:
+        assert status["count"] >= 10
+        assert status["low_watermark"] <= status["high_watermark"]
+
+
+def test_fill_item_configs_draws_again_for_repeated_items(monkeypatch):
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    insert_generated = crud_difficulty.insert_generated_item_configs
+    calls = []
+
+    def insert_with_repeated_draw(db, difficulty, test_config_id, count, **kwargs):
+        calls.append(count)
+        # As if one draw of the first chunk repeated a stored item
+        if len(calls) == 1:
+            count -= 1
+        return insert_generated(db, difficulty, test_config_id, count, **kwargs)
+
+    monkeypatch.setattr(
+        crud_difficulty, "insert_generated_item_configs", insert_with_repeated_draw
+    )
+    try:
+        fill_item_configs(db, 10)
+        assert calls[:2] == [10, 1]
+        for difficulty in DIFFICULTY_RANGES:
+            assert get_item_config_count(db, difficulty) == 10
+    finally:
+        db.close()
+
+
+def test_pool_replenisher_tops_up_between_watermarks():
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    SessionForTest = sessionmaker(bind=engine)
+    replenisher = PoolReplenisher(
+        SessionForTest, low_watermark=5, high_watermark=12, chunk_size=5
+    )
+
+    replenisher.replenish()
+    status = replenisher.status()
+    db = SessionForTest()
+    try:
+        for difficulty in DIFFICULTY_RANGES:
+            assert get_item_config_count(db, difficulty) == 12
+            assert status[difficulty]["count"] == 12
+            assert status[difficulty]["last_error"] is None
+            assert not status[difficulty]["filling"]
+
+        # Above the low watermark nothing is generated
+        replenisher.high_watermark = 50
+        replenisher.replenish()
+        assert get_item_config_count(db, "hard") == 12
+    finally:
+        db.close()
+
+
+def test_pool_replenisher_counts_inserted_items(monkeypatch):
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    SessionForTest = sessionmaker(bind=engine)
+    insert_generated = replenisher_module.insert_generated_item_configs
+
+    def insert_with_repeated_draw(db, difficulty, test_config_id, count, **kwargs):
+        # As if one draw of every chunk repeated a stored item
+        return insert_generated(db, difficulty, test_config_id, count - 1, **kwargs)
+
+    monkeypatch.setattr(
+        replenisher_module, "insert_generated_item_configs", insert_with_repeated_draw
+    )
+    replenisher = PoolReplenisher(
+        SessionForTest, low_watermark=5, high_watermark=12, chunk_size=5
+    )
+
+    replenisher.replenish()
+    status = replenisher.status()
+    db = SessionForTest()
+    try:
+        for difficulty in DIFFICULTY_RANGES:
+            # 4 + 4 + 3 items, then a chunk of 1 inserts nothing and the run stops
+            assert get_item_config_count(db, difficulty) == 11
+            assert status[difficulty]["count"] == 11
+            assert status[difficulty]["last_error"] is None
+    finally:
+        db.close()
+
+
+def test_pool_replenisher_runs_in_background():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    replenisher = PoolReplenisher(
+        sessionmaker(bind=engine), low_watermark=3, high_watermark=3
+    )
+    replenisher.start()
+    try:
+        for _ in range(100):
+            if all(s["count"] == 3 for s in replenisher.status().values()):
+                break
+            time.sleep(0.05)
+        assert all(s["count"] == 3 for s in replenisher.status().values())
+    finally:
+        replenisher.stop(timeout=10)
+    assert not replenisher.running
+
+
+def test_sample_item_config_ids_without_replacement():
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    try:
+        db.add(models.TestConfig(id=1, name="Easy TestConfig"))
+        db.commit()
+        ids = insert_generated_item_configs(db, "easy", 1, 40)
+        # Deleted items leave holes in the positions
+        association = models.test_config_item_config_association
+        db.execute(
+            association.delete().where(association.c.item_config_id.in_(ids[:10]))
+        )
+        db.commit()
+
+        sample = sample_item_config_ids(db, 1, 20)
+        assert len(sample) == len(set(sample)) == 20
+        assert set(sample) <= set(ids[10:])
+
+        # Asking for more than the pool holds returns the whole pool
+        assert sorted(sample_item_config_ids(db, 1, 100)) == sorted(ids[10:])
+        assert sample_item_config_ids(db, 2, 10) == []
+    finally:
+        db.close()
+
+
+def test_sample_item_config_ids_is_uniform():
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    try:
+        db.add(models.TestConfig(id=1, name="Easy TestConfig"))
+        db.commit()
+        ids = insert_generated_item_configs(db, "easy", 1, 20)
+        counts = {item_config_id: 0 for item_config_id in ids}
+        for _ in range(500):
+            for item_config_id in sample_item_config_ids(db, 1, 5):
+                counts[item_config_id] += 1
+        # Every item is expected 125 times
+        assert all(75 < count < 175 for count in counts.values())
+    finally:
+        db.close()
+
+
+def test_pool_cache_samples_without_replacement():
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    cache = PoolCache()
+    try:
+        db.add(models.TestConfig(id=1, name="Easy TestConfig"))
+        db.commit()
+        ids = insert_generated_item_configs(db, "easy", 1, 40)
+        # Deleted items leave holes in the positions
+        association = models.test_config_item_config_association
+        db.execute(
+            association.delete().where(association.c.item_config_id.in_(ids[:10]))
+        )
+        db.commit()
+
+        sample = [item["id"] for item in cache.sample(db, "easy", 20)]
+        assert len(sample) == len(set(sample)) == 20
+        assert set(sample) <= set(ids[10:])
+
+        # Asking for more than the pool holds returns the whole pool
+        sample = [item["id"] for item in cache.sample(db, "easy", 100)]
+        assert sorted(sample) == sorted(ids[10:])
+        assert cache.sample(db, "medium", 10) == []
+    finally:
+        db.close()
+
+
+def test_pool_cache_samples_uniformly():
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    cache = PoolCache()
+    try:
+        db.add(models.TestConfig(id=1, name="Easy TestConfig"))
+        db.commit()
+        ids = insert_generated_item_configs(db, "easy", 1, 20)
+        counts = {item_config_id: 0 for item_config_id in ids}
+        for _ in range(500):
+            for item in cache.sample(db, "easy", 5):
+                counts[item["id"]] += 1
+        # Every item is expected 125 times
+        assert all(75 < count < 175 for count in counts.values())
+    finally:
+        db.close()
+
+
+def test_pool_cache_reloads_changes_of_other_processes():
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    cache = PoolCache(refresh_interval_s=3600)
+    try:
+        db.add(models.TestConfig(id=1, name="Easy TestConfig"))
+        db.commit()
+        ids = insert_generated_item_configs(db, "easy", 1, 5)
+        assert len(cache.get(db, "easy")) == 5
+
+        # Another process removes an item and changes another one, which does
+        # not invalidate this cache
+        association = models.test_config_item_config_association
+        db.execute(association.delete().where(association.c.item_config_id == ids[0]))
+        db.get(models.ItemConfig, ids[1]).triangle_size = 999
+        db.commit()
+        assert ids[0] in cache.get(db, "easy").columns["id"]
+
+        # Once the pool is older than the refresh interval it is reloaded
+        cache.refresh_interval_s = 0
+        pool = cache.get(db, "easy")
+        assert sorted(pool.columns["id"].tolist()) == ids[1:]
+        rows = {item["id"]: item for item in pool.rows(np.arange(len(pool)))}
+        assert rows[ids[1]]["triangle_size"] == 999
+    finally:
+        db.close()
+
+
+def test_pool_cache_samples_and_extends():
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    cache = PoolCache()
+    try:
+        db.add(models.TestConfig(id=1, name="Easy TestConfig"))
+        db.commit()
+        ids = insert_generated_item_configs(db, "easy", 1, 20)
+
+        sample = cache.sample(db, "easy", 5)
+        assert len({item["id"] for item in sample}) == 5
+        for item in sample:
+            item_config = db.get(models.ItemConfig, item["id"])
+            assert schemas.ItemConfigResponse(**item) == (
+                schemas.ItemConfigResponse.model_validate(item_config)
+            )
+
+        # New items show up after extending, without reloading the pool
+        ids += insert_generated_item_configs(db, "easy", 1, 5)
+        assert len(cache.get(db, "easy")) == 20
+        assert len(cache.extend(db, "easy")) == 25
+        assert {item["id"] for item in cache.sample(db, "easy", 100)} == set(ids)
+
+        cache.invalidate_item(ids[0])
+        assert cache.extend(db, "easy") is None
+        assert len(cache.get(db, "easy")) == 25
+    finally:
+        db.close()
+
+
+@pytest.mark.parametrize(
+    "preserialized, cached", [(True, True), (False, True), (False, False)]
+)
+def test_get_difficulty_endpoint_response_modes(
+    filled_pools, monkeypatch, preserialized, cached
+):
+    monkeypatch.setattr(settings, "PRESERIALIZED_DIFFICULTY_RESPONSES", preserialized)
+    monkeypatch.setattr(settings, "CACHED_DIFFICULTY_POOLS", cached)
+    response = client.get("/api/difficulty/medium?limit=10")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    data = response.json()
+    assert len(data) == 10
+    assert len({item_config["id"] for item_config in data}) == 10
+    # All modes produce exactly what response_model would
+    for item_config in data:
+        assert (
+            schemas.ItemConfigResponse(**item_config).model_dump(mode="json")
+            == item_config
+        )
+
+
+def test_procedural_items_are_deterministic():
+    seeds = [0, 1, 12345, 2**53 - 1]
+    items = generate_procedural_items("medium", seeds)
+    assert [item["seed"] for item in items] == seeds
+    # Each item depends only on its own identity
+    assert generate_procedural_items("medium", seeds[::-1]) == items[::-1]
+    assert generate_procedural_items("medium", [12345]) == [items[2]]
+    assert generate_procedural_items("easy", seeds) != items
+
+
+@pytest.mark.parametrize("difficulty", DIFFICULTY_RANGES)
+def test_procedural_items_within_ranges(difficulty):
+    ranges = DIFFICULTY_RANGES[difficulty]
+    items = sample_procedural_items(difficulty, 2000, np.random.default_rng(9))
+    for item in items:
+        schemas.ProceduralItemConfigResponse(**item)
+        assert item["generator_version"] == GENERATOR_VERSION
+        assert (
+            ranges["triangle_size_min"]
+            <= item["triangle_size"]
+            <= ranges["triangle_size_max"]
+        )
+        assert (
+            ranges["time_visible_min"]
+            <= item["time_visible_ms"]
+            <= ranges["time_visible_max"]
+        )
+        assert 300 <= item["circle_size"] <= 600
+        cr = contrast_ratio(
+            calculate_luminance(item["triangle_color"]),
+            calculate_luminance(item["circle_color"]),
+        )
+        assert ranges["contrast_min"] <= cr <= ranges["contrast_max"]
+    orientations = [item["orientation"] for item in items]
+    assert set(orientations) == {"N", "E", "S", "W"}
+    # The hash-derived uniforms are not biased towards one orientation
+    assert max(orientations.count(o) for o in "NESW") < 0.3 * len(items)
+
+
+def test_get_difficulty_endpoint_procedural(monkeypatch):
+    monkeypatch.setattr(settings, "PROCEDURAL_DIFFICULTY_ITEMS", True)
+    response = client.get("/api/difficulty/easy?limit=20")
+    assert response.status_code == 200
+    items = response.json()
+    assert len(items) == 20
+
+    item = items[0]
+    response = client.get(f"/api/difficulty/easy/procedural/{item['seed']}")
+    assert response.status_code == 200
+    assert response.json() == item
+
+
+@pytest.mark.parametrize("limit", [-1, 5001])
+def test_get_difficulty_endpoint_procedural_limit_is_bounded(monkeypatch, limit):
+    monkeypatch.setattr(settings, "PROCEDURAL_DIFFICULTY_ITEMS", True)
+    response = client.get(f"/api/difficulty/easy?limit={limit}")
+    assert response.status_code == 422
+
+
+def test_get_procedural_item_invalid_identity():
+    assert client.get("/api/difficulty/easy/procedural/-1").status_code == 404
+    assert client.get("/api/difficulty/extreme/procedural/1").status_code == 404
+    response = client.get("/api/difficulty/easy/procedural/1?generator_version=99")
+    assert response.status_code == 404
@@ -0,0 +1,239 @@
+import csv
+import datetime
+import io
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, update
+from sqlalchemy.orm import sessionmaker
+
+from backend import models
+from backend.config import settings
+from backend.export import api_export, results_export
+from backend.main import app
+from backend.models import Base
+from backend.tests.utils import get_user_id_and_token
+from backend.utils import get_db
+
+SQLALCHEMY_DATABASE_URL = "sqlite:///./temp_for_tests.db"
+
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+)
+
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def setup_database():
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+
+app.dependency_overrides[get_db] = override_get_db
+
+client = TestClient(app)
+
+API_KEY = "export-key"
+
+
+@pytest.fixture
+def api_key(monkeypatch):
+    monkeypatch.setattr(settings, "EXPORT_API_KEY", API_KEY)
+    return {"X-API-Key": API_KEY}
+
+
+def auth(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def insert_results(token):
+    """Two games of a test config and an answer outside of a game.
+
+    Returns the test config id and the result ids in the order they were added.
+    """
+    item_config_id = client.post(
+        "/api/item_configs/",
+        json={
+            "triangle_size": 100,
+            "triangle_color": "#FF0000",
+            "circle_size": 50,
+            "circle_color": "#00FF00",
+            "time_visible_ms": 1000,
+            "orientation": "N",
+        },
+        headers=auth(token),
+    ).json()["id"]
+    test_config_id = client.post(
+        "/api/test_configs/",
+        json={"name": "Test", "item_config_ids": [item_config_id]},
+        headers=auth(token),
+    ).json()["id"]
+    for correct in (True, False):
+        response = client.post(
+            "/api/test_config_results/session",
+            json={
+                "test_config_id": test_config_id,
+                "time": "2024-01-01T00:00:00",
+                "correct_answers": int(correct),
+                "wrong_answers": int(not correct),
+                "item_config_results": [
+                    {
+                        "item_config_id": item_config_id,
+                        "correct": correct,
+                        "reaction_time_ms": 300,
+                        "response": "N",
+                    }
+                ],
+            },
+            headers=auth(token),
+        )
+        assert response.status_code == 200
+    response = client.post(
+        "/api/item_config_results/",
+        json={
+            "item_config_id": item_config_id,
+            "correct": True,
+            "reaction_time_ms": 500,
+            "response": "E",
+        },
+        headers=auth(token),
+    )
+    assert response.status_code == 200
+    return test_config_id, item_config_id
+
+
+def read_csv(content):
+    return list(csv.DictReader(io.StringIO(content)))
+
+
+def test_export_results_as_csv(setup_database, api_key):
+    token, user_id = get_user_id_and_token(client)
+    other_token, other_user_id = get_user_id_and_token(client, "otheruser")
+    test_config_id, item_config_id = insert_results(token)
+    insert_results(other_token)
+
+    response = client.get("/api/export/results", headers=api_key)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert "results.csv" in response.headers["content-disposition"]
+    rows = read_csv(response.text)
+    assert list(rows[0]) == list(results_export.COLUMNS)
+    assert [int(row["id"]) for row in rows] == list(range(1, 7))
+    first = rows[0]
+    assert first["user_id"] == str(user_id)
+    assert first["test_config_id"] == str(test_config_id)
+    assert first["correct"] == "True"
+    assert first["reaction_time_ms"] == "300"
+    assert first["item_config_id"] == str(item_config_id)
+    assert first["triangle_size"] == "100"
+    assert first["circle_color"] == "#00FF00"
+    # The answer outside of a game has no test config result
+    assert rows[2]["test_config_result_id"] == ""
+    assert rows[2]["response"] == "E"
+
+    response = client.get(
+        "/api/export/results", params={"user_id": other_user_id}, headers=api_key
+    )
+    assert [row["id"] for row in read_csv(response.text)] == ["4", "5", "6"]
+    response = client.get(
+        "/api/export/results",
+        params={"test_config_id": test_config_id},
+        headers=api_key,
+    )
+    assert [row["id"] for row in read_csv(response.text)] == ["1", "2"]
+
+    db = TestingSessionLocal()
+    db.execute(
+        update(models.ItemConfigResult)
+        .where(models.ItemConfigResult.id <= 3)
+        .values(created=datetime.datetime(2024, 1, 1))
+    )
+    db.commit()
+    db.close()
+    response = client.get(
+        "/api/export/results",
+        params={"created_before": "2024-01-02T00:00:00"},
+        headers=api_key,
+    )
+    assert [row["id"] for row in read_csv(response.text)] == ["1", "2", "3"]
+    response = client.get(
+        "/api/export/results",
+        params={"created_after": "2024-01-02T00:00:00", "user_id": user_id},
+        headers=api_key,
+    )
+    assert read_csv(response.text) == []
+    assert response.text.strip() == ",".join(results_export.COLUMNS)
+
+
+def test_export_is_streamed_in_chunks(setup_database):
+    token, _ = get_user_id_and_token(client)
+    insert_results(token)
+
+    pieces = list(results_export.export_results(engine, chunk_size=2))
+
+    # The header with the first chunk, then one piece per chunk
+    assert len(pieces) == 2
+    assert pieces[0].decode().count("\n") == 3
+    assert pieces[1].decode().count("\n") == 1
+    assert len(read_csv(b"".join(pieces).decode())) == 3
+
+
+def test_export_needs_the_api_key(setup_database, monkeypatch):
+    response = client.get("/api/export/results")
+    assert response.status_code == 404
+
+    monkeypatch.setattr(settings, "EXPORT_API_KEY", API_KEY)
+    response = client.get("/api/export/results")
+    assert response.status_code == 401
+    response = client.get("/api/export/results", headers={"X-API-Key": "wrong"})
+    assert response.status_code == 401
+
+
+def test_export_results_as_arrow(setup_database, api_key):
+    pa = pytest.importorskip("pyarrow")
+    token, _ = get_user_id_and_token(client)
+    insert_results(token)
+
+    response = client.get(
+        "/api/export/results", params={"format": "arrow"}, headers=api_key
+    )
+    assert response.status_code == 200
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert table.column_names == list(results_export.COLUMNS)
+    assert table.column("id").to_pylist() == [1, 2, 3]
+    assert table.column("correct").to_pylist() == [True, False, True]
+
+
+def test_arrow_export_without_pyarrow(setup_database, api_key, monkeypatch):
+    monkeypatch.setattr(api_export, "arrow_available", lambda: False)
+
+    response = client.get(
+        "/api/export/results", params={"format": "arrow"}, headers=api_key
+    )
+    assert response.status_code == 422
+
+
+def test_export_command(setup_database, monkeypatch, tmp_path):
+    token, user_id = get_user_id_and_token(client)
+    test_config_id, _ = insert_results(token)
+    monkeypatch.setattr(results_export, "default_engine", engine)
+    output = tmp_path / "results.csv"
+
+    results_export.main(
+        ["--output", str(output), "--test-config-id", str(test_config_id)]
+    )
+
+    rows = read_csv(output.read_text())
+    assert [row["id"] for row in rows] == ["1", "2"]
+    assert {row["user_id"] for row in rows} == {str(user_id)}
@@ -1,9 +1,16 @@
+import importlib.util
+import pathlib
+
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, insert, select, text
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 
+from backend import models
+from backend.difficulty.crud_difficulty import calculate_luminance, fill_item_configs
 from backend.models import Base
+from backend.test_config.item_counts import get_item_count
 from backend.main import app
 from backend.tests.utils import get_user_id_and_token
 from backend.utils import get_db
@@ -373,3 +380,536 @@ def test_delete_item_config_endpoint_unauthorized(setup_database):
         headers={"Authorization": f"Bearer {token2}"},
     )
     assert delete_response.status_code == 401
+
+
+def test_item_config_stimulus_metrics(setup_database):
+    token, user_id = get_user_id_and_token(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    item_config_data = {
+        "triangle_size": 100,
+        "triangle_color": "#808080",
+        "circle_size": 50,
+        "circle_color": "#838383",
+        "time_visible_ms": 1000,
+        "orientation": "N",
+    }
+    low_contrast_id = client.post(
+        "/api/item_configs/", json=item_config_data, headers=headers
+    ).json()["id"]
+    high_contrast_id = client.post(
+        "/api/item_configs/",
+        json=dict(item_config_data, circle_color="#000000"),
+        headers=headers,
+    ).json()["id"]
+    named_color_id = client.post(
+        "/api/item_configs/",
+        json=dict(item_config_data, triangle_color="red"),
+        headers=headers,
+    ).json()["id"]
+
+    db = TestingSessionLocal()
+    try:
+        low_contrast = db.get(models.ItemConfig, low_contrast_id)
+        assert low_contrast.triangle_luminance == calculate_luminance("#808080")
+        assert low_contrast.circle_luminance == calculate_luminance("#838383")
+        assert 1.03 <= low_contrast.contrast_ratio <= 1.05
+        named_color = db.get(models.ItemConfig, named_color_id)
+        assert named_color.triangle_luminance is None
+        assert named_color.contrast_ratio is None
+    finally:
+        db.close()
+
+    def by_contrast(contrast_min, contrast_max):
+        response = client.get(
+            "/api/item_configs/by_contrast",
+            params={"contrast_min": contrast_min, "contrast_max": contrast_max},
+        )
+        assert response.status_code == 200
+        return [item_config["id"] for item_config in response.json()]
+
+    assert by_contrast(1.03, 1.05) == [low_contrast_id]
+    assert by_contrast(1.0, 100.0) == [low_contrast_id, high_contrast_id]
+
+    # Updating the colors recomputes the metrics
+    client.put(
+        f"/api/item_configs/{high_contrast_id}",
+        json=dict(item_config_data, circle_color="#828282"),
+        headers=headers,
+    )
+    assert by_contrast(1.0, 1.03) == [high_contrast_id]
+
+
+def test_read_item_configs_keyset_pagination(setup_database):
+    token, user_id = get_user_id_and_token(client)
+    other_token, other_user_id = get_user_id_and_token(client, "otheruser")
+    item_config_data = {
+        "triangle_size": 100,
+        "triangle_color": "#FF0000",
+        "circle_size": 50,
+        "circle_color": "#00FF00",
+        "time_visible_ms": 1000,
+        "orientation": "N",
+    }
+    ids = [
+        client.post(
+            "/api/item_configs/",
+            json=dict(item_config_data, triangle_size=100 + i),
+            headers={"Authorization": f"Bearer {token}"},
+        ).json()["id"]
+        for i in range(5)
+    ]
+    other_id = client.post(
+        "/api/item_configs/",
+        json=item_config_data,
+        headers={"Authorization": f"Bearer {other_token}"},
+    ).json()["id"]
+
+    pages, params = [], {"limit": 2, "user_id": user_id, "include_total": True}
+    while True:
+        response = client.get("/api/item_configs/", params=params)
+        assert response.status_code == 200
+        assert response.headers["X-Total-Count"] == "5"
+        pages.append([item_config["id"] for item_config in response.json()])
+        if "X-Next-Cursor" not in response.headers:
+            break
+        params["after_id"] = int(response.headers["X-Next-Cursor"])
+    assert pages == [ids[0:2], ids[2:4], ids[4:]]
+
+    response = client.get("/api/item_configs/", params={"user_id": other_user_id})
+    assert [item_config["id"] for item_config in response.json()] == [other_id]
+
+    # Everything was created just now
+    response = client.get(
+        "/api/item_configs/",
+        params={"created_before": "2000-01-01T00:00:00", "include_total": True},
+    )
+    assert response.json() == []
+    assert response.headers["X-Total-Count"] == "0"
+
+
+def test_read_item_configs_by_difficulty(setup_database):
+    token, user_id = get_user_id_and_token(client)
+    db = TestingSessionLocal()
+    try:
+        fill_item_configs(db, 3)
+    finally:
+        db.close()
+    response = client.get(
+        "/api/item_configs/", params={"difficulty": "hard", "include_total": True}
+    )
+    assert response.status_code == 200
+    assert len(response.json()) == 3
+    assert response.headers["X-Total-Count"] == "3"
+
+    response = client.get("/api/item_configs/", params={"difficulty": "extreme"})
+    assert response.status_code == 404
+
+
+def test_read_item_configs_page_size_is_bounded(setup_database):
+    response = client.get("/api/item_configs/", params={"limit": 100000})
+    assert response.status_code == 422
+
+
+def test_item_config_batch_endpoint(setup_database):
+    token, user_id = get_user_id_and_token(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    item_config_data = {
+        "triangle_size": 100,
+        "triangle_color": "#FF0000",
+        "circle_size": 50,
+        "circle_color": "#00FF00",
+        "time_visible_ms": 1000,
+        "orientation": "N",
+    }
+    kept_id, updated_id, deleted_id = [
+        client.post(
+            "/api/item_configs/",
+            json=dict(item_config_data, triangle_size=101 + i),
+            headers=headers,
+        ).json()["id"]
+        for i in range(3)
+    ]
+
+    response = client.post(
+        "/api/item_configs/batch",
+        json={
+            "operations": [
+                {"action": "create", "item_config": item_config_data},
+                {"action": "link", "id": kept_id},
+                {
+                    "action": "update",
+                    "id": updated_id,
+                    "item_config": dict(item_config_data, orientation="S"),
+                },
+                {"action": "delete", "id": deleted_id},
+                {
+                    "action": "create",
+                    "item_config": dict(item_config_data, orientation="W"),
+                },
+            ],
+            "test_config_name": "Batch Test",
+        },
+        headers=headers,
+    )
+    assert response.status_code == 200
+    data = response.json()
+    first_id, _, _, _, second_id = data["item_config_ids"]
+    assert data["item_config_ids"][1:4] == [kept_id, updated_id, deleted_id]
+    assert second_id > first_id
+
+    assert client.get(f"/api/item_configs/{first_id}").json()["orientation"] == "N"
+    assert client.get(f"/api/item_configs/{second_id}").json()["orientation"] == "W"
+    assert client.get(f"/api/item_configs/{updated_id}").json()["orientation"] == "S"
+    assert client.get(f"/api/item_configs/{deleted_id}").status_code == 404
+
+    test_config = client.get(f"/api/test_configs/{data['test_config_id']}").json()
+    assert test_config["name"] == "Batch Test"
+    assert sorted(item["id"] for item in test_config["item_configs"]) == sorted(
+        [first_id, kept_id, updated_id, second_id]
+    )
+    db = TestingSessionLocal()
+    try:
+        assert get_item_count(db, data["test_config_id"]) == 4
+    finally:
+        db.close()
+
+    # Replace the items of the existing test config
+    response = client.post(
+        "/api/item_configs/batch",
+        json={
+            "operations": [{"action": "delete", "id": first_id}],
+            "test_config_id": data["test_config_id"],
+        },
+        headers=headers,
+    )
+    assert response.status_code == 200
+    test_config = client.get(f"/api/test_configs/{data['test_config_id']}").json()
+    assert test_config["name"] == "Batch Test"
+    assert test_config["item_configs"] == []
+    db = TestingSessionLocal()
+    try:
+        assert get_item_count(db, data["test_config_id"]) == 0
+    finally:
+        db.close()
+
+
+def test_item_config_batch_endpoint_is_atomic(setup_database):
+    token, user_id = get_user_id_and_token(client)
+    other_token, other_user_id = get_user_id_and_token(client, "otheruser")
+    item_config_data = {
+        "triangle_size": 100,
+        "triangle_color": "#FF0000",
+        "circle_size": 50,
+        "circle_color": "#00FF00",
+        "time_visible_ms": 1000,
+        "orientation": "N",
+    }
+    other_id = client.post(
+        "/api/item_configs/",
+        json=item_config_data,
+        headers={"Authorization": f"Bearer {other_token}"},
+    ).json()["id"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = client.post(
+        "/api/item_configs/batch",
+        json={
+            "operations": [
+                {"action": "create", "item_config": item_config_data},
+                {"action": "delete", "id": other_id},
+            ]
+        },
+        headers=headers,
+    )
+    assert response.status_code == 401
+
+    response = client.post(
+        "/api/item_configs/batch",
+        json={
+            "operations": [
+                {"action": "create", "item_config": item_config_data},
+                {
+                    "action": "create",
+                    "item_config": dict(item_config_data, triangle_size=0),
+                },
+            ]
+        },
+        headers=headers,
+    )
+    assert response.status_code == 422
+    assert "Constraint error" in response.json()["detail"]
+
+    # Neither batch left anything behind
+    response = client.get("/api/item_configs/")
+    assert [item_config["id"] for item_config in response.json()] == [other_id]
+
+
+@pytest.mark.parametrize(
+    "operation",
+    [
+        {"action": "rename", "id": 1},
+        {"action": "update", "id": 1},
+        {"action": "delete"},
+        {"action": "create"},
+    ],
+)
+def test_item_config_batch_endpoint_invalid_operation(setup_database, operation):
+    token, user_id = get_user_id_and_token(client)
+    response = client.post(
+        "/api/item_configs/batch",
+        json={"operations": [operation]},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 422
+
+
+def test_item_config_batch_endpoint_unknown_link(setup_database):
+    token, user_id = get_user_id_and_token(client)
+    response = client.post(
+        "/api/item_configs/batch",
+        json={"operations": [{"action": "link", "id": 999}], "test_config_name": "x"},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Item Config with id 999 not found"
+
+
+def test_item_config_batch_endpoint_deletes_answered_item(setup_database):
+    token, user_id = get_user_id_and_token(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    db = TestingSessionLocal()
+    db.add(models.TestConfig(id=1, name="Easy TestConfig"))
+    db.commit()
+    db.close()
+    item_config_id = client.post(
+        "/api/item_configs/",
+        json={
+            "triangle_size": 100,
+            "triangle_color": "#FF0000",
+            "circle_size": 50,
+            "circle_color": "#00FF00",
+            "time_visible_ms": 1000,
+            "orientation": "N",
+        },
+        headers=headers,
+    ).json()["id"]
+    response = client.post(
+        "/api/test_config_results/session",
+        json={
+            "test_config_id": 1,
+            "time": "2024-01-01T00:00:00",
+            "correct_answers": 1,
+            "wrong_answers": 0,
+            "item_config_results": [
+                {
+                    "item_config_id": item_config_id,
+                    "correct": True,
+                    "reaction_time_ms": 300,
+                    "response": "N",
+                }
+            ],
+        },
+        headers=headers,
+    )
+    assert response.status_code == 200
+    test_config_result_id = response.json()["id"]
+
+    response = client.post(
+        "/api/item_configs/batch",
+        json={"operations": [{"action": "delete", "id": item_config_id}]},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    assert client.get(f"/api/item_configs/{item_config_id}").status_code == 404
+    # The game stays, without the deleted answer
+    response = client.get(
+        f"/api/test_config_results/{test_config_result_id}", headers=headers
+    )
+    assert response.status_code == 200
+    assert response.json()["item_config_results"] == []
+
+
+def test_create_item_config_endpoint_returns_identical(setup_database):
+    token, user_id = get_user_id_and_token(client)
+    other_token, other_user_id = get_user_id_and_token(client, "otheruser")
+    item_config_data = {
+        "triangle_size": 100,
+        "triangle_color": "#FF0000",
+        "circle_size": 50,
+        "circle_color": "#00FF00",
+        "time_visible_ms": 1000,
+        "orientation": "N",
+    }
+    first_id, second_id, other_id = [
+        client.post(
+            "/api/item_configs/",
+            json=dict(item_config_data, triangle_color=color),
+            headers={"Authorization": f"Bearer {t}"},
+        ).json()["id"]
+        # Colors are compared case-insensitively
+        for t, color in [
+            (token, "#FF0000"),
+            (token, "#ff0000"),
+            (other_token, "#FF0000"),
+        ]
+    ]
+    assert second_id == first_id
+    # Item configs of other users are not shared
+    assert other_id != first_id
+
+
+def test_item_config_batch_endpoint_collapses_identical_creates(setup_database):
+    token, user_id = get_user_id_and_token(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    item_config_data = {
+        "triangle_size": 100,
+        "triangle_color": "#FF0000",
+        "circle_size": 50,
+        "circle_color": "#00FF00",
+        "time_visible_ms": 1000,
+        "orientation": "N",
+    }
+    stored_id = client.post(
+        "/api/item_configs/", json=item_config_data, headers=headers
+    ).json()["id"]
+
+    response = client.post(
+        "/api/item_configs/batch",
+        json={
+            "operations": [
+                {"action": "create", "item_config": item_config_data},
+                {
+                    "action": "create",
+                    "item_config": dict(item_config_data, orientation="S"),
+                },
+                {
+                    "action": "create",
+                    "item_config": dict(item_config_data, orientation="S"),
+                },
+            ],
+            "test_config_name": "Repeats",
+        },
+        headers=headers,
+    )
+    assert response.status_code == 200
+    data = response.json()
+    first_id, new_id, repeated_id = data["item_config_ids"]
+    assert first_id == stored_id
+    assert repeated_id == new_id != stored_id
+    # The test config holds every item once
+    test_config = client.get(f"/api/test_configs/{data['test_config_id']}").json()
+    assert [item["id"] for item in test_config["item_configs"]] == [stored_id, new_id]
+    db = TestingSessionLocal()
+    try:
+        assert get_item_count(db, data["test_config_id"]) == 2
+    finally:
+        db.close()
+
+
+def test_update_item_config_endpoint_identical(setup_database):
+    token, user_id = get_user_id_and_token(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    item_config_data = {
+        "triangle_size": 100,
+        "triangle_color": "#FF0000",
+        "circle_size": 50,
+        "circle_color": "#00FF00",
+        "time_visible_ms": 1000,
+        "orientation": "N",
+    }
+    kept_id, updated_id = [
+        client.post(
+            "/api/item_configs/",
+            json=dict(item_config_data, orientation=orientation),
+            headers=headers,
+        ).json()["id"]
+        for orientation in "NS"
+    ]
+
+    response = client.put(
+        f"/api/item_configs/{updated_id}", json=item_config_data, headers=headers
+    )
+    assert response.status_code == 422
+    assert response.json()["detail"] == (
+        f"An identical Item Config already exists with id {kept_id}"
+    )
+    assert client.get(f"/api/item_configs/{updated_id}").json()["orientation"] == "S"
+
+
+def _load_migration(name):
+    path = next(
+        (pathlib.Path(__file__).parents[2] / "alembic" / "versions").glob(
+            f"{name}_*.py"
+        )
+    )
+    spec = importlib.util.spec_from_file_location(path.stem, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_content_hash_migration_merges_duplicates():
+    migration = _load_migration("9a2f4d6c1e83")
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    item_config_data = {
+        "triangle_size": 100,
+        "triangle_color": "#FF0000",
+        "circle_size": 50,
+        "circle_color": "#00FF00",
+        "time_visible_ms": 1000,
+        "orientation": "N",
+    }
+    association = models.test_config_item_config_association
+    with engine.begin() as conn:
+        # The rows as they were before the migration, when duplicates were allowed
+        conn.execute(text("DROP INDEX ix_item_config_content_hash"))
+        conn.execute(
+            insert(models.TestConfig.__table__),
+            [{"id": 1, "name": "First"}, {"id": 2, "name": "Second"}],
+        )
+        conn.execute(
+            insert(models.ItemConfig.__table__),
+            [
+                dict(item_config_data, id=1, content_hash="a"),
+                dict(item_config_data, id=2, content_hash="a"),
+                dict(item_config_data, id=3, content_hash="a"),
+                dict(item_config_data, id=4, content_hash="b"),
+            ],
+        )
+        conn.execute(
+            insert(association),
+            [
+                {"test_config_id": 1, "item_config_id": 1, "position": 0},
+                {"test_config_id": 1, "item_config_id": 2, "position": 1},
+                {"test_config_id": 2, "item_config_id": 3, "position": 0},
+                {"test_config_id": 2, "item_config_id": 4, "position": 1},
+            ],
+        )
+        conn.execute(
+            insert(models.ItemConfigResult.__table__),
+            [
+                {
+                    "item_config_id": item_config_id,
+                    "correct": True,
+                    "reaction_time_ms": 300,
+                    "response": "N",
+                }
+                for item_config_id in (2, 3, 4)
+            ],
+        )
+
+        migration._merge_duplicates(conn)
+
+        assert conn.scalars(select(models.ItemConfig.id)).all() == [1, 4]
+        assert sorted(conn.scalars(select(models.ItemConfigResult.item_config_id))) == [
+            1,
+            1,
+            4,
+        ]
+        # Test config 1 had two copies and keeps one, test config 2 is repointed
+        assert sorted(
+            conn.execute(
+                select(association.c.test_config_id, association.c.item_config_id)
+            ).all()
+        ) == [(1, 1), (2, 1), (2, 4)]
@@ -1,5 +1,7 @@
 # test_item_config_results.py
 import os
+import threading
+import time
 import uuid
 
 import pytest
@@ -7,6 +9,9 @@ from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
+from backend.config import settings
+from backend.item_config_results import api_item_config_result, crud_item_config_result
+from backend.item_config_results.ingestion import ResultIngestionQueue
 from backend.models import Base
 from backend.main import app
 from backend.tests.utils import get_user_id_and_token
@@ -377,3 +382,162 @@ def test_read_all_item_config_results_for_user_only_own_results(setup_database):
     assert len(data) == 2
     for item in data:
         assert item["user_id"] == user_id2
+
+
+def test_create_procedural_item_config_result(setup_database):
+    token, user_id = get_user_id_and_token(client)
+    item_config_result_data = {
+        "item_difficulty": "hard",
+        "item_generator_version": 1,
+        "item_seed": 2**52 + 17,
+        "correct": False,
+        "reaction_time_ms": 250,
+        "response": "E",
+    }
+    response = client.post(
+        "/api/item_config_results/",
+        json=item_config_result_data,
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["item_config_id"] is None
+    assert data["item_difficulty"] == "hard"
+    assert data["item_generator_version"] == 1
+    assert data["item_seed"] == 2**52 + 17
+
+
+@pytest.mark.parametrize(
+    "item_identity",
+    [
+        {},
+        {"item_difficulty": "hard", "item_seed": 1},
+        {"item_difficulty": "extreme", "item_generator_version": 1, "item_seed": 1},
+        {"item_difficulty": "hard", "item_generator_version": 99, "item_seed": 1},
+        {"item_difficulty": "hard", "item_generator_version": 1, "item_seed": -1},
+        {
+            "item_config_id": 1,
+            "item_difficulty": "hard",
+            "item_generator_version": 1,
+            "item_seed": 1,
+        },
+    ],
+)
+def test_create_item_config_result_invalid_item_identity(setup_database, item_identity):
+    token, user_id = get_user_id_and_token(client)
+    response = client.post(
+        "/api/item_config_results/",
+        json=dict(item_identity, correct=True, reaction_time_ms=100, response="N"),
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 422
+
+
+@pytest.fixture
+def result_queue(monkeypatch):
+    """Switch to queued ingestion with a writer of its own."""
+    queues = []
+
+    def make(session_factory=TestingSessionLocal, **kwargs):
+        result_queue = ResultIngestionQueue(session_factory, **kwargs)
+        for module in (api_item_config_result, crud_item_config_result):
+            monkeypatch.setattr(module, "result_ingestion_queue", result_queue)
+        result_queue.start()
+        queues.append(result_queue)
+        return result_queue
+
+    monkeypatch.setattr(settings, "QUEUED_RESULT_INGESTION", True)
+    yield make
+    for result_queue in queues:
+        result_queue.stop(timeout=10)
+
+
+def test_queued_item_config_results_are_group_committed(setup_database, result_queue):
+    result_queue(window_ms=1000)
+    token, user_id = get_user_id_and_token(client)
+    item_config_id = insert_item_config_to_db(token).json()["id"]
+
+    for _ in range(20):
+        response = insert_item_config_result_to_db(token, item_config_id)
+        assert response.status_code == 202
+        data = response.json()
+        assert "id" not in data
+        assert data["item_config_id"] == item_config_id
+        assert data["user_id"] == user_id
+
+    response = client.post(
+        "/api/item_config_results/",
+        json={
+            "item_config_id": 928289238,
+            "correct": True,
+            "reaction_time_ms": 100,
+            "response": "N",
+        },
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 422
+
+    crud_item_config_result.result_ingestion_queue.flush()
+    response = client.get(
+        "/api/item_config_results/user",
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert len(response.json()) == 20
+    response = client.get(
+        "/api/stats/user", headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.json()["overall"]["answers"] == 20
+
+    status = client.get("/api/item_config_results/queue").json()
+    assert status["running"]
+    assert status["depth"] == 0
+    assert status["committed"] == 20
+    assert status["failed"] == 0
+    # The answers shared commits
+    assert status["batches"] < 20
+    assert status["last_commit_ms"] is not None
+    assert not status["has_error"]
+    assert "last_error" not in status
+
+
+def test_full_result_queue_refuses_results(setup_database, result_queue):
+    released = threading.Event()
+
+    def slow_session():
+        released.wait(10)
+        return TestingSessionLocal()
+
+    queue = result_queue(slow_session, max_size=2, window_ms=0)
+    token, user_id = get_user_id_and_token(client)
+    item_config_id = insert_item_config_to_db(token).json()["id"]
+
+    # The writer takes the first result and waits for the database
+    assert insert_item_config_result_to_db(token, item_config_id).status_code == 202
+    for _ in range(100):
+        if queue.status()["depth"] == 0:
+            break
+        time.sleep(0.01)
+    for _ in range(2):
+        response = insert_item_config_result_to_db(token, item_config_id)
+        assert response.status_code == 202
+    response = insert_item_config_result_to_db(token, item_config_id)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+    released.set()
+    queue.flush()
+    assert queue.status()["committed"] == 3
+
+
+def test_stopping_the_result_queue_writes_queued_results(setup_database, result_queue):
+    queue = result_queue(window_ms=200)
+    token, user_id = get_user_id_and_token(client)
+    item_config_id = insert_item_config_to_db(token).json()["id"]
+    for _ in range(5):
+        assert insert_item_config_result_to_db(token, item_config_id).status_code == 202
+
+    queue.stop(timeout=10)
+    assert not queue.running
+    assert queue.status()["committed"] == 5
+    response = insert_item_config_result_to_db(token, item_config_id)
+    assert response.status_code == 503
@@ -0,0 +1,340 @@
+import re
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import Engine, create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from backend.analytics.crud_analytics import population_cache
+from backend.config import settings
+from backend.difficulty.crud_difficulty import fill_item_configs
+from backend.difficulty.pool_cache import pool_cache
+from backend.main import app
+from backend.models import Base
+from backend.tests.utils import get_user_id_and_token
+from backend.utils import get_db
+
+SQLALCHEMY_DATABASE_URL = "sqlite:///./temp_for_tests.db"
+
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+)
+
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def setup_database():
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+
+app.dependency_overrides[get_db] = override_get_db
+
+client = TestClient(app)
+
+API_KEY = "export-key"
+
+# Only these statements read rows by a filter; inserts are not planned
+PLANNED_STATEMENT = re.compile(r"^\s*(SELECT|UPDATE|DELETE)\b", re.IGNORECASE)
+
+
+@pytest.fixture
+def captured_statements():
+    """Collect every SELECT, UPDATE and DELETE sent to the database."""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if PLANNED_STATEMENT.match(statement):
+            statements.append((statement, parameters[0] if executemany else parameters))
+
+    # On the Engine class, so that statements of the engine that the global
+    # dependency override points at are captured as well
+    event.listen(Engine, "before_cursor_execute", capture)
+    yield statements
+    event.remove(Engine, "before_cursor_execute", capture)
+
+
+# Plan lines of a full pass over a table or index, as opposed to SEARCH lines of
+# index lookups. Constant rows (e.g. of an empty IN list) are not tables.
+FULL_SCAN = re.compile(r"^SCAN (?!CONSTANT ROW|\()")
+
+# Statements that may scan, with the reason
+ALLOWED_SCANS = [
+    # Unfiltered listings read every row by design
+    re.compile(r"^(?!.*\bWHERE\b)", re.IGNORECASE | re.DOTALL),
+    # A keyset page filtered by creation time only walks the primary key in
+    # order and stops after `limit` matches, which SQLite prefers over sorting
+    # the whole time range
+    re.compile(
+        r"FROM item_config\s+WHERE item_config\.created [<>]=? \?"
+        r"(\s+AND item_config\.created < \?)?\s+ORDER BY item_config\.id\s+LIMIT"
+    ),
+]
+
+
+def full_table_scans(statement, parameters):
+    """The full scans of tables in the SQLite query plan of a statement."""
+    with engine.connect() as conn:
+        plan = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+    details = [row[-1] for row in plan]
+    # Named subqueries are computed by the plan itself, scanning them reads no table
+    subqueries = {
+        detail.split()[1]
+        for detail in details
+        if detail.startswith(("CO-ROUTINE ", "MATERIALIZE "))
+    }
+    return [
+        detail
+        for detail in details
+        if FULL_SCAN.match(detail) and detail.split()[1] not in subqueries
+    ]
+
+
+def is_allowed_scan(statement):
+    return any(pattern.search(statement) for pattern in ALLOWED_SCANS)
+
+
+def auth(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def item_config_data(triangle_size):
+    return {
+        "triangle_size": triangle_size,
+        "triangle_color": "#FF0000",
+        "circle_size": 50,
+        "circle_color": "#00FF00",
+        "time_visible_ms": 1000,
+        "orientation": "N",
+    }
+
+
+def exercise_api():
+    """Call every endpoint that reads or writes the database at least once."""
+    token, user_id = get_user_id_and_token(client)
+    other_token, _ = get_user_id_and_token(client, "otheruser")
+    assert client.get("/api/users/me", headers=auth(token)).status_code == 200
+    assert client.get("/api/users/exists/testuser").json() == {"exists": True}
+
+    db = TestingSessionLocal()
+    fill_item_configs(db, 10)
+    db.close()
+    pool_cache.invalidate()
+    assert client.get("/api/difficulty/easy?limit=5").status_code == 200
+    assert client.get("/api/difficulty/status").status_code == 200
+
+    item_config_ids = [
+        client.post(
+            "/api/item_configs/", json=item_config_data(size), headers=auth(token)
+        ).json()["id"]
+        for size in (100, 110, 120)
+    ]
+    item_config_id = item_config_ids[0]
+    for params in (
+        {},
+        {"after_id": item_config_id, "limit": 2},
+        {"user_id": user_id, "include_total": True},
+        {"difficulty": "easy", "include_total": True},
+        {"difficulty": "easy", "user_id": user_id, "include_total": True},
+        {"created_after": "2000-01-01T00:00:00", "include_total": True},
+        {"created_before": "2100-01-01T00:00:00", "limit": 2},
+    ):
+        assert client.get("/api/item_configs/", params=params).status_code == 200
+    response = client.get(
+        "/api/item_configs/by_contrast", params={"contrast_min": 1, "contrast_max": 4}
+    )
+    assert response.status_code == 200
+    assert client.get(f"/api/item_configs/{item_config_id}").status_code == 200
+    response = client.put(
+        f"/api/item_configs/{item_config_ids[1]}",
+        json=item_config_data(130),
+        headers=auth(token),
+    )
+    assert response.status_code == 200
+
+    response = client.post(
+        "/api/test_configs/",
+        json={"name": "Test", "item_config_ids": item_config_ids},
+        headers=auth(token),
+    )
+    test_config_id = response.json()["id"]
+    assert client.get("/api/test_configs/").status_code == 200
+    for params in ({}, {"user_id": user_id}):
+        response = client.get("/api/test_configs/summary", params=params)
+        assert response.status_code == 200
+    assert client.get(f"/api/test_configs/{test_config_id}").status_code == 200
+    assert client.get(f"/api/test_configs/{test_config_id}/header").status_code == 200
+    for params in ({"limit": 1}, {"start": 1, "limit": 1}):
+        response = client.get(
+            f"/api/test_configs/{test_config_id}/items", params=params
+        )
+        assert response.status_code == 200
+    response = client.put(
+        f"/api/test_configs/{test_config_id}",
+        json={"name": "Updated", "item_config_ids": item_config_ids[:2]},
+        headers=auth(token),
+    )
+    assert response.status_code == 200
+    response = client.post(
+        "/api/item_configs/batch",
+        json={
+            "operations": [
+                {"action": "create", "item_config": item_config_data(140)},
+                {
+                    "action": "update",
+                    "id": item_config_ids[1],
+                    "item_config": item_config_data(150),
+                },
+                {"action": "link", "id": item_config_id},
+            ],
+            "test_config_id": test_config_id,
+        },
+        headers=auth(token),
+    )
+    assert response.status_code == 200
+
+    item_config_result_ids = [
+        client.post(
+            "/api/item_config_results/",
+            json={
+                "item_config_id": item_config_id,
+                "correct": True,
+                "reaction_time_ms": 100,
+                "response": "N",
+            },
+            headers=auth(token),
+        ).json()["id"]
+        for _ in range(2)
+    ]
+    for path in (
+        "/api/item_config_results/user",
+        f"/api/item_config_results/item_config/{item_config_id}",
+        f"/api/item_config_results/{item_config_result_ids[0]}",
+    ):
+        assert client.get(path, headers=auth(token)).status_code == 200
+
+    test_config_result_data = {
+        "test_config_id": test_config_id,
+        "time": "2024-01-01T00:00:00",
+        "correct_answers": 2,
+        "wrong_answers": 0,
+        "item_config_result_ids": item_config_result_ids,
+    }
+    response = client.post(
+        "/api/test_config_results/", json=test_config_result_data, headers=auth(token)
+    )
+    test_config_result_id = response.json()["id"]
+    response = client.post(
+        "/api/test_config_results/session",
+        json={
+            "test_config_id": test_config_id,
+            "time": "2024-01-01T00:00:00",
+            "correct_answers": 1,
+            "wrong_answers": 0,
+            "item_config_results": [
+                {
+                    "item_config_id": item_config_id,
+                    "correct": True,
+                    "reaction_time_ms": 100,
+                    "response": "N",
+                }
+            ],
+        },
+        headers=auth(token),
+    )
+    session_result_id = response.json()["id"]
+    for params in ({}, {"include_percentiles": True}):
+        response = client.get("/api/stats/user", params=params, headers=auth(token))
+        assert response.status_code == 200
+    for path in (
+        "/api/analytics/thresholds/user",
+        "/api/analytics/thresholds/population",
+    ):
+        assert client.get(path, headers=auth(token)).status_code == 200
+    for params in (
+        {},
+        {"user_id": user_id},
+        {"test_config_id": test_config_id},
+        {"created_after": "2000-01-01T00:00:00"},
+    ):
+        response = client.get(
+            "/api/export/results", params=params, headers={"X-API-Key": API_KEY}
+        )
+        assert response.status_code == 200
+    for path in (
+        "/api/test_config_results/user",
+        f"/api/test_config_results/test_config/{test_config_id}",
+        f"/api/test_config_results/{test_config_result_id}",
+    ):
+        assert client.get(path, headers=auth(token)).status_code == 200
+    response = client.put(
+        f"/api/test_config_results/{test_config_result_id}",
+        json=dict(test_config_result_data, item_config_result_ids=[]),
+        headers=auth(token),
+    )
+    assert response.status_code == 200
+
+    response = client.post("/api/adaptive/sessions", json={}, headers=auth(token))
+    session_id = response.json()["id"]
+    assert (
+        client.get(f"/api/adaptive/sessions/{session_id}", headers=auth(token))
+    ).status_code == 200
+    response = client.post(
+        f"/api/adaptive/sessions/{session_id}/answers",
+        json={"response": "N", "reaction_time_ms": 300},
+        headers=auth(token),
+    )
+    assert response.status_code == 200
+
+    # Deletes, including one refused for another user
+    response = client.delete(
+        f"/api/item_configs/{item_config_id}", headers=auth(other_token)
+    )
+    assert response.status_code == 401
+    for result_id in (test_config_result_id, session_result_id):
+        response = client.delete(
+            f"/api/test_config_results/{result_id}", headers=auth(token)
+        )
+        assert response.status_code == 200
+    response = client.delete(f"/api/test_configs/{test_config_id}", headers=auth(token))
+    assert response.status_code == 200
+    response = client.delete(f"/api/item_configs/{item_config_id}", headers=auth(token))
+    assert response.status_code == 200
+    assert client.post("/api/users/logout", headers=auth(token)).status_code == 200
+
+
+def test_no_query_falls_back_to_a_full_table_scan(
+    setup_database, captured_statements, monkeypatch
+):
+    monkeypatch.setattr(settings, "EXPORT_API_KEY", API_KEY)
+    population_cache.invalidate()
+    exercise_api()
+
+    assert len(captured_statements) > 50
+    scans = {}
+    for statement, parameters in captured_statements:
+        if is_allowed_scan(statement):
+            continue
+        found = full_table_scans(statement, parameters)
+        if found:
+            scans[" ".join(statement.split())] = found
+    assert scans == {}
+
+
+def test_full_table_scans_are_detected(setup_database):
+    # Guards the check above: a filter on a column without an index is a scan
+    statement = "SELECT id FROM item_config WHERE orientation = ?"
+    assert full_table_scans(statement, ("N",)) == ["SCAN item_config"]
+    statement = "SELECT id FROM item_config_result WHERE item_config_id = ?"
+    assert full_table_scans(statement, (1,)) == []
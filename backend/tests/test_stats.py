@@ -0,0 +1,394 @@
+import datetime
+import math
+import statistics
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import Engine, create_engine, event, select
+from sqlalchemy.orm import sessionmaker
+
+from backend import models
+from backend.main import app
+from backend.models import Base
+from backend.stats.user_stats import rebuild_user_stats
+from backend.tests.utils import get_user_id_and_token
+from backend.utils import get_db
+
+SQLALCHEMY_DATABASE_URL = "sqlite:///./temp_for_tests.db"
+
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+)
+
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def setup_database():
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+
+app.dependency_overrides[get_db] = override_get_db
+
+client = TestClient(app)
+
+
+def auth(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def insert_item_config(token):
+    response = client.post(
+        "/api/item_configs/",
+        json={
+            "triangle_size": 100,
+            "triangle_color": "#FF0000",
+            "circle_size": 50,
+            "circle_color": "#00FF00",
+            "time_visible_ms": 1000,
+            "orientation": "N",
+        },
+        headers=auth(token),
+    )
+    return response.json()["id"]
+
+
+def play(token, test_config_id, item_config_id, time, answers):
+    """Submit a game of (correct, reaction_time_ms) answers."""
+    response = client.post(
+        "/api/test_config_results/session",
+        json={
+            "test_config_id": test_config_id,
+            "time": time,
+            "correct_answers": sum(correct for correct, _ in answers),
+            "wrong_answers": sum(not correct for correct, _ in answers),
+            "item_config_results": [
+                {
+                    "item_config_id": item_config_id,
+                    "correct": correct,
+                    "reaction_time_ms": reaction_time_ms,
+                    "response": "N",
+                }
+                for correct, reaction_time_ms in answers
+            ],
+        },
+        headers=auth(token),
+    )
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+def nearest_rank(values, fraction):
+    return sorted(values)[math.ceil(fraction * len(values)) - 1]
+
+
+def test_read_user_stats(setup_database):
+    token, user_id = get_user_id_and_token(client)
+    other_token, _ = get_user_id_and_token(client, "otheruser")
+    db = TestingSessionLocal()
+    db.add_all(
+        [
+            models.TestConfig(id=1, name="Easy TestConfig"),
+            models.TestConfig(id=4, name="Hard TestConfig"),
+        ]
+    )
+    db.commit()
+    db.close()
+    free_test_config_id = client.post(
+        "/api/test_configs/",
+        json={"name": "Free", "item_config_ids": []},
+        headers=auth(token),
+    ).json()["id"]
+    item_config_id = insert_item_config(token)
+
+    today = datetime.datetime.utcnow().replace(microsecond=0)
+    yesterday = (today - datetime.timedelta(days=1)).isoformat()
+    easy = [(True, 300), (True, 200), (False, 900), (True, 400)]
+    play(token, 1, item_config_id, yesterday, easy[:2])
+    play(token, 1, item_config_id, today.isoformat(), easy[2:])
+    hard = [(False, 700), (True, 500), (False, 800)]
+    play(token, 4, item_config_id, today.isoformat(), hard)
+    play(token, free_test_config_id, item_config_id, today.isoformat(), [(True, 100)])
+    # A game long ago counts, but is not part of the score series
+    long_ago = (today - datetime.timedelta(days=400)).isoformat()
+    play(token, 4, item_config_id, long_ago, [(True, 600)])
+    # An answer outside of a game and another user's game
+    client.post(
+        "/api/item_config_results/",
+        json={
+            "item_config_id": item_config_id,
+            "correct": False,
+            "reaction_time_ms": 1000,
+            "response": "S",
+        },
+        headers=auth(token),
+    )
+    play(other_token, 1, item_config_id, today.isoformat(), [(True, 50)])
+
+    response = client.get(
+        "/api/stats/user", params={"include_percentiles": True}, headers=auth(token)
+    )
+    assert response.status_code == 200
+    data = response.json()
+
+    everything = easy + hard + [(True, 100), (True, 600), (False, 1000)]
+    reaction_times = [reaction_time for _, reaction_time in everything]
+    assert data["overall"] == {
+        "answers": 10,
+        "correct_answers": 6,
+        "accuracy": pytest.approx(0.6),
+        "reaction_time_mean_ms": pytest.approx(sum(reaction_times) / 10),
+        "reaction_time_sd_ms": pytest.approx(statistics.pstdev(reaction_times)),
+        "reaction_time_p50_ms": nearest_rank(reaction_times, 0.5),
+        "reaction_time_p90_ms": nearest_rank(reaction_times, 0.9),
+    }
+    assert data["games"] == 5
+
+    difficulties = {stats["difficulty"]: stats for stats in data["difficulties"]}
+    assert list(difficulties) == ["easy", "medium", "hard", "free"]
+    assert difficulties["easy"]["games"] == 2
+    assert difficulties["easy"]["answers"] == 4
+    assert difficulties["easy"]["accuracy"] == pytest.approx(0.75)
+    assert difficulties["easy"]["reaction_time_p50_ms"] == 300
+    assert difficulties["easy"]["reaction_time_p90_ms"] == 900
+    assert difficulties["easy"]["last_played"] == today.isoformat()
+    assert difficulties["hard"]["games"] == 2
+    assert difficulties["hard"]["answers"] == 4
+    assert difficulties["hard"]["reaction_time_mean_ms"] == pytest.approx(650)
+    assert difficulties["hard"]["reaction_time_p50_ms"] == 600
+    assert difficulties["free"]["games"] == 1
+    assert difficulties["free"]["reaction_time_p90_ms"] == 100
+    assert difficulties["medium"] == {
+        "difficulty": "medium",
+        "games": 0,
+        "answers": 0,
+        "correct_answers": 0,
+        "accuracy": None,
+        "reaction_time_mean_ms": None,
+        "reaction_time_sd_ms": None,
+        "reaction_time_p50_ms": None,
+        "reaction_time_p90_ms": None,
+        "last_played": None,
+    }
+
+    assert [
+        (point["day"], point["difficulty"], point["games"], point["best_score"])
+        for point in data["scores"]
+    ] == [
+        (yesterday[:10], "easy", 1, 2),
+        (today.date().isoformat(), "easy", 1, 1),
+        (today.date().isoformat(), "free", 1, 1),
+        (today.date().isoformat(), "hard", 1, 1),
+    ]
+
+    response = client.get("/api/stats/user", params={"days": 1000}, headers=auth(token))
+    assert len(response.json()["scores"]) == 5
+
+
+def test_read_user_stats_without_results(setup_database):
+    token, user_id = get_user_id_and_token(client)
+    response = client.get("/api/stats/user", headers=auth(token))
+    assert response.status_code == 200
+    data = response.json()
+    assert data["overall"]["answers"] == 0
+    assert data["overall"]["accuracy"] is None
+    assert data["games"] == 0
+    assert all(stats["games"] == 0 for stats in data["difficulties"])
+    assert data["scores"] == []
+
+
+def test_read_user_stats_unauthorized(setup_database):
+    response = client.get("/api/stats/user", headers=auth("invalid_token"))
+    assert response.status_code == 401
+
+
+def user_stats_rows():
+    db = TestingSessionLocal()
+    try:
+        return {
+            (row.user_id, row.difficulty): {
+                column.name: getattr(row, column.name)
+                for column in models.UserStats.__table__.columns
+            }
+            for row in db.scalars(select(models.UserStats))
+        }
+    finally:
+        db.close()
+
+
+def test_user_stats_follow_result_changes(setup_database):
+    token, user_id = get_user_id_and_token(client)
+    db = TestingSessionLocal()
+    db.add(models.TestConfig(id=1, name="Easy TestConfig"))
+    db.commit()
+    db.close()
+    item_config_ids = [insert_item_config(token)]
+    response = client.post(
+        "/api/item_configs/",
+        json={
+            "triangle_size": 50,
+            "triangle_color": "#FF0000",
+            "circle_size": 50,
+            "circle_color": "#00FF00",
+            "time_visible_ms": 1000,
+            "orientation": "S",
+        },
+        headers=auth(token),
+    )
+    item_config_ids.append(response.json()["id"])
+
+    first = play(token, 1, item_config_ids[0], "2024-01-01T00:00:00", [(True, 300)])
+    second = play(token, 1, item_config_ids[1], "2024-01-02T00:00:00", [(False, 500)])
+    assert user_stats_rows()[(user_id, "easy")]["last_played"] == datetime.datetime(
+        2024, 1, 2
+    )
+
+    # Relink the first game to the answer of the second, then delete the second
+    second_answer_ids = [
+        result["id"]
+        for result in client.get(
+            f"/api/test_config_results/{second}", headers=auth(token)
+        ).json()["item_config_results"]
+    ]
+    response = client.put(
+        f"/api/test_config_results/{first}",
+        json={
+            "test_config_id": 1,
+            "time": "2024-01-03T00:00:00",
+            "correct_answers": 0,
+            "wrong_answers": 1,
+            "item_config_result_ids": second_answer_ids,
+        },
+        headers=auth(token),
+    )
+    assert response.status_code == 200
+    response = client.delete(f"/api/test_config_results/{second}", headers=auth(token))
+    assert response.status_code == 200
+    # Deleting an item config deletes the answers to it
+    response = client.delete(
+        f"/api/item_configs/{item_config_ids[0]}", headers=auth(token)
+    )
+    assert response.status_code == 200
+
+    maintained = user_stats_rows()
+    assert maintained[(user_id, "easy")]["games"] == 1
+    assert maintained[(user_id, "easy")]["answers"] == 1
+    assert maintained[(user_id, "easy")]["reaction_time_sum_ms"] == 500
+    assert maintained[(user_id, "easy")]["last_played"] == datetime.datetime(2024, 1, 3)
+    assert maintained[(user_id, "all")]["answers"] == 1
+
+    db = TestingSessionLocal()
+    try:
+        assert rebuild_user_stats(db) == 2
+    finally:
+        db.close()
+    assert user_stats_rows() == maintained
+
+
+def test_user_stats_follow_item_config_deletes(setup_database):
+    token, user_id = get_user_id_and_token(client)
+    db = TestingSessionLocal()
+    db.add(models.TestConfig(id=1, name="Easy TestConfig"))
+    db.commit()
+    db.close()
+    deleted_id = insert_item_config(token)
+    batch_deleted_id = client.post(
+        "/api/item_configs/",
+        json={
+            "triangle_size": 50,
+            "triangle_color": "#FF0000",
+            "circle_size": 50,
+            "circle_color": "#00FF00",
+            "time_visible_ms": 1000,
+            "orientation": "S",
+        },
+        headers=auth(token),
+    ).json()["id"]
+    kept_id = client.post(
+        "/api/item_configs/",
+        json={
+            "triangle_size": 60,
+            "triangle_color": "#FF0000",
+            "circle_size": 50,
+            "circle_color": "#00FF00",
+            "time_visible_ms": 1000,
+            "orientation": "S",
+        },
+        headers=auth(token),
+    ).json()["id"]
+    for item_config_id in (deleted_id, batch_deleted_id, kept_id):
+        play(
+            token,
+            1,
+            item_config_id,
+            "2024-01-01T00:00:00",
+            [(True, 300), (False, 400)],
+        )
+
+    # The answers are deleted with their item configs, also those of games
+    response = client.delete(f"/api/item_configs/{deleted_id}", headers=auth(token))
+    assert response.status_code == 200
+    response = client.post(
+        "/api/item_configs/batch",
+        json={"operations": [{"action": "delete", "id": batch_deleted_id}]},
+        headers=auth(token),
+    )
+    assert response.status_code == 200
+
+    db = TestingSessionLocal()
+    try:
+        results = db.scalars(select(models.ItemConfigResult)).all()
+        assert {result.item_config_id for result in results} == {kept_id}
+    finally:
+        db.close()
+    maintained = user_stats_rows()
+    assert maintained[(user_id, "all")]["answers"] == 2
+    assert maintained[(user_id, "easy")]["answers"] == 2
+    assert maintained[(user_id, "easy")]["games"] == 3
+
+    db = TestingSessionLocal()
+    try:
+        assert rebuild_user_stats(db) == 2
+    finally:
+        db.close()
+    assert user_stats_rows() == maintained
+
+
+def test_read_user_stats_reads_the_rollup(setup_database):
+    token, user_id = get_user_id_and_token(client)
+    item_config_id = insert_item_config(token)
+    test_config_id = client.post(
+        "/api/test_configs/",
+        json={"name": "Free", "item_config_ids": [item_config_id]},
+        headers=auth(token),
+    ).json()["id"]
+    play(token, test_config_id, item_config_id, "2024-01-01T00:00:00", [(True, 300)])
+
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    # On the Engine class, the dependency override may use another test engine
+    event.listen(Engine, "before_cursor_execute", capture)
+    try:
+        response = client.get("/api/stats/user", headers=auth(token))
+    finally:
+        event.remove(Engine, "before_cursor_execute", capture)
+    assert response.status_code == 200
+    assert response.json()["overall"]["answers"] == 1
+    assert response.json()["overall"]["reaction_time_p50_ms"] is None
+    # No answer is read, only the user's rows of the rollup and the recent games
+    assert not any("FROM item_config_result" in statement for statement in statements)
+    assert sum("FROM user_stats" in statement for statement in statements) == 1
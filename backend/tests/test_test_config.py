@@ -1,14 +1,17 @@
+import itertools
 import os
 import uuid
 
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import Engine, create_engine, event, select
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
+from backend import models
 from backend.models import Base
 from backend.main import app
+from backend.test_config.item_counts import get_item_count, reconcile_item_counts
 from backend.tests.utils import get_user_id_and_token
 from backend.utils import get_db
 
@@ -44,9 +47,13 @@ client = TestClient(app)
 
 
 # Helper function to insert an ItemConfig and return its ID
+# Identical item configs of a user are stored once, so every call uses a new size
+triangle_sizes = itertools.count(100)
+
+
 def insert_item_config(token):
     item_config_data = {
-        "triangle_size": 100,
+        "triangle_size": next(triangle_sizes),
         "triangle_color": "#FF0000",
         "circle_size": 50,
         "circle_color": "#00FF00",
@@ -130,6 +137,179 @@ def test_read_test_configs_endpoint(setup_database):
             break
 
 
+def test_read_test_configs_endpoint_loads_items_in_constant_queries(setup_database):
+    token, user_id = get_user_id_and_token(client)
+    for name in ("First", "Second", "Third"):
+        client.post(
+            "/api/test_configs/",
+            json={
+                "name": name,
+                "item_config_ids": [
+                    insert_item_config(token),
+                    insert_item_config(token),
+                ],
+            },
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    # On the Engine class, the dependency override may use another test engine
+    event.listen(Engine, "before_cursor_execute", count)
+    try:
+        response = client.get("/api/test_configs/")
+    finally:
+        event.remove(Engine, "before_cursor_execute", count)
+    assert response.status_code == 200
+    assert [len(test_config["item_configs"]) for test_config in response.json()] == [
+        2,
+        2,
+        2,
+    ]
+    # The test configs, then the items of all of them
+    assert len(statements) == 2
+
+
+def test_read_test_config_summaries_endpoint(setup_database):
+    token, user_id = get_user_id_and_token(client)
+    other_token, other_user_id = get_user_id_and_token(client, "otheruser")
+    created = [
+        client.post(
+            "/api/test_configs/",
+            json={
+                "name": name,
+                "item_config_ids": [insert_item_config(owner) for _ in range(size)],
+            },
+            headers={"Authorization": f"Bearer {owner}"},
+        ).json()
+        for name, owner, size in (("Mine", token, 3), ("Theirs", other_token, 1))
+    ]
+
+    response = client.get("/api/test_configs/summary")
+    assert response.status_code == 200
+    assert [
+        (summary["id"], summary["name"], summary["user_id"], summary["item_count"])
+        for summary in response.json()
+    ] == [
+        (created[0]["id"], "Mine", user_id, 3),
+        (created[1]["id"], "Theirs", other_user_id, 1),
+    ]
+    assert "item_configs" not in response.json()[0]
+
+    response = client.get(f"/api/test_configs/summary?user_id={user_id}")
+    assert [summary["name"] for summary in response.json()] == ["Mine"]
+
+
+def test_read_test_config_items_endpoint_pages_through_items(setup_database):
+    token, user_id = get_user_id_and_token(client)
+    item_config_ids = [insert_item_config(token) for _ in range(5)]
+    response = client.post(
+        "/api/test_configs/",
+        json={"name": "Paged", "item_config_ids": item_config_ids},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    test_config_id = response.json()["id"]
+
+    pages = []
+    params = {"limit": 2}
+    while True:
+        response = client.get(
+            f"/api/test_configs/{test_config_id}/items", params=params
+        )
+        assert response.status_code == 200
+        pages.append([item_config["id"] for item_config in response.json()])
+        if "X-Next-Cursor" not in response.headers:
+            break
+        params["start"] = response.headers["X-Next-Cursor"]
+    assert pages == [item_config_ids[:2], item_config_ids[2:4], item_config_ids[4:]]
+
+    # Any slice can be fetched directly by its start position
+    response = client.get(
+        f"/api/test_configs/{test_config_id}/items", params={"start": 3, "limit": 1}
+    )
+    assert [item_config["id"] for item_config in response.json()] == [
+        item_config_ids[3]
+    ]
+
+
+def test_test_config_items_keep_their_order(setup_database):
+    token, user_id = get_user_id_and_token(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    first, second, third = [insert_item_config(token) for _ in range(3)]
+    response = client.post(
+        "/api/test_configs/",
+        json={"name": "Ordered", "item_config_ids": [third, first, second]},
+        headers=headers,
+    )
+    test_config_id = response.json()["id"]
+    assert [item["id"] for item in response.json()["item_configs"]] == [
+        third,
+        first,
+        second,
+    ]
+
+    response = client.put(
+        f"/api/test_configs/{test_config_id}",
+        json={"name": "Ordered", "item_config_ids": [second, third, first]},
+        headers=headers,
+    )
+    assert [item["id"] for item in response.json()["item_configs"]] == [
+        second,
+        third,
+        first,
+    ]
+    response = client.get(f"/api/test_configs/{test_config_id}")
+    assert [item["id"] for item in response.json()["item_configs"]] == [
+        second,
+        third,
+        first,
+    ]
+
+    db = TestingSessionLocal()
+    try:
+        association = models.test_config_item_config_association
+        positions = db.execute(
+            select(association.c.item_config_id, association.c.position).where(
+                association.c.test_config_id == test_config_id
+            )
+        ).all()
+        assert dict(positions) == {second: 0, third: 1, first: 2}
+    finally:
+        db.close()
+
+
+def test_read_test_config_header_endpoint(setup_database):
+    token, user_id = get_user_id_and_token(client)
+    response = client.post(
+        "/api/test_configs/",
+        json={
+            "name": "Header",
+            "item_config_ids": [insert_item_config(token), insert_item_config(token)],
+        },
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    test_config_id = response.json()["id"]
+
+    response = client.get(f"/api/test_configs/{test_config_id}/header")
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["id"], data["name"], data["user_id"], data["item_count"]) == (
+        test_config_id,
+        "Header",
+        user_id,
+        2,
+    )
+    assert "item_configs" not in data
+
+
+def test_read_test_config_header_and_items_invalid_id(setup_database):
+    assert client.get("/api/test_configs/9999/header").status_code == 404
+    assert client.get("/api/test_configs/9999/items").status_code == 404
+
+
 def test_read_test_config_by_id_endpoint(setup_database):
     token, user_id = get_user_id_and_token(client)
     # First, create a test config
@@ -191,6 +371,52 @@ def test_update_test_config_endpoint(setup_database):
     assert len(data["item_configs"]) == len(update_data["item_config_ids"])
 
 
+def test_update_test_config_endpoint_writes_only_the_difference(setup_database):
+    token, user_id = get_user_id_and_token(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    item_config_ids = [insert_item_config(token) for _ in range(6)]
+    response = client.post(
+        "/api/test_configs/",
+        json={"name": "Diffed", "item_config_ids": item_config_ids[:5]},
+        headers=headers,
+    )
+    test_config_id = response.json()["id"]
+
+    writes = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if "test_config_item_config" in statement and not statement.startswith(
+            "SELECT"
+        ):
+            writes.append((statement.split()[0], len(parameters) if executemany else 1))
+
+    # On the Engine class, the dependency override may use another test engine
+    event.listen(Engine, "before_cursor_execute", capture)
+    try:
+        # Replace the first item by the sixth, with an unknown id that is ignored
+        response = client.put(
+            f"/api/test_configs/{test_config_id}",
+            json={
+                "name": "Diffed",
+                "item_config_ids": [item_config_ids[5], 9999] + item_config_ids[1:5],
+            },
+            headers=headers,
+        )
+    finally:
+        event.remove(Engine, "before_cursor_execute", capture)
+    assert response.status_code == 200
+    assert [item_config["id"] for item_config in response.json()["item_configs"]] == [
+        item_config_ids[5]
+    ] + item_config_ids[1:5]
+    assert writes == [("DELETE", 1), ("INSERT", 1)]
+
+    db = TestingSessionLocal()
+    try:
+        assert get_item_count(db, test_config_id) == 5
+    finally:
+        db.close()
+
+
 def test_update_test_config_endpoint_unauthorized(setup_database):
     token, user_id = get_user_id_and_token(client)
     token2, user_id2 = get_user_id_and_token(client, "testuser2")
@@ -294,3 +520,61 @@ def test_delete_test_config_endpoint_invalid_id(setup_database):
         f"/api/test_configs/{invalid_id}", headers={"Authorization": f"Bearer {token}"}
     )
     assert delete_response.status_code == 404
+
+
+def test_item_counts_follow_crud(setup_database):
+    token, user_id = get_user_id_and_token(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    item_config_ids = [insert_item_config(token) for _ in range(3)]
+
+    response = client.post(
+        "/api/test_configs/",
+        json={"name": "Counted", "item_config_ids": item_config_ids[:2]},
+        headers=headers,
+    )
+    test_config_id = response.json()["id"]
+    db = TestingSessionLocal()
+    try:
+        assert get_item_count(db, test_config_id) == 2
+
+        client.put(
+            f"/api/test_configs/{test_config_id}",
+            json={"name": "Counted", "item_config_ids": item_config_ids},
+            headers=headers,
+        )
+        db.expire_all()
+        assert get_item_count(db, test_config_id) == 3
+
+        client.delete(f"/api/item_configs/{item_config_ids[0]}", headers=headers)
+        db.expire_all()
+        assert get_item_count(db, test_config_id) == 2
+        assert reconcile_item_counts(db) == {}
+
+        client.delete(f"/api/test_configs/{test_config_id}", headers=headers)
+        db.expire_all()
+        assert get_item_count(db, test_config_id) == 0
+        assert db.query(models.TestConfigItemCount).count() == 0
+    finally:
+        db.close()
+
+
+def test_reconcile_item_counts_repairs_drift(setup_database):
+    token, user_id = get_user_id_and_token(client)
+    response = client.post(
+        "/api/test_configs/",
+        json={
+            "name": "Drifted",
+            "item_config_ids": [insert_item_config(token), insert_item_config(token)],
+        },
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    test_config_id = response.json()["id"]
+    db = TestingSessionLocal()
+    try:
+        db.query(models.TestConfigItemCount).update({"item_count": 7})
+        db.commit()
+
+        assert reconcile_item_counts(db) == {test_config_id: (7, 2)}
+        assert get_item_count(db, test_config_id) == 2
+    finally:
+        db.close()
@@ -3,7 +3,7 @@ import uuid
 
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import Engine, create_engine, event
 from sqlalchemy.orm import sessionmaker
 
 from backend.models import Base
@@ -240,6 +240,107 @@ def test_insert_test_config_result_with_invalid_test_config_id(setup_database):
     assert "Constraint error" in str(response.json()["detail"])
 
 
+def session_data(test_config_id, item_config_ids):
+    return {
+        "test_config_id": test_config_id,
+        "time": "2024-01-01T00:00:00",
+        "correct_answers": 1,
+        "wrong_answers": 1,
+        "item_config_results": [
+            {
+                "item_config_id": item_config_id,
+                "correct": index == 0,
+                "reaction_time_ms": 100 + index,
+                "response": "N",
+            }
+            for index, item_config_id in enumerate(item_config_ids)
+        ],
+    }
+
+
+def test_create_test_config_result_session(setup_database):
+    token, user_id = get_user_id_and_token(client)
+    test_config = insert_test_config_to_db(token).json()
+    # The same item answered twice
+    item_config_ids = [test_config["item_configs"][0]["id"]] * 2
+
+    inserts = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT"):
+            inserts.append(statement.split()[2])
+
+    # On the Engine class, the dependency override may use another test engine
+    event.listen(Engine, "before_cursor_execute", capture)
+    try:
+        response = client.post(
+            "/api/test_config_results/session",
+            json=session_data(test_config["id"], item_config_ids),
+            headers={"Authorization": f"Bearer {token}"},
+        )
+    finally:
+        event.remove(Engine, "before_cursor_execute", capture)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["user_id"] == user_id
+    assert data["correct_answers"] == 1
+    assert data["wrong_answers"] == 1
+    results = sorted(data["item_config_results"], key=lambda result: result["id"])
+    assert [result["item_config_id"] for result in results] == item_config_ids
+    assert [result["correct"] for result in results] == [True, False]
+    assert all(result["user_id"] == user_id for result in results)
+    # One statement per table, however many answers the game has, and the
+    # statistics of all answers and of the game's difficulty
+    assert inserts == [
+        "test_config_result",
+        "item_config_result",
+        "test_config_result_item_config_result",
+        "user_stats",
+        "user_stats",
+    ]
+
+    response = client.get(
+        f"/api/test_config_results/{data['id']}",
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert len(response.json()["item_config_results"]) == 2
+
+
+def test_create_test_config_result_session_is_atomic(setup_database):
+    token, user_id = get_user_id_and_token(client)
+    test_config = insert_test_config_to_db(token).json()
+    item_config_ids = [item_config["id"] for item_config in test_config["item_configs"]]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    # An unknown item config fails the whole game
+    response = client.post(
+        "/api/test_config_results/session",
+        json=session_data(test_config["id"], item_config_ids + [928289238]),
+        headers=headers,
+    )
+    assert response.status_code == 422
+    assert "Constraint error" in str(response.json()["detail"])
+
+    response = client.post(
+        "/api/test_config_results/session",
+        json=session_data(928289238, item_config_ids),
+        headers=headers,
+    )
+    assert response.status_code == 422
+
+    assert client.get("/api/test_config_results/user", headers=headers).json() == []
+    assert client.get("/api/item_config_results/user", headers=headers).json() == []
+
+
+def test_create_test_config_result_session_unauthorized(setup_database):
+    response = client.post(
+        "/api/test_config_results/session",
+        json=session_data(1, []),
+        headers={"Authorization": f"Bearer invalid_token"},
+    )
+    assert response.status_code == 401
+
+
 def test_read_all_test_config_results_for_test_config(setup_database):
     token, user_id = get_user_id_and_token(client)
     response = insert_test_config_result_to_db(token)
@@ -0,0 +1,76 @@
+"""Compare pre-serialized difficulty responses with the response_model path.
+
+Fills a temporary SQLite database with one pool of 10,000 items and measures
+requests/sec of GET /api/difficulty/easy through the ASGI test client.
+
+Usage: python -m benchmarks.bench_difficulty_response [limit ...]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend import models
+from backend.config import settings
+from backend.difficulty.crud_difficulty import insert_generated_item_configs
+from backend.difficulty.pool_cache import pool_cache
+from backend.main import app
+from backend.models import Base
+from backend.utils import get_db
+
+POOL_SIZE = 10_000
+DURATION_S = 3.0
+
+
+def requests_per_second(client, limit):
+    client.get(f"/api/difficulty/easy?limit={limit}")
+    count, start = 0, time.perf_counter()
+    while time.perf_counter() - start < DURATION_S:
+        client.get(f"/api/difficulty/easy?limit={limit}")
+        count += 1
+    return count / (time.perf_counter() - start)
+
+
+def bench(limits):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(
+            f"sqlite:///{tmp}/bench.db", connect_args={"check_same_thread": False}
+        )
+        Base.metadata.create_all(bind=engine)
+        SessionForBench = sessionmaker(bind=engine)
+        db = SessionForBench()
+        db.add(models.TestConfig(id=1, name="Easy TestConfig"))
+        db.commit()
+        insert_generated_item_configs(db, "easy", 1, POOL_SIZE)
+        db.close()
+
+        def override_get_db():
+            db = SessionForBench()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        app.dependency_overrides[get_db] = override_get_db
+        pool_cache.invalidate()
+        client = TestClient(app)
+
+        print(
+            f"{'limit':>6} {'response_model [req/s]':>23} {'pre-serialized [req/s]':>23}"
+        )
+        for limit in limits:
+            settings.PRESERIALIZED_DIFFICULTY_RESPONSES = False
+            slow = requests_per_second(client, limit)
+            settings.PRESERIALIZED_DIFFICULTY_RESPONSES = True
+            fast = requests_per_second(client, limit)
+            print(f"{limit:>6} {slow:>23.0f} {fast:>23.0f}")
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("SECRET_KEY", "bench")
+    bench([int(limit) for limit in sys.argv[1:]] or [50, 500, 5000])
@@ -0,0 +1,133 @@
+"""Compare ORDER BY random() with the position sampler and the pool cache.
+
+The pool grows to each size in turn inside one SQLite database (or the
+database given by BENCH_DATABASE_URL, whose tables are dropped first), then
+every strategy draws `limit` items a few times. The time of loading the pool
+into the cache, paid once per refresh interval, is reported separately.
+
+Usage: python -m benchmarks.bench_difficulty_sampling [limit] [n ...]
+"""
+
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, func, insert
+from sqlalchemy.orm import sessionmaker
+
+from backend import models
+from backend.difficulty.crud_difficulty import sample_item_config_ids
+from backend.difficulty.pool_cache import PoolCache
+from backend.models import Base
+
+REPEATS = 5
+CHUNK_SIZE = 100_000
+
+
+def grow_pool(db, start, stop):
+    """Append synthetic items with positions `start` to `stop` to TestConfig 1."""
+    created = datetime.datetime.utcnow()
+    for chunk_start in range(start, stop, CHUNK_SIZE):
+        chunk_stop = min(chunk_start + CHUNK_SIZE, stop)
+        db.execute(
+            insert(models.ItemConfig.__table__),
+            [
+                {
+                    "id": i + 1,
+                    "created": created,
+                    # Distinct sizes, item configs are deduplicated by content
+                    "triangle_size": 50 + i // 1000,
+                    "triangle_color": "#808080",
+                    "circle_size": 300 + i % 1000,
+                    "circle_color": "#858585",
+                    "time_visible_ms": 300,
+                    "orientation": "N",
+                }
+                for i in range(chunk_start, chunk_stop)
+            ],
+        )
+        db.execute(
+            insert(models.test_config_item_config_association),
+            [
+                {"test_config_id": 1, "item_config_id": i + 1, "position": i}
+                for i in range(chunk_start, chunk_stop)
+            ],
+        )
+        db.commit()
+
+
+def order_by_random(db, limit):
+    """The previous strategy: sort the whole pool randomly."""
+    return [
+        item_config.id
+        for item_config in db.query(models.ItemConfig)
+        .join(models.ItemConfig.test_configs)
+        .filter(models.TestConfig.id == 1)
+        .order_by(func.random())
+        .limit(limit)
+        .all()
+    ]
+
+
+def position_sampler(db, limit):
+    """The strategy without the cache: look up random positions by index."""
+    return sample_item_config_ids(db, 1, limit)
+
+
+cache = PoolCache(refresh_interval_s=float("inf"))
+
+
+def pool_cache_sampler(db, limit):
+    """The strategy of the endpoint: sample the cached pool in memory."""
+    return [item["id"] for item in cache.sample(db, "easy", limit)]
+
+
+def timed(strategy, db, limit):
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        assert len(strategy(db, limit)) == limit
+    return (time.perf_counter() - start) / REPEATS * 1000
+
+
+def bench(limit, sizes):
+    with tempfile.TemporaryDirectory() as tmp:
+        url = os.getenv("BENCH_DATABASE_URL", f"sqlite:///{tmp}/bench.db")
+        engine = create_engine(url)
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+        try:
+            db.add(models.TestConfig(id=1, name="Easy TestConfig"))
+            db.commit()
+            print(f"limit={limit}")
+            print(
+                f"{'pool':>10} {'random() [ms]':>14} {'positions [ms]':>15} "
+                f"{'load [ms]':>10} {'cache [ms]':>11}"
+            )
+            pool = 0
+            for size in sorted(sizes):
+                grow_pool(db, pool, size)
+                pool = size
+                slow = timed(order_by_random, db, limit)
+                positions = timed(position_sampler, db, limit)
+                start = time.perf_counter()
+                cache.reload(db, "easy")
+                load = (time.perf_counter() - start) * 1000
+                cached = timed(pool_cache_sampler, db, limit)
+                print(
+                    f"{size:>10} {slow:>14.1f} {positions:>15.1f} "
+                    f"{load:>10.1f} {cached:>11.1f}"
+                )
+        finally:
+            db.close()
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    bench(
+        args[0] if args else 500,
+        args[1:] or [10_000, 100_000, 1_000_000, 10_000_000],
+    )
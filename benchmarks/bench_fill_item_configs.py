@@ -0,0 +1,66 @@
+"""Compare the ORM and the bulk insert path of fill_item_configs.
+
+Each run starts from an empty SQLite database (or the database given by
+BENCH_DATABASE_URL, whose tables are dropped first).
+
+Usage: python -m benchmarks.bench_fill_item_configs [n ...]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend import models
+from backend.difficulty.crud_difficulty import (
+    generate_item_configs,
+    insert_generated_item_configs,
+)
+from backend.models import Base
+
+
+def orm_fill(db, test_config, count):
+    """The previous fill path: one ORM object per item, flushed on commit."""
+    for item_config_schema in generate_item_configs("easy", count):
+        item_config = models.ItemConfig(**item_config_schema.model_dump())
+        db.add(item_config)
+        test_config.item_configs.append(item_config)
+    db.commit()
+
+
+def bulk_fill(db, test_config, count):
+    insert_generated_item_configs(db, "easy", test_config.id, count)
+
+
+def run(fill, count):
+    with tempfile.TemporaryDirectory() as tmp:
+        url = os.getenv("BENCH_DATABASE_URL", f"sqlite:///{tmp}/bench.db")
+        engine = create_engine(url)
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+        try:
+            test_config = models.TestConfig(id=1, name="Easy TestConfig")
+            db.add(test_config)
+            db.commit()
+            start = time.perf_counter()
+            fill(db, test_config, count)
+            return time.perf_counter() - start
+        finally:
+            db.close()
+            engine.dispose()
+
+
+def bench(counts):
+    print(f"{'items':>10} {'ORM [s]':>10} {'bulk [s]':>10} {'speedup':>8}")
+    for count in counts:
+        orm = run(orm_fill, count)
+        bulk = run(bulk_fill, count)
+        print(f"{count:>10} {orm:>10.2f} {bulk:>10.2f} {orm / bulk:>7.1f}x")
+
+
+if __name__ == "__main__":
+    bench([int(n) for n in sys.argv[1:]] or [10_000, 100_000, 1_000_000])
@@ -0,0 +1,34 @@
+"""Compare per-item and batched ItemConfig generation for every difficulty.
+
+Usage: python -m benchmarks.bench_generate_item_configs [n]
+"""
+
+import sys
+import time
+
+from backend.difficulty.crud_difficulty import (
+    DIFFICULTY_RANGES,
+    generate_item_config,
+    generate_item_configs,
+)
+
+
+def bench(n: int):
+    print(f"{'difficulty':<10} {'per item [s]':>14} {'batched [s]':>12} {'speedup':>8}")
+    for difficulty in DIFFICULTY_RANGES:
+        start = time.perf_counter()
+        for _ in range(n):
+            generate_item_config(difficulty)
+        scalar = time.perf_counter() - start
+
+        start = time.perf_counter()
+        generate_item_configs(difficulty, n)
+        batched = time.perf_counter() - start
+
+        print(
+            f"{difficulty:<10} {scalar:>14.3f} {batched:>12.3f} {scalar / batched:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
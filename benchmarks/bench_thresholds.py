@@ -0,0 +1,106 @@
+"""Time loading and fitting the population thresholds of n simulated results.
+
+The answers are drawn from the psychometric function with a known threshold
+per user, so the recovered median threshold is printed next to the true one.
+
+Usage: python -m benchmarks.bench_thresholds [n ...]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+from backend import models
+from backend.adaptive.staircase import DIMENSIONS, psychometric
+from backend.analytics.crud_analytics import fit_population, load_answers
+from backend.analytics.psychometrics import log_intensities
+
+USERS = 1_000
+ITEM_CONFIGS = 10_000
+
+
+def simulate(db: Session, n: int, rng: np.random.Generator) -> float:
+    """Insert n results of random users and items; returns the true median log10
+    contrast threshold."""
+    contrast = 1 + 10 ** rng.uniform(-2.5, 0, ITEM_CONFIGS)
+    db.execute(
+        models.User.__table__.insert(),
+        [
+            {"id": user_id, "username": f"user{user_id}", "email": f"user{user_id}@x"}
+            for user_id in range(1, USERS + 1)
+        ],
+    )
+    db.execute(
+        insert(models.ItemConfig),
+        [
+            {
+                "id": i + 1,
+                # Distinct sizes, item configs are deduplicated by content
+                "triangle_size": 50 + i // 300,
+                "triangle_color": "#000000",
+                "circle_size": 300 + i % 300,
+                "circle_color": "#FFFFFF",
+                "time_visible_ms": 1000,
+                "orientation": "N",
+                "contrast_ratio": float(contrast[i]),
+            }
+            for i in range(ITEM_CONFIGS)
+        ],
+    )
+    thresholds = rng.normal(-1.5, 0.2, USERS)
+    users = rng.integers(0, USERS, n)
+    items = rng.integers(0, ITEM_CONFIGS, n)
+    p = psychometric(log_intensities("contrast", contrast[items]), thresholds[users])
+    correct = rng.random(n) < p
+    for start in range(0, n, 100_000):
+        end = min(start + 100_000, n)
+        db.execute(
+            insert(models.ItemConfigResult),
+            [
+                {
+                    "user_id": int(users[i]) + 1,
+                    "item_config_id": int(items[i]) + 1,
+                    "correct": bool(correct[i]),
+                    "reaction_time_ms": 500,
+                    "response": "N",
+                }
+                for i in range(start, end)
+            ],
+        )
+    db.commit()
+    return float(np.median(thresholds))
+
+
+def bench(sizes):
+    print(f"{'results':>10} {'load [s]':>9} {'fit [s]':>8} {'median':>14}")
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+            models.Base.metadata.create_all(engine)
+            with Session(engine) as db:
+                true_median = simulate(db, n, np.random.default_rng(0))
+
+                start = time.perf_counter()
+                answers = load_answers(db)
+                loaded = time.perf_counter() - start
+
+                start = time.perf_counter()
+                population = fit_population(answers)
+                fitted = time.perf_counter() - start
+            engine.dispose()
+
+        contrast = population["thresholds"][list(DIMENSIONS).index("contrast")]
+        median = np.log10(contrast["user_threshold_p50"] - 1)
+        print(
+            f"{n:>10} {loaded:>9.2f} {fitted:>8.2f} "
+            f"{median:>6.2f} ({true_median:.2f})"
+        )
+
+
+if __name__ == "__main__":
+    bench([int(n) for n in sys.argv[1:]] or [100_000, 1_000_000])